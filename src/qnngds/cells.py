@@ -11,6 +11,7 @@ import qnngds.tests as test
 import qnngds.devices as device
 import qnngds.circuits as circuit
 import qnngds.utilities as utility
+import qnngds.geometries as geometry
 
 # basics
 
@@ -49,7 +50,7 @@ def alignment(
         text=f"ALIGN {text}",
     )
 
-    DIE << BORDER.flatten()
+    DIE << BORDER
     DIE << ALIGN
 
     return DIE
@@ -100,7 +101,7 @@ def vdp(
         ports_gnd=[],
         text=f"VDP \n{text}",
     )
-    DIE_VANDP << DIE.flatten()
+    DIE_VANDP << DIE
 
     # Creates the vdp structure, add pads and route
 
@@ -111,19 +112,15 @@ def vdp(
     VDP << AREA
 
     ## pads (creates a die and keeps the pads only)
-    pads_parameters = utility.DieParameters(
-        unit_die_size=die_parameters.unit_die_size,
-        pad_size=die_parameters.pad_size,
+    pads_parameters = die_parameters.replace(
+        pad_tolerance=5,
         contact_l=0,
-        outline=die_parameters.outline,
         die_layer=0,
-        pad_layer=die_parameters.pad_layer,
         invert=False,
         fill_pad_layer=False,
-        text_size=die_parameters.text_size,
     )
 
-    PADS = utility.die_cell(
+    PADS_DIE = utility.die_cell(
         die_parameters=pads_parameters,
         contact_w=die_parameters.pad_size[0],
         device_max_size=(device_max_w, device_max_w),
@@ -131,7 +128,13 @@ def vdp(
         ports_gnd=["N", "E", "W", "S"],
         text="PADS ONLY",
     )
-    PADS.remove_layers([die_parameters.pad_layer], invert_selection=True)
+    PADS = Device("PADS")
+    for layer, polygons in geometry.layer_polygons(
+        PADS_DIE, [die_parameters.pad_layer]
+    ).items():
+        PADS.add_polygon(polygons, layer=layer)
+    for port in PADS_DIE.ports.values():
+        PADS.add_port(port=port)
     VDP << PADS
 
     ## routes from pads to probing area
@@ -144,18 +147,23 @@ def vdp(
 
     DEVICE = Device(f"VDP(lay={layers_to_probe})")
 
+    # the outline is the same on every layer, it is computed once
+    polygons = VDP.get_polygons()
+    if any(layer in layers_to_outline for layer in layers_to_probe):
+        outline = geometry.outline_polygons(polygons, [], die_parameters.outline)
+
     for layer in layers_to_probe:
-        TEST_LAYER = pg.deepcopy(VDP)
-        if layer in layers_to_outline:
-            TEST_LAYER = pg.outline(TEST_LAYER, die_parameters.outline)
-        TEST_LAYER.name = f"VDP(lay={layer})"
-        DEVICE << TEST_LAYER.flatten(single_layer=layer)
+        TEST_LAYER = Device(f"VDP(lay={layer})")
+        TEST_LAYER.add_polygon(
+            outline if layer in layers_to_outline else polygons, layer=layer
+        )
+        DEVICE << TEST_LAYER
 
     DIE_VANDP << DEVICE
 
     # Add pads if they are not in already present
     if die_parameters.pad_layer not in layers_to_probe:
-        PADS = pg.union(PADS, layer=die_parameters.pad_layer)
+        PADS = geometry.union(PADS, layer=die_parameters.pad_layer)
         PADS.name = "PADS"
         DIE_VANDP << PADS
 
@@ -202,7 +210,7 @@ def etch_test(
         probe = Device()
         probe.add_array(rect, 2, 1, die_parameters.unit_die_size)
         for layer in layer_to_etch:
-            TEST << pg.outline(probe, -die_parameters.outline, layer=layer).movey(
+            TEST << geometry.outline(probe, -die_parameters.outline, layer=layer).movey(
                 i * die_parameters.unit_die_size[1]
             )
 
@@ -223,7 +231,7 @@ def etch_test(
     )
 
     BORDER.move(TEST.center)
-    DIE_ETCH_TEST << BORDER.flatten()
+    DIE_ETCH_TEST << BORDER
     DIE_ETCH_TEST << TEST.flatten()
     DIE_ETCH_TEST.move(DIE_ETCH_TEST.center, (0, 0))
 
@@ -289,7 +297,7 @@ def resolution_test(
         text=f"RES TEST \n{text}",
     )
 
-    DIE_RES_TEST << BORDER.flatten()
+    DIE_RES_TEST << BORDER
     return DIE_RES_TEST
 
 
@@ -304,6 +312,7 @@ def nanowires(
     text: Union[None, str] = None,
     lengths: List[float] = None,
     tolerance: float = 5,
+    workers: Optional[int] = None,
 ) -> Device:
     """Creates a cell that contains several nanowires of given channel and
     source.
@@ -317,6 +326,9 @@ def nanowires(
         text (str, optional): If None, the text is f"w={channels_w}".
         lengths (list of int or float): if None, use nanowire.spot; if populated, create nanowires of given lengths
         tolerance (int or float): offset between gold pads and e-beam gaps to accommodate alignment error
+        workers (int, optional): The number of processes building the
+            nanowires, see nanowire.batch. If None, uses as many processes as
+            CPUs. If 1, the nanowires are built in this process.
 
     Returns:
         Device: A device (of size n*m unit cells) containing the nanowires, the
@@ -336,17 +348,17 @@ def nanowires(
     ## Create the NANOWIRES
 
     NANOWIRES = Device(f"NWIRES({cell_text})")
-    nanowires_ref = []
-    for i, channel_source_w in enumerate(channels_sources_w):
-        if lengths is None:
-            nanowire_ref = NANOWIRES << device.nanowire.spot(
-                channel_source_w[0], channel_source_w[1]
-            )
-        else:
-            nanowire_ref = NANOWIRES << device.nanowire.variable_length(
-                channel_source_w[0], channel_source_w[1], lengths[i]
-            )
-        nanowires_ref.append(nanowire_ref)
+    if lengths is None:
+        parameters = [tuple(c_s_w[:2]) for c_s_w in channels_sources_w]
+    else:
+        parameters = [
+            (c_s_w[0], c_s_w[1], length)
+            for c_s_w, length in zip(channels_sources_w, lengths)
+        ]
+    nanowires_ref = [
+        NANOWIRES << nanowire
+        for nanowire in device.nanowire.batch(parameters, workers=workers)
+    ]
     DEVICE << NANOWIRES
 
     ## Create the DIE
@@ -397,7 +409,7 @@ def nanowires(
     DEVICE << ROUTES
 
     DEVICE.ports = dev_ports.ports
-    DEVICE = pg.outline(
+    DEVICE = geometry.outline(
         DEVICE, outline_dev, open_ports=2 * outline_dev, layer=device_layer
     )
     DEVICE.name = f"NWIRES({cell_text})"
@@ -505,8 +517,10 @@ def ntron(
     ROUTES = utility.route_to_dev(HT.get_ports(), NTRON.ports, device_layer)
     DEVICE << ROUTES
 
-    DEVICE = pg.outline(DEVICE, outline_dev, precision=0.000001, open_ports=outline_dev)
-    DEVICE = pg.union(DEVICE, layer=device_layer)
+    DEVICE = geometry.outline(
+        DEVICE, outline_dev, precision=0.000001, open_ports=outline_dev
+    )
+    DEVICE = geometry.union(DEVICE, layer=device_layer)
     DEVICE.name = f"NTRON({cell_text})"
 
     DIE_NTRON << DEVICE
@@ -615,7 +629,7 @@ def snspds(
     ROUTES = utility.route_to_dev(HT.get_ports(), snspds_ports)
     DEVICE << ROUTES
 
-    DEVICE = pg.outline(
+    DEVICE = geometry.outline(
         DEVICE, outline_dev, open_ports=2 * outline_dev, layer=device_layer
     )
     DEVICE.name = f"SNSPD({cell_text})"
@@ -735,8 +749,10 @@ def snspd_ntron(
     ROUTES = utility.route_to_dev(HT.get_ports(), SNSPD_NTRON.ports, device_layer)
     DEVICE << ROUTES
 
-    DEVICE = pg.outline(DEVICE, outline_dev, precision=0.000001, open_ports=outline_dev)
-    DEVICE = pg.union(DEVICE, layer=device_layer)
+    DEVICE = geometry.outline(
+        DEVICE, outline_dev, precision=0.000001, open_ports=outline_dev
+    )
+    DEVICE = geometry.union(DEVICE, layer=device_layer)
     DEVICE.name = f"SNSPD-NTRON({cell_text})"
 
     DIE_SNSPD_NTRON << DEVICE
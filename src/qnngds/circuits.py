@@ -3,6 +3,7 @@ ntron, logic gates etc.)"""
 
 from phidl import Device
 import phidl.geometry as pg
+import qnngds.geometries as geometry
 from typing import Tuple, Union
 import math
 
@@ -76,7 +77,7 @@ def snspd_ntron(
         second_tee = D << tee
         second_tee.rotate(180)
 
-        D = pg.union(D)
+        D = geometry.union(D)
         D.add_port(port=first_tee.ports[1], name="E")
         D.add_port(port=first_tee.ports[2], name="W")
         D.add_port(port=first_tee.ports[3], name="S")
@@ -130,11 +131,13 @@ def snspd_ntron(
         )
         SNSPD.rotate(90)
         # port 1 connected to gnd
-        route = ROUTES << pg.optimal_step(SNSPD.ports[1].width, w_pad, symmetric=True)
+        route = ROUTES << geometry.optimal_step(
+            SNSPD.ports[1].width, w_pad, symmetric=True
+        )
         route.connect(route.ports[1], SNSPD.ports[1])
         SNSPD_NTRON.add_port(port=route.ports[2], name="S1")
         # port 2 connected to crossA south
-        route_step = ROUTES << pg.optimal_step(
+        route_step = ROUTES << geometry.optimal_step(
             SNSPD.ports[2].width, CROSSA.ports["S"].width, symmetric=True
         )
         route_step.connect(route_step.ports[1], SNSPD.ports[2])
@@ -158,7 +161,7 @@ def snspd_ntron(
         route.connect(route.ports["S"], CROSSA.ports["N"])
         INDUCTOR1.connect(INDUCTOR1.ports[1], route.ports["N"])
         # port 2 connected to pad
-        route = ROUTES << pg.optimal_step(
+        route = ROUTES << geometry.optimal_step(
             INDUCTOR1.ports[2].width, w_pad, symmetric=True
         )
         route.connect(route.ports[1], INDUCTOR1.ports[2])
@@ -208,7 +211,9 @@ def snspd_ntron(
         route.connect(route.ports["S"], NTRON.ports["d"])
         CROSSC.connect(CROSSC.ports["S"], route.ports["N"])
         # port 2 connected to gnd
-        route = ROUTES << pg.optimal_step(NTRON.ports["s"].width, w_pad, symmetric=True)
+        route = ROUTES << geometry.optimal_step(
+            NTRON.ports["s"].width, w_pad, symmetric=True
+        )
         route.connect(route.ports[1], NTRON.ports["s"])
         SNSPD_NTRON.add_port(port=route.ports[2], name="S2")
 
@@ -228,7 +233,7 @@ def snspd_ntron(
         route.connect(route.ports["S"], CROSSC.ports["N"])
         INDUCTOR3.connect(INDUCTOR3.ports[1], route.ports["N"])
         # port 2 connected to pad
-        route = ROUTES << pg.optimal_step(
+        route = ROUTES << geometry.optimal_step(
             INDUCTOR3.ports[2].width, w_pad, symmetric=True
         )
         route.connect(route.ports[1], INDUCTOR3.ports[2])
@@ -236,21 +241,21 @@ def snspd_ntron(
 
     def create_probing_routes():
         ## SNSPD PROBING PAD
-        step = ROUTES << pg.optimal_step(w_inductor, w_pad, symmetric=True)
+        step = ROUTES << geometry.optimal_step(w_inductor, w_pad, symmetric=True)
         step.connect(step.ports[1], CROSSA.ports["W"])
         route = ROUTES << pg.compass((abs(SNSPD_NTRON.xmin - step.xmin), w_pad))
         route.connect(route.ports["E"], step.ports[2])
         SNSPD_NTRON.add_port(port=route.ports["W"], name="W1")
 
         ## NTRON IN PROBING PAD
-        step = ROUTES << pg.optimal_step(w_inductor, w_pad, symmetric=True)
+        step = ROUTES << geometry.optimal_step(w_inductor, w_pad, symmetric=True)
         step.connect(step.ports[1], CROSSB.ports["N"])
         route = ROUTES << pg.compass((w_pad, abs(SNSPD_NTRON.ymax - step.ymax)))
         route.connect(route.ports["S"], step.ports[2])
         SNSPD_NTRON.add_port(port=route.ports["N"], name="N2")
 
         ## NTRON OUT PROBING PAD
-        step = ROUTES << pg.optimal_step(w_inductor, w_pad, symmetric=True)
+        step = ROUTES << geometry.optimal_step(w_inductor, w_pad, symmetric=True)
         step.connect(step.ports[1], CROSSC.ports["E"])
         route = ROUTES << pg.compass((abs(SNSPD_NTRON.xmax - step.xmax), w_pad))
         route.connect(route.ports["W"], step.ports[2])
@@ -7,9 +7,17 @@ design.
 """
 
 from phidl import Device
+import gdspy
+from phidl.device_layout import DeviceReference
 import phidl.geometry as pg
-from typing import Tuple, List, Union, Optional
+from typing import Any, Dict, Iterator, Tuple, List, Union, Optional
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import itertools
+import json
 import os
+import time
+import weakref
 
 import qnngds.cells as cell
 import qnngds.utilities as utility
@@ -131,7 +139,7 @@ def place_on_chip(
     NB: The cell is aligned from its bottom left corner to the coordinates.
 
     Parameters:
-        cell (Device): Device to be moved.
+        cell (Device or DeviceReference): Device (or reference to a Device) to be moved.
         coordinates (tuple of int): (i, j) indices of the chip grid, where to place the cell.
             Note that the indices start at 0.
         chip_map (2D array): The 2D array mapping the free cells in the chip map.
@@ -150,9 +158,9 @@ def place_on_chip(
     # update the chip's availabilities
     n_cell = round(cell.xsize / die_w)
     m_cell = round(cell.ysize / die_w)
+    cell_name = _cell_name(cell)
     for n in range(n_cell):
         for m in range(m_cell):
-            cell_name = cell.name.replace("\n", "")
             try:
                 if chip_map[coordinates[1] + m][coordinates[0] + n] == Occupied:
                     print(
@@ -178,15 +186,173 @@ def place_on_chip(
     # write the cell's place on the devices map text file
     if devices_map_txt is not None:
         with open(f"{devices_map_txt}.txt", "a") as file:
-            try:
-                name = cell.name.replace("\n", "")
-            except AttributeError:
-                name = "unnamed"
-            file.write(f"({coordinates[0]}, {coordinates[1]}) : {name}\n")
+            file.write(f"({coordinates[0]}, {coordinates[1]}) : {cell_name}\n")
 
     return True
 
 
+def _cell_name(cell: Union[Device, DeviceReference]) -> str:
+    """Returns the name of a cell, or of the Device it references."""
+    if isinstance(cell, DeviceReference):
+        cell = cell.parent
+    try:
+        return cell.name.replace("\n", "")
+    except AttributeError:
+        return "unnamed"
+
+
+def _array_references(D: Device) -> Device:
+    """Returns a copy of a Device whose references to a same master, when
+    they are placed on a regular grid, are replaced by arrays of this master.
+
+    Only references that are neither rotated, mirrored nor magnified are
+    considered. The Device is not modified: the copy shares its polygons,
+    labels and references.
+    """
+    ARRAYED = Device(D.name)
+    ARRAYED.polygons = list(D.polygons)
+    ARRAYED.paths = list(D.paths)
+    ARRAYED.labels = list(D.labels)
+    ARRAYED.references = list(D.references)
+    D = ARRAYED
+
+    def runs(items, coord):
+        # split sorted items in runs of constant spacing along coord
+        items = sorted(items, key=coord)
+        i = 0
+        while i < len(items):
+            j = i + 1
+            step = None
+            if j < len(items):
+                step = coord(items[j]) - coord(items[i])
+                if step <= 1e-6:
+                    step = None
+                else:
+                    while (
+                        j + 1 < len(items)
+                        and abs(coord(items[j + 1]) - coord(items[j]) - step) < 1e-6
+                    ):
+                        j += 1
+                    j += 1
+            yield items[i:j], step
+            i = j
+
+    by_master = {}
+    for ref in D.references:
+        if (
+            type(ref) is DeviceReference
+            and not ref.rotation
+            and not ref.x_reflection
+            and ref.magnification in (None, 1)
+        ):
+            by_master.setdefault(id(ref.parent), []).append(ref)
+
+    for refs in by_master.values():
+        if len(refs) < 2:
+            continue
+
+        # runs of references along each row ...
+        rows = {}
+        for ref in refs:
+            rows.setdefault(round(ref.origin[1], 6), []).append(ref)
+        row_runs = {}
+        for row in rows.values():
+            for run, dx in runs(row, lambda r: r.origin[0]):
+                key = (
+                    round(run[0].origin[0], 6),
+                    len(run),
+                    None if dx is None else round(dx, 6),
+                )
+                row_runs.setdefault(key, []).append(run)
+
+        # ... stacked in columns of constant spacing
+        for (x0, columns, dx), stack in row_runs.items():
+            for block, dy in runs(stack, lambda run: run[0].origin[1]):
+                if columns * len(block) < 2:
+                    continue
+                ARRAY = D.add_array(
+                    block[0][0].parent,
+                    columns=columns,
+                    rows=len(block),
+                    spacing=(dx or 0, dy or 0),
+                )
+                ARRAY.move((0, 0), block[0][0].origin)
+                D.remove([ref for run in block for ref in run])
+    return D
+
+
+def _write_cells(stream: dict, D: Device) -> str:
+    """Writes a Device and the Devices it references to a GDS stream, unless
+    they were already written.
+
+    The Devices written are renamed, if needed, so that their names are
+    unique in the file. Their names are restored when the stream is closed.
+
+    Returns:
+        str: The name of the Device in the GDS file.
+    """
+    written = stream["written"].get(id(D))
+    if written is not None and written[0]() is D:
+        return D.name
+    for ref in D.references:
+        _write_cells(stream, ref.parent)
+    name = temp_name = D.name[:32000]
+    n = 1
+    while temp_name in stream["names"]:
+        n += 1
+        temp_name = name + ("%0.3i" % n)
+    stream["names"].add(temp_name)
+    stream["written"][id(D)] = (weakref.ref(D), D.name)
+    D.name = temp_name
+    stream["writer"].write_cell(D)
+    return temp_name
+
+
+def _build_cell(
+    state: dict, builder: str, kwargs: Dict[str, Any]
+) -> Tuple[dict, float]:
+    """Builds a cell with a Design's builder, in a worker process, and returns
+    it packed, with the time it took to build (in s)."""
+    design = Design.__new__(Design)
+    design.__dict__.update(state)
+    start = time.perf_counter()
+    cell = getattr(design, builder)(**kwargs)
+    return utility.pack_device(cell), time.perf_counter() - start
+
+
+def _expand_grid(
+    grid: Dict[str, List[Any]], mode: str = "product"
+) -> Iterator[Dict[str, Any]]:
+    """Yields the keyword arguments of each point of a grid of parameters.
+
+    Parameters:
+        grid (dict): The values of each parameter, by name.
+        mode (str): "product" for every combination of the values (the first
+            parameter varying the slowest), "zip" for the n-th values of all
+            parameters together.
+
+    Raises:
+        ValueError: If the mode is unknown, or if the parameters of a "zip"
+            grid don't have as many values.
+    """
+    names = list(grid)
+    if mode == "product":
+        values = itertools.product(*grid.values())
+    elif mode == "zip":
+        if len({len(v) for v in grid.values()}) > 1:
+            raise ValueError(
+                "[qnngds] sweep() the parameters of a zip grid must have as many "
+                "values."
+            )
+        values = zip(*grid.values())
+    else:
+        raise ValueError(
+            f'[qnngds] sweep() mode must be "product" or "zip", not {mode!r}.'
+        )
+    for point in values:
+        yield dict(zip(names, point))
+
+
 def place_remaining_devices(
     devices_to_place: List[Device],
     chip_map: List[List[bool]],
@@ -353,6 +519,22 @@ class Design:
 
         self.fill_pad_layer = fill_pad_layer
 
+        # geometrically identical cells with the same name are placed as
+        # references to one master, and so are their subcells while they are
+        # alive
+        self._masters = {}
+        self._subcells = weakref.WeakValueDictionary()
+
+        # the cells placed on the chip, and how the cells still alive were
+        # built
+        self.manifest = []
+        self._specs = weakref.WeakKeyDictionary()
+        self._manifest_file = None
+        self._previous_manifest = []
+
+        # the GDS file being written, if any
+        self._stream = None
+
     # help building a design
 
     def create_chip(self, create_devices_map_txt: Union[bool, str] = True) -> Device:
@@ -403,6 +585,9 @@ class Design:
             self.die_w = N_or_w
         else:
             self.N_dies = N_or_w
+        self._masters = {}
+        self._subcells = weakref.WeakValueDictionary()
+        self.manifest = []
 
         self.die_parameters = utility.DieParameters(
             (self.die_w, self.die_w),
@@ -423,6 +608,10 @@ class Design:
 
         NB: the cell is aligned from its bottom left corner to the coordinates.
 
+        If add_to_chip is True, the cell is not moved: it is added to the CHIP
+        as a reference, and cells geometrically identical to an already placed
+        one, with the same name, are placed as references to this first cell.
+
         Parameters:
             cell (Device): Device to be moved.
             coordinates (tuple of int): (i, j) indices of the chip grid, where to place the cell.
@@ -444,14 +633,20 @@ class Design:
         """
 
         if add_to_chip:
-            self.CHIP << cell
-        return place_on_chip(
+            placed = cell
+            cell = self.CHIP << self._master(cell)
+        if not place_on_chip(
             cell=cell,
             coordinates=coordinates,
             chip_map=self.chip_map,
             die_w=self.die_w,
             devices_map_txt=self.devices_map_txt,
-        )
+        ):
+            return False
+        if add_to_chip:
+            self._add_to_manifest(placed, cell)
+            self._stream_reference(cell)
+        return True
 
     def place_remaining_devices(
         self,
@@ -472,6 +667,8 @@ class Design:
         Note:
             The list of devices is not re-ordered to fit as many of them as possible.
             Some edges of the chip may remain empty because the list contained 2-units long devices (for e.g.).
+            If add_to_chip is True, the devices are added as references, like
+            in place_on_chip().
 
         Examples:
             Here is a typical example of why this function is useful and how to
@@ -493,17 +690,251 @@ class Design:
             write_devices_map_txt = write_remaining_devices_map_txt
 
         if add_to_chip:
-            self.CHIP << devices_to_place
+            cells_to_place = [self.CHIP << self._master(D) for D in devices_to_place]
+            references = list(cells_to_place)
+        else:
+            cells_to_place = devices_to_place
+        num_to_place = len(cells_to_place)
         place_remaining_devices(
-            devices_to_place=devices_to_place,
+            devices_to_place=cells_to_place,
             chip_map=self.chip_map,
             die_w=self.die_w,
             write_devices_map_txt=write_devices_map_txt,
         )
+        if add_to_chip:
+            num_placed = num_to_place - len(cells_to_place)
+            for D, ref in zip(devices_to_place[:num_placed], references):
+                self._add_to_manifest(D, ref)
+                self._stream_reference(ref)
+            del devices_to_place[:num_placed]
+
+    def _master(self, cell: Device) -> Device:
+        """Returns the first cell placed that is geometrically identical to
+        the given one and has the same name, or the cell itself if there is
+        none.
+
+        A new cell's references to subcells identical to those of the cells
+        already placed are pointed to these subcells, e.g. so that dies that
+        only differ by their label share their frame.
+        """
+        memo = {}
+        key = (utility.geometry_hash(cell, memo=memo), _cell_name(cell))
+        if key not in self._masters:
+            self._share_subcells(cell, memo, set())
+        return self._masters.setdefault(key, cell)
+
+    def _share_subcells(self, D: Device, memo: Dict[int, bytes], seen: set) -> None:
+        """Points the references of a Device (and of its subcells) to the
+        identical subcells already placed, with memo the geometry hashes of
+        its subcells (see utilities.geometry_hash)."""
+        for ref in D.references:
+            subcell = ref.parent
+            key = (memo[id(subcell)].hex(), _cell_name(subcell))
+            master = self._subcells.setdefault(key, subcell)
+            if master is not subcell:
+                ref.ref_cell = master
+            elif id(subcell) not in seen:
+                seen.add(id(subcell))
+                self._share_subcells(subcell, memo, seen)
+
+    def _add_to_manifest(self, cell: Device, reference: DeviceReference) -> None:
+        """Records a cell placed on the chip in the manifest."""
+        if cell in self._specs:
+            entry = dict(self._specs[cell])
+        else:
+            entry = {
+                "builder": None,
+                "arguments": None,
+                "key": utility.geometry_hash(cell),
+            }
+        entry["name"] = _cell_name(cell)
+        entry["origin"] = [round(float(v), 6) for v in reference.origin]
+        if self._stream is None:
+            # the master the CHIP references, rather than the cell, which
+            # can be freed if it is a duplicate
+            entry["_cell"] = reference.parent
+        else:
+            # the cell is freed once written to the stream
+            if entry["builder"] is not None and self._manifest_file is not None:
+                self._save_manifest_cell(entry["key"], cell)
+            entry["_cell"] = None
+        self.manifest.append(entry)
+
+    def _manifest_cell_file(self, key: str) -> str:
+        """Returns the file where a cell of the manifest is saved."""
+        return os.path.join(f"{self._manifest_file}.cells", f"{key}.npz")
+
+    def load_manifest(self, filename: Union[None, str] = None) -> List[dict]:
+        """Loads the manifest written by a previous run, and records the
+        manifest of this run.
+
+        The manifest lists the cells placed on the chip, with the builder,
+        the arguments and the coordinates of the cells built with
+        build_cells. The cells it lists are saved next to it, and
+        build_cells loads them instead of rebuilding them when they are
+        built again with the same arguments. Only the cells whose parameters
+        changed since the previous run are rebuilt. The manifest and its
+        cells are written by write_gds.
+
+        Parameters:
+            filename (str or None): The filename of the manifest. If None, the
+                name of the Design will be used.
+
+        Returns:
+            list of dict: The entries of the previous manifest. Empty if there
+            was no previous manifest.
+
+        Examples:
+            >>> design.create_chip()
+            >>> design.load_manifest()
+            >>> ntrons = design.build_cells(specs)  # only changed ones are built
+            >>> design.place_remaining_devices(ntrons)
+            >>> print(design.diff_manifest())
+            >>> design.write_gds()
+        """
+        if filename is None:
+            filename = f"{self.name} manifest"
+        self._manifest_file = filename
+        try:
+            with open(f"{filename}.json") as file:
+                self._previous_manifest = json.load(file)
+        except FileNotFoundError:
+            self._previous_manifest = []
+        return self._previous_manifest
+
+    def diff_manifest(self) -> Dict[str, List[dict]]:
+        """Compares the cells placed on the chip with the previous manifest
+        (see load_manifest).
+
+        Returns:
+            dict: The entries of the cells "added" since the previous run
+            (new or changed cells, or cells moved), of the cells "removed",
+            and of the cells "unchanged".
+        """
+        previous = {}
+        for entry in self._previous_manifest:
+            previous.setdefault((entry["key"], tuple(entry["origin"])), entry)
+        diff = {"added": [], "removed": [], "unchanged": []}
+        for entry in self.manifest:
+            entry = {k: v for k, v in entry.items() if k != "_cell"}
+            if previous.pop((entry["key"], tuple(entry["origin"])), None) is None:
+                diff["added"].append(entry)
+            else:
+                diff["unchanged"].append(entry)
+        diff["removed"] = list(previous.values())
+        return diff
+
+    def _write_manifest(self) -> None:
+        """Writes the manifest and saves the cells it lists, removing the
+        cells of the previous manifest that are no longer placed."""
+        directory = f"{self._manifest_file}.cells"
+        os.makedirs(directory, exist_ok=True)
+        entries = []
+        keys = set()
+        for entry in self.manifest:
+            cell = entry["_cell"]
+            entry = {k: v for k, v in entry.items() if k != "_cell"}
+            entries.append(entry)
+            if entry["builder"] is None or entry["key"] in keys:
+                continue
+            keys.add(entry["key"])
+            if cell is not None:
+                self._save_manifest_cell(entry["key"], cell)
+        for file_name in os.listdir(directory):
+            if file_name.endswith(".npz") and file_name[:-4] not in keys:
+                os.remove(os.path.join(directory, file_name))
+        with open(f"{self._manifest_file}.json", "w") as file:
+            json.dump(entries, file, indent=1)
+        self._previous_manifest = entries
+
+    def _save_manifest_cell(self, key: str, cell: Device) -> None:
+        """Saves a cell of the manifest, unless it is already saved."""
+        if not os.path.exists(self._manifest_cell_file(key)):
+            os.makedirs(f"{self._manifest_file}.cells", exist_ok=True)
+            utility.save_device(self._manifest_cell_file(key), cell)
+
+    def stream_gds(self, text: Union[None, str] = None) -> str:
+        """Starts writing a GDS file, cell by cell.
+
+        From now on, each cell placed on the CHIP is written to the file as
+        soon as it is placed, and the CHIP only keeps a reference to a
+        placeholder: a rectangle of the cell's size, in the annotation
+        layer, which is not written. The placed cells are freed once the
+        caller drops them, so that the memory used is bounded by the largest
+        cell rather than by the whole chip. The placed cells must not be
+        modified after being placed. The file is completed by write_gds,
+        which writes the cells placed before this call and the CHIP itself.
+
+        Args:
+            text (str or None): The filename for the GDS file.
+                If None, the name of the Design will be used.
+
+        Returns:
+            str: The filename of the GDS file.
+
+        Examples:
+            >>> design.create_chip()
+            >>> design.stream_gds()
+            >>> for w in [0.5, 0.75, 1, 1.25, 1.5]:
+            >>>     snspd = design.snspds_cell(snspds_width_pitch=[(w, 3 * w)])
+            >>>     design.place_remaining_devices([snspd])
+            >>> design.write_gds()
+        """
+        if text is None:
+            text = self.name
+        filename = f"{text}.gds"
+        self._stream = {
+            "filename": filename,
+            "writer": gdspy.GdsWriter(filename, unit=1e-6, precision=1e-9),
+            "written": {},
+            "names": {"toplevel"},
+        }
+        return filename
+
+    def _stream_reference(self, reference: DeviceReference) -> None:
+        """Writes the Device of a reference placed on the CHIP to the GDS
+        stream, and replaces it by a placeholder."""
+        if self._stream is None or not hasattr(reference, "parent"):
+            return
+        cell = reference.parent
+        written = self._stream["written"].get(id(cell))
+        if written is not None and written[0]() is cell:
+            return
+        name = _write_cells(self._stream, cell)
+        # the cells placed before stream_gds might be saved in the manifest
+        # later on
+        for entry in self.manifest:
+            if entry["_cell"] is cell:
+                if entry["builder"] is not None and self._manifest_file is not None:
+                    self._save_manifest_cell(entry["key"], cell)
+                entry["_cell"] = None
+
+        PLACEHOLDER = Device(name)
+        PLACEHOLDER.add_polygon(
+            [
+                (cell.xmin, cell.ymin),
+                (cell.xmax, cell.ymin),
+                (cell.xmax, cell.ymax),
+                (cell.xmin, cell.ymax),
+            ],
+            layer=self.layers["annotation"],
+        )
+        self._stream["written"][id(PLACEHOLDER)] = (weakref.ref(PLACEHOLDER), name)
+        for key, master in self._masters.items():
+            if master is cell:
+                self._masters[key] = PLACEHOLDER
+        for ref in self.CHIP.references:
+            if ref.parent is cell:
+                ref.ref_cell = PLACEHOLDER
 
     def write_gds(self, text: Union[None, str] = None) -> Union[None, str]:
         """Write a GDS file.
 
+        Identical cells placed on a regular grid are written as arrays (the
+        CHIP itself is not modified). If a manifest was loaded (see load_manifest), it is written too. If a GDS
+        stream was started (see stream_gds), completes and closes it, text
+        being ignored.
+
         Args:
             text (str or None): The filename for the GDS file.
                 If None, the name of the Design will be used.
@@ -513,7 +944,243 @@ class Design:
         """
         if text is None:
             text = self.name
-        return self.CHIP.write_gds(filename=f"{text}.gds", max_cellname_length=32000)
+        CHIP = _array_references(self.CHIP)
+        if self._manifest_file is not None:
+            self._write_manifest()
+        if self._stream is not None:
+            stream, self._stream = self._stream, None
+            for ref in CHIP.references:
+                _write_cells(stream, ref.parent)
+            CHIP.name = "toplevel"
+            stream["writer"].write_cell(CHIP)
+            stream["writer"].close()
+            for ref, name in stream["written"].values():
+                if ref() is not None:
+                    ref().name = name
+            return stream["filename"]
+        return CHIP.write_gds(filename=f"{text}.gds", max_cellname_length=32000)
+
+    def build_cells(
+        self,
+        specs: List[Tuple[str, Dict[str, Any]]],
+        workers: Optional[int] = None,
+    ) -> List[Device]:
+        """Builds several cells in parallel, in a pool of processes.
+
+        Each cell is built by one of the Design's cell builders (e.g.
+        "ntron_cell") in a worker process, and sent back packed in flat arrays
+        (see utilities.pack_device) to be rebuilt as a Device. The subcells
+        shared by the cells, like the die frames, are rebuilt only once.
+        If the on-disk cell cache is enabled (see
+        utilities.enable_cell_cache), the cells already cached are loaded
+        instead of being built. So are the cells of the previous run's
+        manifest, if one was loaded (see load_manifest).
+
+        Parameters:
+            specs (list of tuple): The cells to build, as (builder name,
+                keyword arguments) tuples.
+            workers (int, optional): The number of processes. If None, uses as
+                many processes as CPUs. If 1, the cells are built in this
+                process.
+
+        Returns:
+            List[Device]: The cells built, in the order of the specs.
+
+        Examples:
+            Here is an example building a sweep of ntrons on 4 processes.
+
+            >>> specs = [("ntron_cell", {"choke_w": 0.05, "channel_w": w})
+            >>>          for w in [0.5, 0.75, 1, 1.25, 1.5]]
+            >>> ntrons = design.build_cells(specs, workers=4)
+            >>> design.place_remaining_devices(ntrons)
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers == 1:
+            return self._build_cells(specs)[0]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return self._build_cells(specs, executor)[0]
+
+    def _build_cells(
+        self,
+        specs: List[Tuple[str, Dict[str, Any]]],
+        executor: Optional[ProcessPoolExecutor] = None,
+    ) -> Tuple[List[Device], List[Optional[str]], List[float]]:
+        """Builds several cells, in this process or in the executor's (see
+        build_cells).
+
+        Returns:
+            tuple: The cells, their cache keys (None if they can't be cached),
+            and the time it took to build or load each of them (in s).
+        """
+        state = {
+            "die_parameters": self.die_parameters,
+            "device_outline": self.device_outline,
+            "layers": self.layers,
+        }
+        cells = [None] * len(specs)
+        keys = [None] * len(specs)
+        times = [0.0] * len(specs)
+        previous_keys = {entry["key"] for entry in self._previous_manifest}
+        for i, (builder, kwargs) in enumerate(specs):
+            start = time.perf_counter()
+            try:
+                keys[i] = utility._cell_cache_key(
+                    f"Design.{builder}", {"state": state, "kwargs": kwargs}
+                )
+            except TypeError:
+                continue
+            if keys[i] in previous_keys:
+                try:
+                    cells[i] = utility.load_device(
+                        self._manifest_cell_file(keys[i]), masters=self._masters
+                    )
+                except (OSError, ValueError):
+                    pass
+            if cells[i] is None and utility._cell_cache["directory"] is not None:
+                cells[i] = utility._cell_cache_load(keys[i], masters=self._masters)
+            times[i] = time.perf_counter() - start
+        to_build = [i for i, cell in enumerate(cells) if cell is None]
+
+        if executor is None or len(to_build) < 2:
+            for i in to_build:
+                builder, kwargs = specs[i]
+                start = time.perf_counter()
+                cells[i] = getattr(self, builder)(**kwargs)
+                times[i] = time.perf_counter() - start
+        else:
+            builders, kwargs = zip(*[specs[i] for i in to_build])
+            packed = executor.map(
+                _build_cell, [state] * len(to_build), builders, kwargs
+            )
+            for i, (cell, build_time) in zip(to_build, packed):
+                cells[i] = utility.unpack_device(cell, masters=self._masters)
+                times[i] = build_time
+
+        for i, (builder, kwargs) in enumerate(specs):
+            if keys[i] is None:
+                continue
+            if i in to_build and utility._cell_cache["directory"] is not None:
+                utility._cell_cache_save(keys[i], cells[i])
+            self._specs[cells[i]] = {
+                "builder": builder,
+                "arguments": repr(kwargs),
+                "key": keys[i],
+            }
+        return cells, keys, times
+
+    def sweep(
+        self,
+        builder: str,
+        grid: Dict[str, List[Any]],
+        mode: str = "product",
+        workers: Optional[int] = None,
+        batch_size: Optional[int] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Builds and places the cells of a parametric sweep, as it is
+        iterated.
+
+        The grid of parameters is expanded lazily, and the cells are built in
+        batches (in parallel, see build_cells) and each batch is placed on the
+        chip as soon as it is built (see place_remaining_devices). Only a
+        batch of cells is held at once: the cells are released once placed,
+        and with stream_gds, the memory used does not grow with the number of
+        cells. The equivalent specs (same cache key) are built once, the cell
+        being placed again as a reference.
+
+        Parameters:
+            builder (str): The name of the Design's cell builder, e.g.
+                "ntron_cell".
+            grid (dict): The values of each keyword argument of the builder,
+                by name.
+            mode (str): "product" to build every combination of the values,
+                "zip" to build the n-th values of all arguments together.
+            workers (int, optional): The number of processes. If None, uses as
+                many processes as CPUs. If 1, the cells are built in this
+                process.
+            batch_size (int, optional): The number of cells built at once. If
+                None, 4 per process.
+
+        Yields:
+            dict: A report per cell, in the order of the grid: its "kwargs",
+            "name", build "time" (in s, 0 for a duplicate), whether it is a
+            "duplicate" of a previous cell, and whether it was "placed".
+
+        Raises:
+            ValueError: If the mode is unknown, or if the arguments of a "zip"
+                grid don't have as many values.
+
+        Examples:
+            Here is the ntrons sweep of place_remaining_devices, on 4 processes.
+
+            >>> sweep = design.sweep(
+            >>>     "ntron_cell",
+            >>>     grid={"choke_w": [0.05], "channel_w": [0.5, 0.75, 1, 1.25, 1.5]},
+            >>>     workers=4,
+            >>> )
+            >>> for report in sweep:
+            >>>     print(f"{report['name']}: {report['time']:.2f} s")
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if batch_size is None:
+            batch_size = 4 * workers
+        points = _expand_grid(grid, mode)
+        state = {
+            "die_parameters": self.die_parameters,
+            "device_outline": self.device_outline,
+            "layers": self.layers,
+        }
+        # the cells built, by key, while they are alive
+        built = weakref.WeakValueDictionary()
+
+        if workers > 1:
+            pool = ProcessPoolExecutor(max_workers=workers)
+        else:
+            # the cells are built in this process
+            pool = contextlib.nullcontext()
+        with pool as executor:
+            while True:
+                batch = list(itertools.islice(points, batch_size))
+                if not batch:
+                    return
+                keys = []
+                for i, kwargs in enumerate(batch):
+                    try:
+                        keys.append(
+                            utility._cell_cache_key(
+                                f"Design.{builder}", {"state": state, "kwargs": kwargs}
+                            )
+                        )
+                    except TypeError:
+                        keys.append(i)
+                cells = {k: built.get(k) for k in keys if k in built}
+                to_build = {
+                    k: kwargs for k, kwargs in zip(keys, batch) if cells.get(k) is None
+                }
+                built_cells, _, times = self._build_cells(
+                    [(builder, kwargs) for kwargs in to_build.values()], executor
+                )
+                build_times = dict(zip(to_build, times))
+                cells.update(zip(to_build, built_cells))
+                built.update((k, cells[k]) for k in to_build if not isinstance(k, int))
+
+                remaining = [cells[k] for k in keys]
+                names = [_cell_name(cell) for cell in remaining]
+                self.place_remaining_devices(remaining)
+                num_placed = len(keys) - len(remaining)
+                # the cells are only held by the CHIP, if placed
+                del cells, built_cells, remaining
+
+                for i, (k, kwargs) in enumerate(zip(keys, batch)):
+                    yield {
+                        "kwargs": kwargs,
+                        "name": names[i],
+                        "time": build_times.get(k, 0.0),
+                        "duplicate": k not in build_times,
+                        "placed": i < num_placed,
+                    }
+                    build_times.pop(k, None)
 
     # basics:
 
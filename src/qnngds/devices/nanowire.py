@@ -1,9 +1,127 @@
 """Single nanowire constriction."""
 
 from phidl import Device
-
 import phidl.geometry as pg
-from typing import Tuple, Optional
+
+import os
+import numpy as np
+import qnngds.geometries as geometry
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Optional
+
+
+def _nanowire_geometry(
+    channel_w: float, source_w: float, constr_length: float, num_pts: int
+) -> Tuple[List[np.ndarray], tuple, tuple]:
+    """Returns the polygons of a nanowire made of two optimal steps from
+    channel_w to source_w, joined by a constriction of length constr_length,
+    and its ports, as (midpoint, width, orientation) tuples.
+
+    The polygon is assembled from the step's edges, instead of uniting the
+    steps and the constriction, when the result is the same. The nanowire is
+    horizontal: it is rotated by spot and variable_length.
+    """
+    STEP = geometry.optimal_step(channel_w, source_w, symmetric=True, num_pts=num_pts)
+    p1 = STEP.ports[1]
+    p2 = STEP.ports[2]
+    if constr_length:
+        # as in the union of variable_length, where the source step is
+        # connected to the constriction before the constriction is connected
+        # to the ground step, the channel ends of the steps are only
+        # constr_length / 2 + p1.x apart
+        gap = constr_length / 2 + p1.x
+        if gap < 0 or constr_length / 2 > p2.x or channel_w > source_w:
+            # the steps overlap, or the constriction goes out of the source
+            # step: only the union gives the same nanowire
+            return _nanowire_union(STEP, channel_w, constr_length)
+        constr_length = gap
+
+    if channel_w == source_w:
+        # the step is a square
+        x1, x2 = p1.x, p2.x
+        upper = np.array([(x1, channel_w / 2), (x2, channel_w / 2)])
+        lower = np.array([(x2, -channel_w / 2), (x1, -channel_w / 2)])
+    else:
+        # the upper edge, from the channel to the source, then the lower one
+        points = STEP.polygons[0].polygons[0]
+        upper, lower = points[:num_pts], points[num_pts:]
+        if np.linalg.norm(points[0] - p1.midpoint) > np.linalg.norm(
+            points[0] - p2.midpoint
+        ):
+            # the step is drawn from the source
+            upper, lower = upper[::-1], lower[::-1]
+
+    # the source step is the ground step rotated by 180 degrees around the
+    # channel end, and moved away by the constriction's length
+    angle = np.deg2rad(p1.orientation)
+    direction = np.array([np.cos(angle), np.sin(angle)])
+    shift = 2 * np.array(p1.midpoint) + constr_length * direction
+    source = (shift - upper, shift - lower)
+    if constr_length == 0:
+        source = (source[0][1:], source[1][:-1])
+    polygon = np.concatenate((upper, lower) + source)
+
+    port1 = (shift - p2.midpoint, p2.width, p2.orientation + 180)
+    port2 = (p2.midpoint, p2.width, p2.orientation)
+    return [polygon], port1, port2
+
+
+def _nanowire_union(
+    STEP: Device, channel_w: float, constr_length: float
+) -> Tuple[List[np.ndarray], tuple, tuple]:
+    """Returns the polygons and ports of a variable_length nanowire, as
+    _nanowire_geometry does, from the union of its steps and constriction."""
+    NANOWIRE = Device()
+    line = pg.rectangle((constr_length, channel_w))
+    line.center = [0, 0]
+    line.add_port(
+        "top", midpoint=(-constr_length / 2, 0), orientation=180, width=channel_w
+    )
+    line.add_port(
+        "bottom", midpoint=(constr_length / 2, 0), orientation=0, width=channel_w
+    )
+
+    source = NANOWIRE << STEP
+    constriction = NANOWIRE << line
+    gnd = NANOWIRE << STEP
+    source.connect(source.ports[1], constriction.ports["top"])
+    constriction.connect(constriction.ports["bottom"], gnd.ports[1])
+
+    polygons = pg.union(NANOWIRE).get_polygons()
+    ports = [
+        (p.midpoint, p.width, p.orientation) for p in (source.ports[2], gnd.ports[2])
+    ]
+    return polygons, ports[0], ports[1]
+
+
+def _nanowire(
+    channel_w: float,
+    source_w: float,
+    constr_length: float,
+    layer: int,
+    num_pts: int,
+    shape: Optional[tuple] = None,
+) -> Device:
+    """Returns a nanowire as a Device, vertical and centered.
+
+    Args:
+        shape (tuple, optional): The nanowire's polygon and ports, if already
+            computed with _nanowire_geometry.
+        others: see variable_length.
+    """
+    if shape is None:
+        shape = _nanowire_geometry(channel_w, source_w, constr_length, num_pts)
+    polygons, port1, port2 = shape
+
+    NANOWIRE = Device()
+    NANOWIRE.add_polygon(polygons, layer=layer)
+    for name, (midpoint, width, orientation) in ((1, port1), (2, port2)):
+        NANOWIRE.add_port(
+            name=name, midpoint=midpoint, width=width, orientation=orientation % 360
+        )
+    NANOWIRE.rotate(-90)
+    NANOWIRE.move(NANOWIRE.center, (0, 0))
+    return NANOWIRE
 
 
 def spot(
@@ -25,17 +143,7 @@ def spot(
         Device: A device containing 2 optimal steps joined at their channel_w end.
     """
 
-    NANOWIRE = Device()
-    wire = pg.optimal_step(channel_w, source_w, symmetric=True, num_pts=num_pts)
-    source = NANOWIRE << wire
-    gnd = NANOWIRE << wire
-    source.connect(source.ports[1], gnd.ports[1])
-
-    NANOWIRE = pg.union(NANOWIRE, layer=layer)
-    NANOWIRE.add_port(name=1, port=source.ports[2])
-    NANOWIRE.add_port(name=2, port=gnd.ports[2])
-    NANOWIRE.rotate(-90)
-    NANOWIRE.move(NANOWIRE.center, (0, 0))
+    NANOWIRE = _nanowire(channel_w, source_w, 0, layer, num_pts)
     NANOWIRE.name = f"NANOWIRE.SPOT(w={channel_w})"
 
     return NANOWIRE
@@ -62,28 +170,64 @@ def variable_length(
         Device: A device containing 2 optimal steps to/from a narrow wire.
     """
 
-    NANOWIRE = Device()
-    wire = pg.optimal_step(channel_w, source_w, symmetric=True, num_pts=num_pts)
-    line = pg.rectangle((constr_length, channel_w), layer=layer)
-    line.center = [0, 0]
-    line.add_port(
-        "top", midpoint=(-constr_length / 2, 0), orientation=180, width=channel_w
-    )
-    line.add_port(
-        "bottom", midpoint=(constr_length / 2, 0), orientation=0, width=channel_w
-    )
-
-    source = NANOWIRE << wire
-    constriction = NANOWIRE << line
-    gnd = NANOWIRE << wire
-    source.connect(source.ports[1], constriction.ports["top"])
-    constriction.connect(constriction.ports["bottom"], gnd.ports[1])
-
-    NANOWIRE = pg.union(NANOWIRE, layer=layer)
-    NANOWIRE.add_port(name=1, port=source.ports[2])
-    NANOWIRE.add_port(name=2, port=gnd.ports[2])
-    NANOWIRE.rotate(-90)
-    NANOWIRE.move(NANOWIRE.center, (0, 0))
+    NANOWIRE = _nanowire(channel_w, source_w, constr_length, layer, num_pts)
     NANOWIRE.name = f"NANOWIRE.VAR(w={channel_w} l={constr_length})"
 
     return NANOWIRE
+
+
+def batch(
+    parameters: List[Tuple[float, ...]],
+    layer: int = 1,
+    num_pts: int = 100,
+    workers: Optional[int] = None,
+) -> List[Device]:
+    """Creates several nanowires at once, e.g. for a sweep.
+
+    Each nanowire is given by a (channel_w, source_w) tuple, for a spot, or
+    by a (channel_w, source_w, constr_length) tuple, for a variable_length.
+    The geometry of identical tuples is computed once, and the geometry of
+    the other ones in a pool of processes. Each nanowire is its own Device.
+
+    Args:
+        parameters (list of tuple of float): The parameters of the nanowires.
+        layer (int): The layer where to put the devices.
+        num_pts (int): The number of points comprising the optimal_steps geometries.
+        workers (int, optional): The number of processes. If None, uses as
+            many processes as CPUs. If 1, the nanowires are built in this
+            process.
+
+    Returns:
+        List[Device]: The nanowires, in the order of the parameters.
+
+    Examples:
+        >>> wires = nanowire.batch([(0.1 * i, i) for i in range(1, 9)] * 2)
+        >>> wires[0].area() == wires[8].area()
+        True
+    """
+    unique = list(dict.fromkeys(tuple(p) for p in parameters))
+    args = [(p[0], p[1], p[2] if len(p) > 2 else 0, num_pts) for p in unique]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1 or len(unique) < 2:
+        shapes = [_nanowire_geometry(*a) for a in args]
+    else:
+        chunksize = max(1, len(args) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            shapes = list(
+                executor.map(_nanowire_geometry, *zip(*args), chunksize=chunksize)
+            )
+
+    shapes = dict(zip(unique, shapes))
+    nanowires = []
+    for p in parameters:
+        p = tuple(p)
+        constr_length = p[2] if len(p) > 2 else 0
+        NANOWIRE = _nanowire(p[0], p[1], constr_length, layer, num_pts, shapes[p])
+        if len(p) > 2:
+            NANOWIRE.name = f"NANOWIRE.VAR(w={p[0]} l={p[2]})"
+        else:
+            NANOWIRE.name = f"NANOWIRE.SPOT(w={p[0]})"
+        nanowires.append(NANOWIRE)
+    return nanowires
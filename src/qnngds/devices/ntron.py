@@ -4,6 +4,7 @@ from phidl import Device
 from phidl import Port
 
 import phidl.geometry as pg
+import qnngds.geometries as geometry
 from typing import Tuple, Optional
 
 
@@ -33,25 +34,25 @@ def smooth(
 
     D = Device()
 
-    choke = pg.optimal_step(gate_w, choke_w, symmetric=True, num_pts=100)
+    choke = geometry.optimal_step(gate_w, choke_w, symmetric=True, num_pts=100)
     k = D << choke
 
     channel = pg.compass(size=(channel_w, choke_w))
     c = D << channel
     c.connect(channel.ports["W"], choke.ports[2])
 
-    drain = pg.optimal_step(drain_w, channel_w)
+    drain = geometry.optimal_step(drain_w, channel_w)
     d = D << drain
     d.connect(drain.ports[2], c.ports["N"])
 
-    source = pg.optimal_step(channel_w, source_w)
+    source = geometry.optimal_step(channel_w, source_w)
     s = D << source
     s.connect(source.ports[1], c.ports["S"])
 
     k.movey(choke_shift)
 
     precision = 1e-6
-    D = pg.union(D, precision=precision)
+    D = geometry.union(D, precision=precision)
     D.flatten(single_layer=layer)
     # move ports towards device center by 2*precision
     names = ("g", "d", "s")
@@ -119,7 +120,7 @@ def sharp(
     s.connect(source.ports[1], c.ports["S"])
 
     precision = 1e-6
-    D = pg.union(D, precision=precision)
+    D = geometry.union(D, precision=precision)
     D.flatten(single_layer=layer)
     # move ports towards device center by 2*precision
     names = ("g", "d", "s")
@@ -5,6 +5,7 @@ import numpy as np
 from phidl import Device
 
 import phidl.geometry as pg
+import qnngds.geometries as geometry
 from typing import Tuple, Optional
 
 
@@ -49,7 +50,7 @@ def meander(
             s.move((-s.xmax, -s.ymin + (1 + meander_spacing) * width * i))
         c = H << conn
         c.move((-c.xmin, -c.ymin))
-        H = pg.union(H, by_layer=True)
+        H = geometry.union(H, by_layer=True)
         H.add_port(
             name=1,
             midpoint=(-hp_length + width, width / 2),
@@ -110,7 +111,7 @@ def meander(
         hp_prev = hp_i
     stub_bot = D << stub(180 * (n_turn % 2))
     stub_bot.connect(stub_bot.ports[1], hp_prev.ports[2 - (n_turn % 2)])
-    D = pg.union(D, by_layer=True, precision=0.01)
+    D = geometry.union(D, by_layer=True, precision=0.01)
     D.add_port(name=1, port=stub_top.ports[2])
     D.add_port(name=2, port=stub_bot.ports[2])
 
@@ -177,7 +178,7 @@ def meander_sc_contacts(
         c_sc.center = c.center
         ports.append(c_sc.ports[2 - (p % 2)])
 
-    CONTACTS = pg.union(CONTACTS, by_layer=True)
+    CONTACTS = geometry.union(CONTACTS, by_layer=True)
     CONTACTS.name = "CONTACTS"
     MEAN_SC_CONT << CONTACTS
 
@@ -1,9 +1,142 @@
 """Superconducting nanowire single photon detector geometries."""
 
 from phidl import Device
+from phidl import Port
 
+import numpy as np
 import phidl.geometry as pg
-from typing import Tuple, Optional, Union
+import qnngds.geometries as geometry
+from typing import List, Tuple, Optional, Union
+
+
+def _meander_size(
+    wire_width: float,
+    wire_pitch: float,
+    size: Tuple[Optional[Union[int, float]], Optional[Union[int, float]]],
+    num_squares: Optional[int],
+    terminals_same_side: bool,
+) -> Tuple[float, float, int]:
+    """Returns the width, the height and the number of wires of a meander, as
+    phidl.geometry.snspd sizes them."""
+    if num_squares is not None and (
+        (size is None) or ((size[0] is None) and (size[1]) is None)
+    ):
+        xy = np.sqrt(num_squares * wire_pitch * wire_width)
+        size = [xy, xy]
+        num_squares = None
+    if [size[0], size[1], num_squares].count(None) != 1:
+        raise ValueError(
+            "[qnngds] snspd requires that exactly ONE value of "
+            "the arguments num_squares and size be None "
+            "to prevent overconstraining, for example:\n"
+            ">>> snspd.basic(size = (3, None), num_squares = 2000)"
+        )
+    if size[0] is None:
+        ysize = size[1]
+        xsize = num_squares * wire_pitch * wire_width / ysize
+    elif size[1] is None:
+        xsize = size[0]
+        ysize = num_squares * wire_pitch * wire_width / xsize
+    else:
+        xsize = size[0]
+        ysize = size[1]
+
+    num_meanders = int(np.ceil(ysize / wire_pitch))
+    if (terminals_same_side is False) and ((num_meanders % 2) == 0):
+        num_meanders += 1
+    elif (terminals_same_side is True) and ((num_meanders % 2) == 1):
+        num_meanders += 1
+    return xsize, ysize, num_meanders
+
+
+def _meander_polygons(
+    wire_width: float,
+    wire_pitch: float,
+    xsize: float,
+    num_meanders: int,
+    turn_ratio: Union[int, float] = 4,
+    cut_terminals: bool = False,
+    max_points: int = 4000,
+) -> List[np.ndarray]:
+    """Returns the polygons of a meander, the same as the union of
+    phidl.geometry.snspd, without any boolean operation.
+
+    The wires are horizontal, spaced by wire_pitch, from y = 0 downwards, and
+    span x = -xsize/4 to 3*xsize/4 (the first wire starts, and the last wire
+    ends, at one of these ends). They are connected by optimal hairpin turns,
+    alternately on the right and on the left.
+
+    The meander is drawn as its two sides (the edge starting above the first
+    wire and the one starting below it), which are joined into closed polygons
+    cut across the wires at x = xsize/4, so that they have at most about
+    max_points points.
+
+    Args:
+        cut_terminals (bool): If True, the first and last half wires are
+            polygons of their own.
+        others: see basic.
+
+    Returns:
+        list of array-like[N][2]: The polygons of the meander.
+    """
+    w, p = wire_width, wire_pitch
+    a = (p + w) / 2
+    HAIRPIN = geometry.optimal_hairpin(
+        width=w, pitch=p, turn_ratio=turn_ratio, length=xsize / 2, num_pts=20
+    )
+    # the lower half of the hairpin: its curve, then 6 points around the prong
+    half = HAIRPIN.polygons[0].polygons[0]
+    curve = half[:-6]
+    x_turn = half[-6, 0]
+    x_port = half[:, 0].min()
+
+    # the outer and inner edges of a turn, from the upper to the lower wire,
+    # in the hairpin's coordinates
+    outer = np.array([(x_turn, a), (x_turn, -a)])
+    inner = np.concatenate((curve[:-1] * (1, -1), curve[::-1]))
+
+    # the two sides of the meander, and the indices of their points at the cuts
+    sides = ([], [])
+    cuts = ([], [])
+    lengths = [0, 0]
+
+    def add(n, points, cut=False):
+        if cut:
+            cuts[n].append(lengths[n])
+        sides[n].append(points)
+        lengths[n] += len(points)
+
+    for k in range(num_meanders):
+        edges = (w / 2, -w / 2) if k % 2 == 0 else (-w / 2, w / 2)
+        for n, edge in enumerate(edges):
+            if k == 0:
+                add(n, np.array([(-xsize / 4, edge)]))
+            add(n, np.array([(xsize / 4, -k * p + edge)]), cut=True)
+            if k == num_meanders - 1:
+                x_end = 3 * xsize / 4 if k % 2 == 0 else -xsize / 4
+                add(n, np.array([(x_end, -k * p + edge)]))
+                continue
+
+            # the turn to the next wire, on the right of even wires
+            turn = (outer, inner)[n] if k % 2 == 0 else (inner, outer)[n]
+            direction = 1 if k % 2 == 0 else -1
+            x = xsize / 4 + direction * (turn[:, 0] - x_port)
+            y = turn[:, 1] - (k + 0.5) * p
+            add(n, np.column_stack((x, y)))
+
+    # the polygons, between the cuts across some of the wires
+    step = max(1, max_points // (2 * len(inner) + 6))
+    lines = list(range(step, num_meanders - 1, step))
+    if cut_terminals:
+        lines = sorted({0, num_meanders - 1}.union(lines))
+    upper, lower = (np.concatenate(side) for side in sides)
+    bounds = [[0] + [cuts[n][j] for j in lines] + [lengths[n] - 1] for n in range(2)]
+    polygons = []
+    for i in range(len(lines) + 1):
+        u0, u1 = bounds[0][i], bounds[0][i + 1]
+        l0, l1 = bounds[1][i], bounds[1][i + 1]
+        polygons.append(np.concatenate((upper[u0 : u1 + 1], lower[l0 : l1 + 1][::-1])))
+    return polygons
 
 
 def basic(
@@ -17,7 +150,7 @@ def basic(
 ) -> Device:
     """Creates an optimally-rounded SNSPD.
 
-    Takes Phidl's snspd, perform a union and rename it.
+    The same as Phidl's snspd, unified, but drawn directly as a few polygons.
 
     Parameters:
         wire_width (float): Width of the nanowire.
@@ -43,18 +176,29 @@ def basic(
         )
         wire_pitch = 2 * wire_width
 
-    SNSPD = pg.snspd(
-        wire_width=wire_width,
-        wire_pitch=wire_pitch,
-        size=size,
-        num_squares=num_squares,
-        turn_ratio=turn_ratio,
-        terminals_same_side=terminals_same_side,
+    xsize, ysize, num_meanders = _meander_size(
+        wire_width, wire_pitch, size, num_squares, terminals_same_side
+    )
+    SNSPD = Device()
+    SNSPD.add_polygon(
+        _meander_polygons(wire_width, wire_pitch, xsize, num_meanders, turn_ratio),
         layer=layer,
     )
-    ports = SNSPD.ports
-    SNSPD = pg.union(SNSPD, layer=layer)
-    SNSPD.ports = ports
+
+    y_end = -(num_meanders - 1) * wire_pitch
+    SNSPD.add_port(name=1, midpoint=(-xsize / 4, 0), width=wire_width, orientation=180)
+    if num_meanders % 2:
+        SNSPD.add_port(
+            name=2, midpoint=(3 * xsize / 4, y_end), width=wire_width, orientation=0
+        )
+    else:
+        SNSPD.add_port(
+            name=2, midpoint=(-xsize / 4, y_end), width=wire_width, orientation=180
+        )
+
+    SNSPD.info["num_squares"] = num_meanders * (xsize / wire_width)
+    SNSPD.info["area"] = xsize * ysize
+    SNSPD.info["size"] = (xsize, ysize)
     SNSPD.name = f"SNSPD.BASIC(w={wire_width}, pitch={wire_pitch})"
     return SNSPD
 
@@ -89,55 +233,69 @@ def vertical(
         )
         wire_pitch = 2 * wire_width
 
-    D = Device("SNSPD VERTICAL")
-
-    S = pg.snspd(
-        wire_width=wire_width,
-        wire_pitch=wire_pitch,
-        size=size,
-        num_squares=num_squares,
-        terminals_same_side=False,
-        layer=layer,
+    xsize, ysize, num_meanders = _meander_size(
+        wire_width, wire_pitch, size, num_squares, terminals_same_side=False
+    )
+    meander = _meander_polygons(
+        wire_width, wire_pitch, xsize, num_meanders, cut_terminals=True
     )
-    s1 = D << S
+    y_end = -(num_meanders - 1) * wire_pitch
 
-    HP = pg.optimal_hairpin(
-        width=wire_width, pitch=wire_pitch, length=S.xsize / 2, layer=layer
+    # the hairpins and bends that bring the terminals to the center, only
+    # united with the first and last half wires of the meander
+    ENDS = Device()
+
+    HP = geometry.optimal_hairpin(
+        width=wire_width, pitch=wire_pitch, length=xsize / 2, layer=layer
+    )
+    h1 = ENDS << HP
+    h1.connect(
+        h1.ports[1], Port(midpoint=(xsize / 4, 0), width=wire_width, orientation=0)
     )
-    h1 = D << HP
-    h1.connect(h1.ports[1], S.references[0].ports["E"])
     h1.rotate(180, h1.ports[1])
 
-    h2 = D << HP
-    h2.connect(h2.ports[1], S.references[-1].ports["E"])
+    h2 = ENDS << HP
+    h2.connect(
+        h2.ports[1],
+        Port(midpoint=(xsize / 4, y_end), width=wire_width, orientation=180),
+    )
     h2.rotate(180, h2.ports[1])
 
-    T = pg.optimal_90deg(width=wire_width, layer=layer)
-    t1 = D << T
+    T = geometry.optimal_90deg(width=wire_width, layer=layer)
+    t1 = ENDS << T
     T_width = t1.ports[2].midpoint[0]
     t1.connect(t1.ports[1], h1.ports[2])
     t1.movex(-T_width + wire_width / 2)
 
-    t2 = D << T
+    t2 = ENDS << T
     t2.connect(t2.ports[1], h2.ports[2])
     t2.movex(T_width - wire_width / 2)
 
-    D = pg.union(D, layer=layer)
-    D.flatten()
+    ends = [[meander[0]] + h1.get_polygons() + t1.get_polygons()]
+    ends.append([meander[-1]] + h2.get_polygons() + t2.get_polygons())
+
+    D = Device("SNSPD VERTICAL")
     if extend:
         E = pg.straight(size=(wire_width, extend), layer=layer)
-        e1 = D << E
+        e1 = ENDS << E
         e1.connect(e1.ports[1], t1.ports[2])
-        e2 = D << E
+        e2 = ENDS << E
         e2.connect(e2.ports[1], t2.ports[2])
-        D = pg.union(D, layer=layer)
+        ends[0] += e1.get_polygons()
+        ends[1] += e2.get_polygons()
         D.add_port(name=1, port=e1.ports[2])
         D.add_port(name=2, port=e2.ports[2])
     else:
         D.add_port(name=1, port=t1.ports[2])
         D.add_port(name=2, port=t2.ports[2])
 
-    D.info = S.info
+    D.add_polygon(meander[1:-1], layer=layer)
+    for polygons in ends:
+        D.add_polygon(geometry.union_polygons(polygons), layer=layer)
+
+    D.info["num_squares"] = num_meanders * (xsize / wire_width)
+    D.info["area"] = xsize * ysize
+    D.info["size"] = (xsize, ysize)
     D.move(D.center, (0, 0))
     D.name = f"SNSPD.VERTICAL(w={wire_width}, pitch={wire_pitch})"
     return D
@@ -1,18 +1,44 @@
 """Geometries contains useful shapes/tools that are not available in phidl's
 geometry library."""
 
-from phidl import Device
+from phidl import Device, Layer, Port
+from phidl.device_layout import DeviceReference, Polygon
+import phidl.geometry as pg
+import gdspy
+import numbers
 import numpy as np
+from typing import Dict, List, Optional, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
+# how the boolean operations are split in tiles and layers, see set_tiling
+_tiling = {
+    "enabled": True,
+    "tile_vertices": 10000,
+    "workers": 1,
+    "layer_workers": 1,
+    "compare": False,
+}
 
-def hyper_taper(length=10, wide_section=50, narrow_section=5, layer=1):
+# the processes of map_layers, started by its first call and kept for the
+# next ones (see set_tiling)
+_layer_pool = {"executor": None, "workers": 0}
+
+
+def hyper_taper(length=10, wide_section=50, narrow_section=5, layer=1, tolerance=1e-3):
     """Hyperbolic taper (solid). Designed by colang.
 
+    The edges are sampled more densely where they are more curved, so that
+    the polygon does not deviate from the hyperbolic cosine by more than the
+    tolerance. If wide_section equals narrow_section, the taper is a
+    rectangle.
+
     Args:
         length (float): Length of taper.
         wide_section (float): Wide width dimension.
         narrow_section (float): Narrow width dimension.
         layer (int): Layer for device to be created on.
+        tolerance (float): Maximum distance between the edges of the polygon
+            and the hyperbolic cosine (chord error).
 
     Returns:
         Device: The hyper taper.
@@ -20,21 +46,1085 @@ def hyper_taper(length=10, wide_section=50, narrow_section=5, layer=1):
 
     taper_length = length
     wide = wide_section
-    zero = 0
     narrow = narrow_section
-    x_list = np.arange(0, taper_length + 0.1, 0.1)
-    x_list2 = np.arange(taper_length, -0.1, -0.1)
-    pts = []
 
     a = np.arccosh(wide / narrow) / taper_length
 
-    for x in x_list:
-        pts.append((x, np.cosh(a * x) * narrow / 2))
-    for y in x_list2:
-        pts.append((y, -np.cosh(a * y) * narrow / 2))
-        HT = Device("hyper_taper")
-        hyper_taper = HT.add_polygon(pts)
-        HT.add_port(name=1, midpoint=[0, 0], width=narrow, orientation=180)
-        HT.add_port(name=2, midpoint=[taper_length, 0], width=wide, orientation=0)
-        HT.flatten(single_layer=layer)
+    # edge y = cosh(a x) * narrow / 2: a chord of length s deviates by about
+    # curvature * s**2 / 8, so the edge needs about
+    # sqrt(curvature / (8 * tolerance)) points per unit of arc length
+    x = np.linspace(0, taper_length, 1001)
+    dy = np.sinh(a * x) * a * narrow / 2
+    d2y = np.cosh(a * x) * a**2 * narrow / 2
+    curvature = d2y / (1 + dy**2) ** 1.5
+    density = np.sqrt(curvature / (8 * tolerance)) * np.sqrt(1 + dy**2)
+    # at least one segment over the length, where the edge is straight
+    density = np.maximum(density, 1 / taper_length)
+    num_points = np.concatenate(
+        ([0], np.cumsum((density[1:] + density[:-1]) / 2 * np.diff(x)))
+    )
+    n = max(int(np.ceil(num_points[-1])), 1)
+    x = np.interp(np.linspace(0, num_points[-1], n + 1), num_points, x)
+    y = np.cosh(a * x) * narrow / 2
+
+    pts = np.concatenate(
+        (np.column_stack((x, y)), np.column_stack((x[::-1], -y[::-1])))
+    )
+    HT = Device("hyper_taper")
+    HT.add_polygon(pts, layer=layer)
+    HT.add_port(name=1, midpoint=[0, 0], width=narrow, orientation=180)
+    HT.add_port(name=2, midpoint=[taper_length, 0], width=wide, orientation=0)
     return HT
+
+
+# the optimal curves of unit width, by kind, width ratio and number of points
+_optimal_curves: Dict[tuple, tuple] = {}
+
+
+def clear_optimal_curve_cache() -> None:
+    """Clears the optimal curves shared by the optimal steps, hairpins and
+    bends."""
+    _optimal_curves.clear()
+
+
+def _optimal_curve(kind: str, ratio: float, num_pts: int, *args) -> tuple:
+    """Returns the points of an optimal curve for a unit width, solved once
+    per kind ("step", "hairpin" or "90deg"), width ratio (end_width /
+    start_width, pitch / width, or 1) and num_pts.
+
+    The curves of phidl's optimal_step, optimal_hairpin and optimal_90deg
+    scale with their width, for a given ratio: they are scaled per call.
+
+    Returns:
+        tuple: The points, and for a step its number of squares.
+    """
+    key = (kind, round(ratio, 10), num_pts) + args
+    if key not in _optimal_curves:
+        if kind == "step":
+            (width_tol,) = args
+            D = pg.optimal_step(1, key[1], num_pts, width_tol, anticrowding_factor=1)
+            curve = (D.polygons[0].polygons[0][:-2], D.info["num_squares"])
+        elif kind == "hairpin":
+            D = pg.optimal_hairpin(width=1, pitch=key[1], num_pts=num_pts)
+            curve = (D.polygons[0].polygons[0][:-6],)
+        elif kind == "90deg":
+            (length_adjust,) = args
+            D = pg.optimal_90deg(1, num_pts, length_adjust)
+            curve = (D.polygons[0].polygons[0],)
+        _optimal_curves[key] = curve
+    return _optimal_curves[key]
+
+
+def optimal_step(
+    start_width: float = 10,
+    end_width: float = 22,
+    num_pts: int = 50,
+    width_tol: float = 1e-3,
+    anticrowding_factor: float = 1.2,
+    symmetric: bool = False,
+    layer: int = 0,
+) -> Device:
+    """Creates an optimally-rounded step geometry, like
+    phidl.geometry.optimal_step, from a curve solved once per width ratio.
+
+    Args:
+        start_width (float): Width of the connector on the left end of the step.
+        end_width (float): Width of the connector on the right end of the step.
+        num_pts (int): The number of points comprising the entire step geometry.
+        width_tol (float): Point at which to terminate the calculation of the
+            optimal step.
+        anticrowding_factor (float): Factor to reduce current crowding by
+            elongating the structure and reducing the curvature.
+        symmetric (bool): If True, adds a mirrored copy of the step across the
+            x-axis to the geometry and adjusts the width of the ports.
+        layer (int or array-like[2]): The layer to put the step on.
+
+    Returns:
+        Device: A Device containing an optimally-rounded step.
+    """
+    narrow, wide = sorted((start_width, end_width))
+    D = Device(name="step")
+    if narrow == wide:  # Just return a square
+        xpts = np.array([0, 0, narrow, narrow])
+        ypts = np.array([0, narrow, narrow, 0])
+        if symmetric:
+            ypts = ypts - narrow / 2
+        D.info["num_squares"] = 1
+    else:
+        points, num_squares = _optimal_curve("step", wide / narrow, num_pts, width_tol)
+        xpts, ypts = points.T * narrow
+        ypts[0], ypts[-1] = narrow, wide
+        if not symmetric:
+            xpts = np.append(xpts, (xpts[-1], xpts[0]))
+            ypts = np.append(ypts, (0, 0))
+        else:
+            xpts = np.concatenate((xpts, xpts[::-1])) / 2
+            ypts = np.concatenate((ypts, -ypts[::-1])) / 2
+        xpts = xpts * anticrowding_factor
+        if start_width > end_width:
+            xpts = -xpts
+        D.info["num_squares"] = num_squares
+    D.add_polygon([xpts, ypts], layer=layer)
+
+    if not symmetric:
+        D.add_port(
+            name=1,
+            midpoint=[min(xpts), start_width / 2],
+            width=start_width,
+            orientation=180,
+        )
+        D.add_port(
+            name=2, midpoint=[max(xpts), end_width / 2], width=end_width, orientation=0
+        )
+    else:
+        D.add_port(name=1, midpoint=[min(xpts), 0], width=start_width, orientation=180)
+        D.add_port(name=2, midpoint=[max(xpts), 0], width=end_width, orientation=0)
+    return D
+
+
+def optimal_hairpin(
+    width: float = 0.2,
+    pitch: float = 0.6,
+    length: float = 10,
+    turn_ratio: float = 4,
+    num_pts: int = 50,
+    layer: int = 0,
+) -> Device:
+    """Creates an optimally-rounded hairpin geometry, like
+    phidl.geometry.optimal_hairpin, from a curve solved once per pitch to
+    width ratio.
+
+    Args:
+        width (float): Width of the hairpin leads.
+        pitch (float): Distance between the two hairpin leads. Must be
+            greater than width.
+        length (float): Length of the hairpin from the connectors to the
+            opposite end of the curve.
+        turn_ratio (float): Specifies how much of the hairpin is dedicated to
+            the 180 degree turn. A turn_ratio of 10 will result in 20% of the
+            hairpin being comprised of the turn.
+        num_pts (int): Number of points constituting the 180 degree turn.
+        layer (int or array-like[2]): The layer to put the hairpin on.
+
+    Returns:
+        Device: A Device containing an optimally-rounded hairpin geometry.
+    """
+    (curve,) = _optimal_curve("hairpin", pitch / width, num_pts)
+    a = (pitch + width) / 2
+    x, y = curve.T * width
+    x_turn = x[-1] + turn_ratio * width
+    x_port = max(x.max(), x_turn) - length
+    xpts = np.append(x, (x_turn, x_turn, x[0], x_port, x_port, x[0]))
+    ypts = np.append(y, (0, -a, -a, -a, -a + width, y[0]))
+
+    D = Device(name="hairpin")
+    D.add_polygon([xpts, ypts], layer=layer)
+    D.add_polygon([xpts, -ypts], layer=layer)
+
+    yports = -a + width / 2
+    D.add_port(name=1, midpoint=[x_port, -yports], width=width, orientation=180)
+    D.add_port(name=2, midpoint=[x_port, yports], width=width, orientation=180)
+    return D
+
+
+def optimal_90deg(
+    width: float = 100.0, num_pts: int = 15, length_adjust: float = 1, layer: int = 0
+) -> Device:
+    """Creates an optimally-rounded 90 degree bend that is sharp on the outer
+    corner, like phidl.geometry.optimal_90deg, from a curve computed once.
+
+    Args:
+        width (float): Width of the ports on either side of the bend.
+        num_pts (int): The number of points comprising the curved section of
+            the bend.
+        length_adjust (float): Adjusts the length of the non-curved portion of
+            the bend.
+        layer (int or array-like[2]): The layer to put the bend on.
+
+    Returns:
+        Device: A Device containing an optimally-rounded 90 degree bend.
+    """
+    (points,) = _optimal_curve("90deg", 1, num_pts, length_adjust)
+    points = points * width
+    d = 2 * points[0, 0]
+
+    D = Device("90deg")
+    D.add_polygon(points, layer=layer)
+    D.add_port(name=1, midpoint=[width / 2, d], width=width, orientation=90)
+    D.add_port(name=2, midpoint=[d, width / 2], width=width, orientation=0)
+    return D
+
+
+_glyph_masters: Dict[tuple, Device] = {}
+
+# the polygons and advance of each character of phidl's DEPLOF font, at size
+# 1000 (in font units)
+_font_glyphs: Dict[str, Tuple[List[np.ndarray], float]] = {}
+
+
+def clear_glyph_cache() -> None:
+    """Clears the glyphs shared by the texts."""
+    _glyph_masters.clear()
+
+
+def text(
+    text: str = "abcd",
+    size: float = 10,
+    justify: str = "left",
+    layer: int = 0,
+    outline: Optional[float] = None,
+) -> Device:
+    """Creates text, like phidl.geometry.text with its default font (DEPLOF),
+    from glyphs shared between all the texts.
+
+    Each glyph is built once per (character, size, layer, outline) and the
+    text is made of references to the glyphs, so that repeated characters
+    and labels are built and written once.
+
+    Args:
+        text (str): The text, on one or several lines.
+        size (float): The size of the text.
+        justify (str): The justification of the lines, "left", "right" or
+            "center".
+        layer (int, array-like[2] or set): The layer(s) of the text.
+        outline (float, optional): If not None, the glyphs are outlined by
+            this distance (see outline). The outlines of neighbouring glyphs
+            can overlap the glyphs: subtract the text from them to get the
+            exact outline of the text.
+
+    Returns:
+        Device: The text.
+    """
+    T = Device("text")
+    scaling = size / 1000
+    yoffset = 0
+    for line in text.split("\n"):
+        glyphs = []
+        xoffset = 0
+        for character in line:
+            ascii_val = ord(character)
+            if character == " ":
+                xoffset += 500 * scaling
+            elif (33 <= ascii_val <= 126) or (ascii_val == 181):
+                glyphs.append((character, xoffset))
+                xoffset += _font_glyph(character)[1] * scaling
+            else:
+                print(f'Warning, no geometry for character "{character}", ignored.')
+        if not glyphs:
+            yoffset -= 1500 * scaling
+            continue
+
+        # justify the line on the glyphs, not on their outlines
+        bboxes = np.array(
+            [_text_glyph(c, size, layer).bbox[:, 0] + x for c, x in glyphs]
+        )
+        xmin, xmax = bboxes[:, 0].min(), bboxes[:, 1].max()
+        shift = {"left": 0, "right": -xmax, "center": -(xmin + xmax) / 2}
+        shift = shift[justify.lower()]
+        for character, x in glyphs:
+            glyph = T.add_ref(_text_glyph(character, size, layer, outline))
+            glyph.move((x + shift, yoffset))
+        yoffset -= 1500 * scaling
+    return T
+
+
+def _text_glyph(
+    character: str, size: float, layer, outline_distance: Optional[float] = None
+) -> Device:
+    """Returns the shared glyph of a character, outlined if outline_distance
+    is not None."""
+    if isinstance(layer, set):
+        layer_key = frozenset(layer)
+    elif isinstance(layer, (list, np.ndarray)):
+        layer_key = tuple(layer)
+    else:
+        layer_key = layer
+    key = (character, size, layer_key, outline_distance)
+    if key not in _glyph_masters:
+        if outline_distance is None:
+            GLYPH = Device(f"GLYPH {ord(character)} {size}")
+            for points in _font_glyph(character)[0]:
+                GLYPH.add_polygon(points * (size / 1000), layer=layer)
+        else:
+            GLYPH = outline(
+                _text_glyph(character, size, layer), outline_distance, layer=layer
+            )
+            GLYPH.name = f"GLYPH {ord(character)} {size} OUTLINE {outline_distance}"
+        _glyph_masters[key] = GLYPH
+    return _glyph_masters[key]
+
+
+def _font_glyph(character: str) -> Tuple[List[np.ndarray], float]:
+    """Returns the polygons and the advance (width and indent) of a
+    character of phidl's DEPLOF font, at size 1000.
+
+    They are read from phidl.geometry.text: at size 1000, the font units are
+    not scaled, and the advance is where the second of two characters ends
+    minus where the first one ends.
+    """
+    if character not in _font_glyphs:
+        TEXT = pg.text(character, size=1000)
+        advance = pg.text(character * 2, size=1000).xmax - TEXT.xmax
+        _font_glyphs[character] = (TEXT.get_polygons(), advance)
+    return _font_glyphs[character]
+
+
+def set_tiling(
+    enabled: Optional[bool] = None,
+    tile_vertices: Optional[int] = None,
+    workers: Optional[int] = None,
+    compare: Optional[bool] = None,
+    layer_workers: Optional[int] = None,
+) -> None:
+    """Sets how the boolean operations of qnngds (outline, boolean, union and
+    invert) are split in tiles.
+
+    Large operations are split in tiles of about tile_vertices vertices, run
+    independently and stitched together, which is faster than a single
+    operation. The polygons cut by the tiles' edges are merged back together.
+
+    Args:
+        enabled (bool, optional): If False, every operation runs in a single
+            tile, as phidl does by default. If None, keeps the current value
+            (True by default).
+        tile_vertices (int, optional): The number of vertices per tile. If
+            None, keeps the current value (10000 by default).
+        workers (int, optional): The number of threads the tiles run on. If
+            None, keeps the current value (1 by default).
+        compare (bool, optional): If True, the tiled operations are also run
+            in a single tile, a warning is printed if the results differ and
+            the single tile result is used. If None, keeps the current value
+            (False by default).
+        layer_workers (int, optional): The number of processes the layers of
+            the layer by layer operations (see map_layers) run on. If None,
+            keeps the current value (1 by default).
+    """
+    if enabled is not None:
+        _tiling["enabled"] = enabled
+    if compare is not None:
+        _tiling["compare"] = compare
+    if tile_vertices is not None:
+        _tiling["tile_vertices"] = tile_vertices
+    if workers is not None:
+        _tiling["workers"] = workers
+    if layer_workers is not None:
+        _tiling["layer_workers"] = layer_workers
+        if (
+            _layer_pool["executor"] is not None
+            and _layer_pool["workers"] != layer_workers
+        ):
+            # the processes are started again by the next map_layers
+            _layer_pool["executor"].shutdown()
+            _layer_pool.update(executor=None, workers=0)
+
+
+def _layer_executor() -> ProcessPoolExecutor:
+    """Returns the processes of map_layers, started if needed."""
+    if _layer_pool["executor"] is None:
+        workers = _tiling["layer_workers"]
+        _layer_pool.update(executor=ProcessPoolExecutor(workers), workers=workers)
+    return _layer_pool["executor"]
+
+
+def map_layers(operations: dict) -> dict:
+    """Runs the operation function(*args) of each layer.
+
+    The layers run on the processes set by set_tiling(layer_workers=...), so
+    that a multi-layer operation takes about the time of its slowest layer.
+    The processes are started once and kept for the next operations. The
+    functions and their arguments must be picklable.
+
+    Args:
+        operations (dict): The (function, args) operation of each layer.
+
+    Returns:
+        dict: The result of the operation of each layer.
+    """
+    if min(_tiling["layer_workers"], len(operations)) <= 1:
+        return {
+            layer: function(*args) for layer, (function, args) in operations.items()
+        }
+    executor = _layer_executor()
+    futures = {
+        layer: executor.submit(function, *args)
+        for layer, (function, args) in operations.items()
+    }
+    return {layer: future.result() for layer, future in futures.items()}
+
+
+def auto_num_divisions(
+    polygons: List[np.ndarray], tile_vertices: Optional[int] = None
+) -> List[int]:
+    """Chooses how many tiles to split a boolean operation in.
+
+    The polygons' bounding box is split in tiles of about tile_vertices
+    vertices, as square as possible.
+
+    Args:
+        polygons (list of array-like[N][2]): The polygons of the operation.
+        tile_vertices (int, optional): The number of vertices per tile. If
+            None, uses the one set by set_tiling.
+
+    Returns:
+        list of int: The number of tiles along x and y (num_divisions), [1, 1]
+        if the tiling is disabled.
+    """
+    if not _tiling["enabled"]:
+        return [1, 1]
+    if tile_vertices is None:
+        tile_vertices = _tiling["tile_vertices"]
+    num_vertices = sum(len(p) for p in polygons)
+    num_tiles = int(np.ceil(num_vertices / tile_vertices))
+    if num_tiles <= 1:
+        return [1, 1]
+    points = np.concatenate(polygons)
+    w, h = np.ptp(points, axis=0) + 1e-9
+    nx = int(np.clip(round(np.sqrt(num_tiles * w / h)), 1, num_tiles))
+    ny = int(np.ceil(num_tiles / nx))
+    return [nx, ny]
+
+
+def outline(
+    elements,
+    distance: float = 1,
+    precision: float = 1e-4,
+    num_divisions: Optional[List[int]] = None,
+    join: str = "miter",
+    tolerance: float = 2,
+    join_first: bool = True,
+    max_points: int = 4000,
+    open_ports: Union[bool, float] = False,
+    layer: int = 0,
+) -> Device:
+    """Creates an outline around the polygons of elements, like
+    phidl.geometry.outline.
+
+    The polygons are gathered once, offset and subtracted in a single pass:
+    the trims opening the ports are computed directly from the ports, and
+    large inputs are split in tiles (num_divisions) chosen automatically.
+
+    Args:
+        elements (Device, DeviceReference, Polygon or list of them): The
+            polygons to outline.
+        distance (float): Distance to offset the polygons. Positive values
+            expand, negative shrink.
+        precision (float): Desired precision for rounding vertex coordinates.
+        num_divisions (array-like[2] of int, optional): The number of tiles
+            along x and y. If None, chosen with auto_num_divisions.
+        join (str): Type of join used to offset the polygons, "miter",
+            "bevel" or "round".
+        tolerance (float): For miter joins, the maximal distance in multiples
+            of offset between new vertices and their original position. For
+            round joins, the number of points per full circle.
+        join_first (bool): Join all paths before offsetting.
+        max_points (int): The maximal number of points of each polygon.
+        open_ports (bool or float): If not False, the outline is opened at
+            the ports of the Devices, with an extra width of 2 * open_ports on
+            each side (0 if True).
+        layer (int or array-like[2]): The layer of the outline.
+
+    Returns:
+        Device: The outline.
+    """
+    elements = _as_list(elements)
+    polygons = []
+    ports = []
+    for e in elements:
+        if isinstance(e, Device):
+            ports += list(e.ports.values())
+        polygons += _get_polygons(e)
+
+    trims = []
+    if open_ports is not False:
+        trim_width = 0 if open_ports is True else open_ports * 2
+        trims = _port_trims(
+            ports, distance + 6 * precision, trim_width, overlap=2 * precision
+        )
+
+    D = Device("outline")
+    result = outline_polygons(
+        polygons,
+        trims,
+        distance,
+        precision,
+        num_divisions,
+        join,
+        tolerance,
+        join_first,
+        max_points,
+    )
+    if result:
+        D.add_polygon(result, layer=layer)
+
+    if open_ports is not False and len(elements) == 1:
+        for port in ports:
+            D.add_port(port=port)
+    return D
+
+
+def outline_polygons(
+    polygons: List[np.ndarray],
+    trims: List[np.ndarray],
+    distance: float = 1,
+    precision: float = 1e-4,
+    num_divisions: Optional[List[int]] = None,
+    join: str = "miter",
+    tolerance: float = 2,
+    join_first: bool = True,
+    max_points: int = 4000,
+) -> List[np.ndarray]:
+    """Returns the outline of polygons, opened by the trims, split in tiles.
+
+    This is the core of outline, on lists of polygons (that can be sent to
+    other processes, see map_layers).
+
+    Args:
+        polygons (list of array-like[N][2]): The polygons to outline.
+        trims (list of array-like[N][2]): The polygons removed from the
+            outline.
+        others: see outline.
+
+    Returns:
+        list of array-like[N][2]: The polygons of the outline.
+    """
+    if not polygons:
+        return []
+    polygons = _merge_floating_point_errors(polygons, tol=precision / 1000)
+
+    def outline_tile(P, T):
+        bloated = gdspy.offset(
+            P,
+            distance=distance,
+            join=join,
+            tolerance=tolerance,
+            precision=precision,
+            join_first=join_first,
+            max_points=max_points,
+        )
+        if bloated is None:
+            return []
+        A, B = (bloated, P + T) if distance > 0 else (P + T, bloated)
+        result = gdspy.boolean(A, B, "not", precision=precision, max_points=max_points)
+        return [] if result is None else result.polygons
+
+    if num_divisions is None:
+        num_divisions = auto_num_divisions(polygons)
+    margin = 1.01 * abs(distance) * max(tolerance, 1)
+    return _run_tiles(
+        outline_tile, [polygons, trims], num_divisions, margin, precision, max_points
+    )
+
+
+def boolean(
+    A,
+    B,
+    operation: str,
+    precision: float = 1e-4,
+    num_divisions: Optional[List[int]] = None,
+    max_points: int = 4000,
+    layer: int = 0,
+) -> Device:
+    """Performs a boolean operation between A and B, like
+    phidl.geometry.boolean, split in tiles (num_divisions) chosen
+    automatically for large inputs.
+
+    Args:
+        A (Device, DeviceReference, Polygon or list of them): The first
+            operand.
+        B (Device, DeviceReference, Polygon or list of them): The second
+            operand.
+        operation (str): The boolean operation, "not" or "A-B", "B-A", "and",
+            "or" or "xor".
+        precision (float): Desired precision for rounding vertex coordinates.
+        num_divisions (array-like[2] of int, optional): The number of tiles
+            along x and y. If None, chosen with auto_num_divisions.
+        max_points (int): The maximal number of points of each polygon.
+        layer (int or array-like[2]): The layer of the result.
+
+    Returns:
+        Device: The result of the boolean operation.
+    """
+    A_polygons = [p for e in _as_list(A) for p in _get_polygons(e)]
+    B_polygons = [p for e in _as_list(B) for p in _get_polygons(e)]
+    D = Device("boolean")
+    result = boolean_polygons(
+        A_polygons, B_polygons, operation, precision, num_divisions, max_points
+    )
+    if result:
+        D.add_polygon(result, layer=layer)
+    return D
+
+
+def boolean_polygons(
+    A_polygons: List[np.ndarray],
+    B_polygons: List[np.ndarray],
+    operation: str,
+    precision: float = 1e-4,
+    num_divisions: Optional[List[int]] = None,
+    max_points: int = 4000,
+) -> List[np.ndarray]:
+    """Returns the boolean operation between two lists of polygons, split in
+    tiles.
+
+    This is the core of boolean, on lists of polygons (that can be sent to
+    other processes, see map_layers).
+
+    Args:
+        A_polygons (list of array-like[N][2]): The first operand.
+        B_polygons (list of array-like[N][2]): The second operand.
+        others: see boolean.
+
+    Returns:
+        list of array-like[N][2]: The polygons of the result.
+    """
+    operation = operation.lower().replace(" ", "")
+    operations = {"a-b": "not", "b-a": "not", "a+b": "or"}
+    if operation == "b-a":
+        A_polygons, B_polygons = B_polygons, A_polygons
+    operation = operations.get(operation, operation)
+    if operation not in ("not", "and", "or", "xor"):
+        raise ValueError(
+            f"[qnngds] boolean() operation {operation} not recognized, "
+            'should be "not", "A-B", "B-A", "and", "or" or "xor".'
+        )
+
+    def boolean_tile(P, Q):
+        result = gdspy.boolean(
+            P, Q, operation, precision=precision, max_points=max_points
+        )
+        return [] if result is None else result.polygons
+
+    if num_divisions is None:
+        num_divisions = auto_num_divisions(A_polygons + B_polygons)
+    return _run_tiles(
+        boolean_tile, [A_polygons, B_polygons], num_divisions, 0, precision, max_points
+    )
+
+
+def union(
+    D,
+    by_layer: bool = False,
+    precision: float = 1e-4,
+    num_divisions: Optional[List[int]] = None,
+    max_points: int = 4000,
+    layer: int = 0,
+) -> Device:
+    """Performs the union of all the polygons of a Device, like
+    phidl.geometry.union, split in tiles (num_divisions) chosen
+    automatically for large inputs.
+
+    Args:
+        D (Device or DeviceReference): The polygons to unite.
+        by_layer (bool): If True, the union is done layer by layer, on the
+            layers of D (in parallel, see map_layers).
+        precision (float): Desired precision for rounding vertex coordinates.
+        num_divisions (array-like[2] of int, optional): The number of tiles
+            along x and y. If None, chosen with auto_num_divisions.
+        max_points (int): The maximal number of points of each polygon.
+        layer (int or array-like[2]): The layer of the result, if not
+            by_layer.
+
+    Returns:
+        Device: The union.
+    """
+    if by_layer:
+        layers_polygons = D.get_polygons(by_spec=True)
+    else:
+        layers_polygons = {layer: D.get_polygons()}
+    results = map_layers(
+        {
+            layer: (union_polygons, (polygons, precision, num_divisions, max_points))
+            for layer, polygons in layers_polygons.items()
+        }
+    )
+    U = Device("union")
+    for layer, result in results.items():
+        if result:
+            U.add_polygon(result, layer=layer)
+    return U
+
+
+def union_polygons(
+    polygons: List[np.ndarray],
+    precision: float = 1e-4,
+    num_divisions: Optional[List[int]] = None,
+    max_points: int = 4000,
+) -> List[np.ndarray]:
+    """Returns the union of polygons, split in tiles.
+
+    This is the core of union, on lists of polygons (that can be sent to
+    other processes, see map_layers).
+
+    Args:
+        polygons (list of array-like[N][2]): The polygons to unite.
+        others: see union.
+
+    Returns:
+        list of array-like[N][2]: The polygons of the union.
+    """
+    if not polygons:
+        return []
+    polygons = _merge_floating_point_errors(polygons, tol=precision / 1000)
+
+    def union_tile(P):
+        result = gdspy.boolean(P, [], "or", precision=precision, max_points=max_points)
+        return [] if result is None else result.polygons
+
+    if num_divisions is None:
+        num_divisions = auto_num_divisions(polygons)
+    return _run_tiles(union_tile, [polygons], num_divisions, 0, precision, max_points)
+
+
+def invert(
+    elements,
+    border: float = 10,
+    precision: float = 1e-4,
+    num_divisions: Optional[List[int]] = None,
+    max_points: int = 4000,
+    layer: int = 0,
+) -> Device:
+    """Inverts the polygons of elements within their bounding box grown by
+    border, like phidl.geometry.invert, split in tiles (num_divisions) chosen
+    automatically for large inputs.
+
+    Args:
+        elements (Device, DeviceReference, Polygon or list of them): The
+            polygons to invert.
+        border (float): The distance from the polygons' bounding box to the
+            edges of the inverted shape.
+        precision (float): Desired precision for rounding vertex coordinates.
+        num_divisions (array-like[2] of int, optional): The number of tiles
+            along x and y. If None, chosen with auto_num_divisions.
+        max_points (int): The maximal number of points of each polygon.
+        layer (int or array-like[2]): The layer of the result.
+
+    Returns:
+        Device: The inverted shape.
+    """
+    polygons = [p for e in _as_list(elements) for p in _get_polygons(e)]
+    D = Device("boolean")
+    result = invert_polygons(polygons, border, precision, num_divisions, max_points)
+    if result:
+        D.add_polygon(result, layer=layer)
+    return D
+
+
+def invert_polygons(
+    polygons: List[np.ndarray],
+    border: float = 10,
+    precision: float = 1e-4,
+    num_divisions: Optional[List[int]] = None,
+    max_points: int = 4000,
+) -> List[np.ndarray]:
+    """Returns the inversion of polygons within their bounding box grown by
+    border, split in tiles.
+
+    This is the core of invert, on lists of polygons (that can be sent to
+    other processes, see map_layers).
+
+    Args:
+        polygons (list of array-like[N][2]): The polygons to invert.
+        others: see invert.
+
+    Returns:
+        list of array-like[N][2]: The polygons of the inverted shape.
+    """
+    if not polygons:
+        return []
+    bboxes = _bboxes(polygons)
+    xmin, ymin = bboxes[:, :2].min(0) - border
+    xmax, ymax = bboxes[:, 2:].max(0) + border
+    rectangle = np.array([(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)])
+    return boolean_polygons(
+        [rectangle], polygons, "A-B", precision, num_divisions, max_points
+    )
+
+
+def layer_polygons(
+    D: Device, layers: Optional[list] = None, invert_selection: bool = False
+) -> Dict[Tuple[int, int], List[np.ndarray]]:
+    """Returns the polygons of some layers of a Device, by layer.
+
+    Like D.get_polygons(by_spec=True) followed by a layer selection, or
+    phidl.geometry.extract, but only the polygons of the selected layers are
+    copied: the references to cells without any of them are skipped. This
+    avoids copying a whole Device (deepcopy, flatten) to remove its other
+    layers.
+
+    Args:
+        D (Device): The Device to get the polygons from.
+        layers (list of int or array-like[2], optional): The layers to get.
+            If None, all the layers.
+        invert_selection (bool): If True, gets the layers not in layers.
+
+    Returns:
+        dict: The list of polygons of each (layer, datatype).
+    """
+    selected = None if layers is None else {_layer_tuple(l) for l in layers}
+    cells_layers = {}
+
+    def is_selected(key):
+        return selected is None or (key in selected) != invert_selection
+
+    def cell_layers(cell):
+        if id(cell) not in cells_layers:
+            keys = {
+                (int(l), int(d))
+                for polyset in cell.polygons
+                for l, d in zip(polyset.layers, polyset.datatypes)
+            }
+            for path in cell.paths:
+                keys.update(path.get_polygons(True).keys())
+            for reference in cell.references:
+                keys.update(cell_layers(reference.ref_cell))
+            cells_layers[id(cell)] = keys
+        return cells_layers[id(cell)]
+
+    def cell_polygons(cell):
+        polygons = {}
+        for polyset in cell.polygons:
+            for points, l, d in zip(
+                polyset.polygons, polyset.layers, polyset.datatypes
+            ):
+                if is_selected((int(l), int(d))):
+                    polygons.setdefault((int(l), int(d)), []).append(np.array(points))
+        for path in cell.paths:
+            for key, points in path.get_polygons(True).items():
+                if is_selected(key):
+                    polygons.setdefault(key, []).extend(points)
+        for reference in cell.references:
+            if not any(is_selected(key) for key in cell_layers(reference.ref_cell)):
+                continue
+            for key, points in cell_polygons(reference.ref_cell).items():
+                polygons.setdefault(key, []).extend(
+                    _transform_polygons(reference, points)
+                )
+        return polygons
+
+    return cell_polygons(D)
+
+
+def _as_list(elements) -> list:
+    """Returns elements as a list."""
+    return elements if isinstance(elements, list) else [elements]
+
+
+def _get_polygons(element) -> List[np.ndarray]:
+    """Returns the polygons of a Device, DeviceReference, Polygon or
+    array."""
+    if isinstance(element, (Device, DeviceReference)):
+        return element.get_polygons()
+    if isinstance(element, (Polygon, gdspy.PolygonSet)):
+        return list(element.polygons)
+    return [np.asarray(element, dtype=float)]
+
+
+def _layer_tuple(layer) -> Tuple[int, int]:
+    """Returns the (gds_layer, gds_datatype) of a layer given as a number, a
+    [layer, datatype] pair, a phidl Layer or None, as phidl reads it."""
+    if isinstance(layer, Layer):
+        return layer.gds_layer, layer.gds_datatype
+    if layer is None:
+        return 0, 0
+    if np.shape(layer) == (2,):
+        return layer[0], layer[1]
+    if np.shape(layer) == (1,):
+        return layer[0], 0
+    if isinstance(layer, numbers.Number):
+        return layer, 0
+    raise ValueError(f"[qnngds] {layer!r} can't be interpreted as a layer.")
+
+
+def _transform_polygons(reference, polygons: List[np.ndarray]) -> List[np.ndarray]:
+    """Returns the polygons of a reference's (or array's) cell, as placed by
+    the reference: magnified, repeated on the array, reflected, rotated and
+    moved, in the order gdspy applies these transformations."""
+    if isinstance(reference, gdspy.CellArray):
+        offsets = [
+            np.array([reference.spacing[0] * i, reference.spacing[1] * j])
+            for i in range(reference.columns)
+            for j in range(reference.rows)
+        ]
+    else:
+        offsets = [None]
+    if reference.rotation is not None:
+        cos = np.cos(reference.rotation * np.pi / 180.0)
+        sin = np.sin(reference.rotation * np.pi / 180.0) * np.array((-1.0, 1.0))
+
+    transformed = []
+    for offset in offsets:
+        for points in polygons:
+            if reference.magnification is not None:
+                points = points * reference.magnification
+            if offset is not None:
+                points = points + offset
+            if reference.x_reflection:
+                points = points * np.array((1, -1))
+            if reference.rotation is not None:
+                points = points * cos + points[:, ::-1] * sin
+            if reference.origin is not None:
+                points = points + np.array(reference.origin)
+            transformed.append(points)
+    return transformed
+
+
+def _merge_floating_point_errors(
+    polygons: List[np.ndarray], tol: float
+) -> List[np.ndarray]:
+    """Returns the polygons with their x (and y) coordinates closer than tol
+    to the next smaller one merged into it, so that the boolean operations
+    don't leave slivers between edges meant to coincide."""
+    if not polygons:
+        return []
+    points = np.vstack(polygons)
+    for axis in range(2):
+        values = points[:, axis]
+        order = np.argsort(values)
+        sorted_values = values[order]
+        close = np.flatnonzero(
+            (np.diff(sorted_values) < tol) & (np.diff(sorted_values) > 0)
+        )
+        for i in close:
+            sorted_values[i + 1] = sorted_values[i]
+        points[order, axis] = sorted_values
+    return np.vsplit(points, np.cumsum([len(p) for p in polygons])[:-1])
+
+
+def _port_trims(
+    ports: List[Port], length: float, extra_width: float, overlap: float
+) -> List[np.ndarray]:
+    """Returns the rectangles of the given length that open an outline at
+    ports, from overlap inside the ports outwards, as wide as the ports plus
+    extra_width."""
+    if not ports:
+        return []
+    a = np.radians([port.orientation for port in ports])
+    direction = np.column_stack((np.cos(a), np.sin(a)))
+    normal = np.column_stack((-np.sin(a), np.cos(a)))
+    normal *= (np.array([port.width for port in ports]) + extra_width)[:, None] / 2
+    start = np.array([port.midpoint for port in ports]) - overlap * direction
+    end = start + length * direction
+    return list(
+        np.stack((start - normal, end - normal, end + normal, start + normal), 1)
+    )
+
+
+def _run_tiles(
+    operation,
+    operands: List[List[np.ndarray]],
+    num_divisions: List[int],
+    margin: float,
+    precision: float,
+    max_points: int = 4000,
+) -> List[np.ndarray]:
+    """Runs operation(*operands) on each tile of a num_divisions grid, with the
+    operands cropped to the tile grown by margin, and stitches the results
+    cropped to the tiles. The results are united, so that the polygons cut
+    by the tiles' edges are merged back together.
+
+    The tiles run on the threads set by set_tiling, and are compared to a
+    single tile if set_tiling(compare=True).
+    """
+    nx, ny = num_divisions
+    if nx * ny <= 1:
+        return list(operation(*operands))
+    bboxes = [_bboxes(polygons) for polygons in operands]
+    extents = np.concatenate(bboxes)
+    (xmin, ymin), (xmax, ymax) = extents[:, :2].min(0), extents[:, 2:].max(0)
+    xs = np.linspace(xmin - margin, xmax + margin, nx + 1)
+    ys = np.linspace(ymin - margin, ymax + margin, ny + 1)
+    boxes = [(xs[i], ys[j], xs[i + 1], ys[j + 1]) for i in range(nx) for j in range(ny)]
+
+    def run_tile(box):
+        tile_operands = [
+            _crop(polygons, bbox, box, margin, precision)
+            for polygons, bbox in zip(operands, bboxes)
+        ]
+        if not any(tile_operands):
+            return []
+        tile_result = list(operation(*tile_operands))
+        return _crop(tile_result, _bboxes(tile_result), box, 0, precision)
+
+    if _tiling["workers"] > 1:
+        with ThreadPoolExecutor(_tiling["workers"]) as executor:
+            results = list(executor.map(run_tile, boxes))
+    else:
+        results = [run_tile(box) for box in boxes]
+    # unite the tiles' results, which merges the polygons cut by their edges
+    result = gdspy.boolean(
+        [p for tile_result in results for p in tile_result],
+        [],
+        "or",
+        precision=precision,
+        max_points=max_points,
+    )
+    result = [] if result is None else result.polygons
+
+    if _tiling["compare"]:
+        # compare the area of each tile to the one of the single tile result
+        single = list(operation(*operands))
+        single_bboxes = _bboxes(single)
+        for box, tile_result in zip(boxes, results):
+            single_tile = _crop(single, single_bboxes, box, 0, precision)
+            difference = abs(_area(tile_result) - _area(single_tile))
+            if difference > precision * 2 * (box[2] - box[0] + box[3] - box[1]):
+                print(
+                    f"Warning, the tile {box} differs from a single tile "
+                    f"by {difference:.3g} um2."
+                )
+        return single
+    return result
+
+
+def _area(polygons: List[np.ndarray]) -> float:
+    """Returns the total area of polygons."""
+    return sum(
+        abs(np.dot(p[:, 0], np.roll(p[:, 1], 1)) - np.dot(p[:, 1], np.roll(p[:, 0], 1)))
+        / 2
+        for p in polygons
+    )
+
+
+def _bboxes(polygons: List[np.ndarray]) -> np.ndarray:
+    """Returns the (xmin, ymin, xmax, ymax) bounding boxes of polygons."""
+    if not len(polygons):
+        return np.zeros((0, 4))
+    starts = np.cumsum([0] + [len(p) for p in polygons[:-1]])
+    points = np.concatenate(polygons)
+    return np.hstack(
+        (np.minimum.reduceat(points, starts), np.maximum.reduceat(points, starts))
+    )
+
+
+def _crop(
+    polygons: List[np.ndarray],
+    bboxes: np.ndarray,
+    box: Tuple[float, float, float, float],
+    margin: float,
+    precision: float,
+) -> List[np.ndarray]:
+    """Returns the polygons cropped to box grown by margin."""
+    xmin, ymin, xmax, ymax = np.array(box) + np.array([-1, -1, 1, 1]) * margin
+    inside = (
+        (bboxes[:, 0] >= xmin)
+        & (bboxes[:, 1] >= ymin)
+        & (bboxes[:, 2] <= xmax)
+        & (bboxes[:, 3] <= ymax)
+    )
+    edge = ~inside & (
+        (bboxes[:, 0] < xmax)
+        & (bboxes[:, 1] < ymax)
+        & (bboxes[:, 2] > xmin)
+        & (bboxes[:, 3] > ymin)
+    )
+    cropped = [polygons[k] for k in np.flatnonzero(inside)]
+    if edge.any():
+        rectangle = [np.array([(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)])]
+        edge = [polygons[k] for k in np.flatnonzero(edge)]
+        # not fractured, as the polygons are merged again after the tiles
+        result = gdspy.boolean(
+            edge, rectangle, "and", precision=precision, max_points=0
+        )
+        if result is not None:
+            cropped += result.polygons
+    return cropped
@@ -3,12 +3,100 @@ fabrication process and its effect on the materials."""
 
 from phidl import Device
 import phidl.geometry as pg
-from typing import List, Union
+from typing import Dict, List, Tuple, Union
+import numpy as np
+import qnngds.geometries as geometry
+
+_alignment_masters: Dict[tuple, Device] = {}
+# the number of masters kept in each cache, the least recently used ones are
+# dropped
+_MASTER_CACHE_SIZE = 256
+
+
+def clear_alignment_mark_cache() -> None:
+    """Clears the crosses and combs shared by the alignment marks."""
+    _alignment_masters.clear()
+
+
+_resolution_masters: Dict[tuple, Device] = {}
+# the space between the patterns of a resolution test, in a row and between
+# the rows
+_RESOLUTION_TEST_SPACING = (10, 20)
+
+
+def clear_resolution_test_cache() -> None:
+    """Clears the patterns shared by the resolution tests."""
+    _resolution_masters.clear()
+
+
+def _rectangles(
+    size: Tuple[float, float],
+    columns: int,
+    rows: int,
+    spacing: Tuple[float, float],
+) -> np.ndarray:
+    """Returns the vertices of a columns x rows array of rectangles, centered
+    on (0, 0), as a single (N, 4, 2) block."""
+    w, h = size
+    corners = np.array([(0, 0), (w, 0), (w, h), (0, h)])
+    x, y = np.meshgrid(
+        np.arange(columns) * spacing[0], np.arange(rows) * spacing[1], indexing="ij"
+    )
+    origins = np.column_stack((x.ravel(), y.ravel()))
+    center = (origins.max(0) + (w, h)) / 2
+    return origins[:, None, :] + corners[None, :, :] - center
+
+
+def _alignment_master(name: str, *key) -> Device:
+    """Returns the shared part of the alignment marks with this name and
+    parameters (see alignment_mark)."""
+    key = (name,) + key
+    if key in _alignment_masters:
+        # move the master to the end, the most recently used
+        _alignment_masters[key] = _alignment_masters.pop(key)
+        return _alignment_masters[key]
+
+    if name == "CROSS":
+        (layer,) = key[1:]
+        MASTER = geometry.union(pg.cross(length=190, width=20), layer=layer)
+    elif name == "WINDOWS":
+        (layer,) = key[1:]
+        MASTER = Device()
+        MASTER.add_polygon(list(_rectangles((65, 65), 2, 2, (125, 125))), layer)
+    elif name == "COMB":
+        # middle comb, pitch = 10, and additional markers, for clarity
+        (layer,) = key[1:]
+        MASTER = Device()
+        polygons = np.concatenate(
+            (
+                _rectangles((5, 30), 21, 1, (10, 0)),
+                _rectangles((5, 20), 3, 2, (100, 110)),
+                _rectangles((5, 10), 2, 2, (100, 100)),
+            )
+        )
+        MASTER.add_polygon(list(polygons), layer=layer)
+    elif name == "VERNIER":
+        # vernier comb, pitch = 10 + pitch / 1000, with its label
+        pitch, layer = key[1:]
+        MASTER = Device()
+        ticks = _rectangles((5, 30), 21, 1, (10 + pitch / 1000, 0))
+        MASTER.add_polygon(list(ticks), layer=layer)
+        text = MASTER << geometry.text(f"{pitch}NM", size=10, layer=layer)
+        text.move(text.center, (140, 0))
+    MASTER.name = " ".join(str(k) for k in key)
+    _alignment_masters[key] = MASTER
+    if len(_alignment_masters) > _MASTER_CACHE_SIZE:
+        del _alignment_masters[next(iter(_alignment_masters))]
+    return MASTER
 
 
 def alignment_mark(layers: List[int] = [1, 2, 3, 4]) -> Device:
     """Creates an alignment mark for each photolithography.
 
+    The crosses and combs are built once per layer and pitch, and referenced
+    by all the marks: flatten a mark before modifying it in place (e.g. with
+    remove_layers, which is recursive).
+
     Args:
         layers (List[int]): An array of layers.
 
@@ -21,49 +109,16 @@ def alignment_mark(layers: List[int] = [1, 2, 3, 4]) -> Device:
         MARK = Device()
 
         # central part with cross
-
-        CROSS = Device("CROSS")
-        cross = CROSS << pg.union(pg.cross(length=190, width=20), layer=layer1)
-        rect = pg.rectangle((65, 65), layer=layer2)
-        window = CROSS.add_array(rect, 2, 2, (125, 125))
-        window.move(window.center, cross.center)
-        MARK << CROSS.flatten()
+        MARK << _alignment_master("CROSS", layer1)
+        MARK << _alignment_master("WINDOWS", layer2)
 
         # combs
         def create_comb(pitch1=500, pitch2=100, layer1=1, layer2=2):
 
-            COMB = Device()
-
-            # middle comb (made of layer1), pitch = 10
-            rect1 = pg.rectangle((5, 30), layer=layer1)
-            middle_comb = COMB.add_array(rect1, 21, 1, spacing=(10, 0))
-            middle_comb.move(COMB.center, (0, 0))
-
-            # top and bottom combs (made of layer2), pitchs = 10+pitch1, 10+pitch2
-            rect2 = pg.rectangle((5, 30), layer=layer2)
-            top_comb = COMB.add_array(rect2, 21, 1, spacing=(10 + pitch1 / 1000, 0))
-            top_comb.move(
-                top_comb.center, (middle_comb.center[0], middle_comb.center[1] + 30)
-            )
-            top_text = COMB.add_ref(pg.text(f"{pitch1}NM", size=10, layer=layer2))
-            top_text.move(top_text.center, (140, 30))
-
-            bottom_comb = COMB.add_array(rect2, 21, 1, spacing=(10 + pitch2 / 1000, 0))
-            bottom_comb.move(
-                bottom_comb.center, (middle_comb.center[0], middle_comb.center[1] - 30)
-            )
-            bottom_text = COMB.add_ref(pg.text(f"{pitch2}NM", size=10, layer=layer2))
-            bottom_text.move(bottom_text.center, (140, -30))
-
-            # additional markers (made of layer1), for clarity
-            rect1a = pg.rectangle((5, 20), layer=layer1)
-            marksa = COMB.add_array(rect1a, 3, 2, spacing=(100, 110))
-            marksa.move(marksa.center, middle_comb.center)
-
-            rect1b = pg.rectangle((5, 10), layer=layer1)
-            marksb = COMB.add_array(rect1b, 2, 2, spacing=(100, 100))
-            marksb.move(marksb.center, middle_comb.center)
-
+            COMB = Device(f"COMB({pitch1}, {pitch2}, {layer1}, {layer2})")
+            COMB << _alignment_master("COMB", layer1)
+            COMB.add_ref(_alignment_master("VERNIER", pitch1, layer2)).movey(30)
+            COMB.add_ref(_alignment_master("VERNIER", pitch2, layer2)).movey(-30)
             return COMB
 
         VERNIER = Device("VERNIER(500, 200, 100, 50)")
@@ -85,17 +140,17 @@ def alignment_mark(layers: List[int] = [1, 2, 3, 4]) -> Device:
         right = VERNIER.add_ref(comb205)
         right.rotate(-90)
         right.move((0, 0), (200, 0))
-        MARK << VERNIER.flatten()
+        MARK << VERNIER
 
         MARK.move(MARK.center, (0, 0))
 
         # text
         TEXT = Device(f"TEXT({layer2} ON {layer1})")
-        text1 = TEXT << pg.text(str(layer2), size=50, layer={layer1, layer2})
+        text1 = TEXT << geometry.text(str(layer2), size=50, layer={layer1, layer2})
         text1.move(text1.center, (220, 200))
-        text2 = TEXT << pg.text(f"{layer2} ON {layer1}", size=10, layer=layer2)
+        text2 = TEXT << geometry.text(f"{layer2} ON {layer1}", size=10, layer=layer2)
         text2.move(text2.center, (220, 240))
-        MARK << TEXT.flatten()
+        MARK << TEXT
 
         MARK.name = f"ALIGN {layer2} ON {layer1}"
         return MARK
@@ -109,7 +164,7 @@ def alignment_mark(layers: List[int] = [1, 2, 3, 4]) -> Device:
                 MARK = create_marker(layer1, layer2)
                 MARK.move((j * markers_pitch, i * markers_pitch))
                 ALIGN << MARK
-            text = pg.text(str(layer1), size=160, layer=layer1)
+            text = geometry.text(str(layer1), size=160, layer=layer1)
             text.name = f"TEXT({str(layer1)})"
             text.move(text.center, (-340, i * markers_pitch))
             ALIGN << text
@@ -120,6 +175,74 @@ def alignment_mark(layers: List[int] = [1, 2, 3, 4]) -> Device:
     return ALIGN
 
 
+def _resolution_master(
+    name: str, res: float, layer: int, inverted: Union[bool, float] = False
+) -> Device:
+    """Returns the pattern of the resolution test with this name ("3L" or
+    "WAFFLE") and resolution, built once and shared (see resolution_test).
+
+    If inverted is True, the pattern is inverted within its bounding box. If
+    it is a float, the pattern is outlined by this width.
+    """
+    key = (name, res, layer, inverted)
+    if key in _resolution_masters:
+        # move the master to the end, the most recently used
+        _resolution_masters[key] = _resolution_masters.pop(key)
+        return _resolution_masters[key]
+
+    if inverted is True:
+        PATTERN = _resolution_master(name, res, layer)
+        MASTER = geometry.invert(PATTERN, border=0, precision=1e-7, layer=layer)
+        MASTER.name = f"{PATTERN.name} INVERTED"
+    elif inverted:
+        PATTERN = _resolution_master(name, res, layer)
+        MASTER = geometry.outline(PATTERN, inverted, layer=layer)
+        MASTER.name = f"{PATTERN.name} OUTLINED {inverted}"
+    elif name == "3L":
+        MASTER = Device(f"3L([0.8, 1, 1.2] x {res}, lay={layer})")
+        for i, percent in enumerate([0.8, 1, 1.2]):
+            w = percent * res
+            bar = pg.rectangle((min(100 * w, 100), w), layer=layer)
+            L = Device(f"L({w}, lay={layer})")
+            L.add_array(bar, 1, 5, spacing=(0, 2 * res))
+            h_bars = L.add_array(bar, 1, 5, spacing=(0, 2 * res))
+            h_bars.rotate(90)
+            h_bars.move((h_bars.xmin, h_bars.ymin), (0, 0))
+            MASTER.add_ref(L).move((13 * res * i, 13 * res * i))
+
+        text = MASTER << geometry.text(str(res), size=20, layer=layer)
+        text.move(text.get_bounding_box()[0], (39 * res, 39 * res))
+    elif name == "WAFFLE":
+        # the gaps between stripes of these widths, spaced by res, across the
+        # 80 x 80 square: vertical ones, then horizontal ones
+        widths = np.array([2, 1, 1, 2, 3, 5, 8, 13, 21, 15]) * res
+        x = np.cumsum(widths[:-1]) + np.arange(1, 10) * res - res
+        gaps = np.stack(
+            (
+                np.column_stack((x, np.zeros(9))),
+                np.column_stack((x + res, np.zeros(9))),
+                np.column_stack((x + res, np.full(9, 80 * res))),
+                np.column_stack((x, np.full(9, 80 * res))),
+            ),
+            axis=1,
+        )
+        GAPS = Device(f"WAFFLE GAPS({res}, lay={layer})")
+        GAPS.add_polygon(list(gaps), layer=layer)
+
+        MASTER = Device(f"WAFFLE({res}, lay={layer})")
+        MASTER << GAPS
+        MASTER.add_ref(GAPS).rotate(90, center=(40 * res, 40 * res))
+        text = MASTER << geometry.text(str(res), size=20, layer=layer)
+        text.move(
+            (text.get_bounding_box()[0][0], text.get_bounding_box()[1][1]),
+            (2 * res, -2 * res),
+        )
+    _resolution_masters[key] = MASTER
+    if len(_resolution_masters) > _MASTER_CACHE_SIZE:
+        del _resolution_masters[next(iter(_resolution_masters))]
+    return MASTER
+
+
 def resolution_test(
     resolutions: List[float] = [0.8, 1, 1.2, 1.4, 1.6, 1.8, 2.0],
     inverted: Union[bool, float] = False,
@@ -127,6 +250,11 @@ def resolution_test(
 ) -> Device:
     """Creates test structures for determining a process resolution.
 
+    The patterns are built once per resolution and layer, and referenced by
+    all the tests: flatten a test before modifying it in place (e.g. with
+    remove_layers, which is recursive). The inverted test is made of the
+    inverted (or outlined) patterns.
+
     Args:
         resolutions (List[float]): List of resolutions (in µm) to be tested.
         inverted (Union[bool, float]): If True, invert the device. If float, outline the device by this width.
@@ -135,99 +263,47 @@ def resolution_test(
     Returns:
         Device: The test structures, in the specified layer.
     """
-
-    def create_3L(res=1):
-
-        LLL = Device()
-
-        def create_L(w, spacing):
-
-            L = Device()
-
-            bar = pg.rectangle((min(100 * w, 100), w))
-            bars = Device()
-            bars.add_array(bar, 1, 5, spacing=(0, spacing))
-            v_bars = L << bars
-            h_bars = L << bars
-            h_bars.rotate(90)
-
-            L.align("all", "xmin")
-            L.move((L.xmin, L.ymin), (0, 0))
-            return L
-
-        grid_spacing = (13 * res, 13 * res)
-
-        space = [0.8, 1, 1.2]
-        for i, percent in enumerate(space):
-            lll = LLL << create_L(percent * res, 2 * res)
-            lll.move([i * space for space in grid_spacing])
-
-        text = LLL << pg.text(str(res), size=20)
-        text.move(
-            text.get_bounding_box()[0], [(i + 1) * space for space in grid_spacing]
-        )
-
-        LLL.flatten(single_layer=layer)
-        LLL.name = f"3L({space} x {res})"
-        return LLL
-
-    def create_waffle(res=1):
-
-        WAFFLE = Device()
-        W = pg.rectangle(size=(res * 80, res * 80))
-
-        pattern = [(res * x, res * 80) for x in [2, 1, 1, 2, 3, 5, 8, 13, 21, 15]]
-        WOut = pg.gridsweep(
-            function=pg.rectangle, param_x={"size": pattern}, param_y={}, spacing=res
-        )
-
-        WOut.move(WOut.center, W.center)
-        W1 = pg.boolean(W, WOut, "A-B")
-
-        WOut.rotate(90, center=WOut.center)
-        W2 = pg.boolean(W, WOut, "A-B")
-
-        WAFFLE << W1
-        WAFFLE << W2
-        text = WAFFLE << pg.text(str(res), size=20)
-        text.move(
-            (text.get_bounding_box()[0][0], text.get_bounding_box()[1][1]),
-            (2 * res, -2 * res),
+    if inverted == True:
+        inverted = True
+
+    # the 3Ls on a row, aligned on their ymin, above the row of waffles,
+    # aligned on their ymax
+    x_spacing, y_spacing = _RESOLUTION_TEST_SPACING
+    placements = []
+    for name, y, align in (("3L", y_spacing, "ymin"), ("WAFFLE", 0, "ymax")):
+        x = 0
+        for res in resolutions:
+            PATTERN = _resolution_master(name, res, layer)
+            placements.append(
+                (name, res, (x - PATTERN.xmin, y - getattr(PATTERN, align)))
+            )
+            x += PATTERN.xsize + x_spacing
+
+    # the outline of a pattern reaches the neighbouring patterns if it is as
+    # wide as the space between them: the whole test is outlined at once
+    RES_TEST = Device()
+    outline_whole = inverted is not True and inverted >= min(x_spacing, y_spacing)
+    for name, res, origin in placements:
+        PATTERN = _resolution_master(
+            name, res, layer, False if outline_whole else inverted
         )
-
-        WAFFLE.flatten(single_layer=layer)
-        WAFFLE.name = f"WAFFLE({res})"
-        return WAFFLE
-
-    RES_TEST1 = pg.gridsweep(
-        function=create_3L,
-        param_x={"res": resolutions},
-        param_y={},
-        spacing=10,
-        align_y="ymin",
-        label_layer=None,
-    )
-    RES_TEST1.name = "3Ls"
-    RES_TEST2 = pg.gridsweep(
-        function=create_waffle,
-        param_x={"res": resolutions},
-        param_y={},
-        spacing=10,
-        align_y="ymax",
-        label_layer=None,
-    )
-    RES_TEST2.name = "WAFFLES"
-    RES_TEST = pg.grid(
-        device_list=[[RES_TEST1], [RES_TEST2]],
-        spacing=20,
-        align_x="xmin",
-    )
+        RES_TEST.add_ref(PATTERN).move(origin)
+
+    if inverted is True:
+        # the space around the inverted patterns
+        bboxes = []
+        for ref in RES_TEST.references:
+            (xmin, ymin), (xmax, ymax) = ref.bbox
+            bboxes.append(
+                np.array([(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)])
+            )
+        frame = geometry.invert_polygons(bboxes, 5, precision=1e-7)
+        RES_TEST.add_polygon(frame, layer=layer)
+    elif outline_whole:
+        # the outlines of neighbouring patterns would overlap
+        RES_TEST = geometry.outline(RES_TEST, inverted, layer=layer)
 
     if inverted:
-        if inverted == True:
-            RES_TEST = pg.invert(RES_TEST, border=5, precision=0.0000001, layer=layer)
-        else:
-            RES_TEST = pg.outline(RES_TEST, inverted, layer=layer)
         res_test_name = "RESOLUTION TEST INVERTED "
     else:
         res_test_name = "RESOLUTION TEST "
@@ -9,19 +9,41 @@ from phidl import Device, Port
 import phidl.geometry as pg
 import phidl.routing as pr
 from typing import Optional, Tuple, List, Union, Dict, Set
+import hashlib
+import importlib.metadata
+import inspect
+import os
 from phidl.device_layout import (
+    CellArray,
     Device,
+    DeviceReference,
     Port,
 )
+import numpy as np
 import qnngds.geometries as geometry
 
 
+def _freeze(value):
+    """Recursively converts lists, sets and dicts into hashable tuples."""
+    if isinstance(value, dict):
+        return tuple((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(_freeze(v) for v in value))
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
 class DieParameters:
     """A class regrouping every parameter proper to a die_cell.
 
     This class does not include anything linked to the device/circuit/experiment to
     be placed in the cells.
 
+    DieParameters are immutable: two instances with the same parameters are
+    equal and have the same hash, so that they can be used to cache the cells
+    built from them. Use replace() to get a copy with some parameters changed.
+
     Parameters:
         unit_die_size (tuple of (int or float, int or float)): Dimensions of a unit die/cell (width, height).
         pad_size (tuple of int or float): Dimensions of the die's pads (width, height).
@@ -38,6 +60,28 @@ class DieParameters:
         text_size (int or float): The size of the text in the cells.
     """
 
+    _fields = (
+        "unit_die_size",
+        "pad_size",
+        "pad_tolerance",
+        "contact_l",
+        "outline",
+        "die_layer",
+        "pad_layer",
+        "fill_pad_layer",
+        "invert",
+        "text_size",
+    )
+    __slots__ = _fields + (
+        "unit_die_w",
+        "unit_die_h",
+        "die_border_w",
+        "_dev_max_x",
+        "_dev_max_y",
+        "_key",
+        "_hash",
+    )
+
     def __init__(
         self,
         unit_die_size: Tuple[Union[int, float], Union[int, float]] = (980, 980),
@@ -52,23 +96,91 @@ class DieParameters:
         text_size: Union[int, float] = 40,
     ):
 
-        self.unit_die_size = unit_die_size
-        self.unit_die_w = unit_die_size[0]
-        self.unit_die_h = unit_die_size[1]
-        self.pad_size = pad_size
-        self.pad_tolerance = pad_tolerance
-        self.contact_l = contact_l
-        self.outline = outline
-        self.die_layer = die_layer
-        self.pad_layer = pad_layer
-        self.fill_pad_layer = fill_pad_layer
-        self.invert = invert
-        self.text_size = text_size
-
-        self.die_border_w = round(
-            min((pad_size[0] + outline) / 2, 0.15 * min(unit_die_size))
+        values = (
+            tuple(unit_die_size),
+            tuple(pad_size),
+            pad_tolerance,
+            contact_l,
+            outline,
+            _freeze(die_layer),
+            _freeze(pad_layer),
+            fill_pad_layer,
+            invert,
+            text_size,
+        )
+        for field, value in zip(self._fields, values):
+            object.__setattr__(self, field, value)
+        object.__setattr__(self, "_key", values)
+        object.__setattr__(self, "_hash", hash(values))
+
+        object.__setattr__(self, "unit_die_w", unit_die_size[0])
+        object.__setattr__(self, "unit_die_h", unit_die_size[1])
+        object.__setattr__(
+            self,
+            "die_border_w",
+            round(min((pad_size[0] + outline) / 2, 0.15 * min(unit_die_size))),
+        )
+
+        # space available for a device, indexed by the number of pads on the
+        # sides of the die (see calculate_available_space_for_dev)
+        dev_max = [
+            tuple(
+                self.unit_die_size[i]
+                - 2 * outline
+                - max(
+                    2 * self.die_border_w,
+                    num_pads * (2 * outline + pad_size[1] + 2 * contact_l),
+                )
+                for num_pads in range(3)
+            )
+            for i in [0, 1]
+        ]
+        object.__setattr__(self, "_dev_max_x", dev_max[0])
+        object.__setattr__(self, "_dev_max_y", dev_max[1])
+
+    def __setattr__(self, name, value):
+        raise AttributeError(
+            f"DieParameters are immutable, use replace({name}=...) instead."
         )
 
+    def __delattr__(self, name):
+        raise AttributeError("DieParameters are immutable.")
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, DieParameters):
+            return NotImplemented
+        return self._key == other._key
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __repr__(self) -> str:
+        parameters = ", ".join(
+            f"{field}={value!r}" for field, value in zip(self._fields, self._key)
+        )
+        return f"DieParameters({parameters})"
+
+    def __reduce__(self):
+        return (DieParameters, self._key)
+
+    def replace(self, **overrides) -> "DieParameters":
+        """Creates a copy of the die's parameters, with some of them changed.
+
+        Parameters:
+            **overrides: The parameters to change, e.g. ``contact_l=0``.
+
+        Returns:
+            DieParameters: The new die's parameters.
+        """
+        unknown = set(overrides) - set(self._fields)
+        if unknown:
+            raise TypeError(f"Unknown DieParameters field(s): {sorted(unknown)}")
+        if not overrides:
+            return self
+        parameters = dict(zip(self._fields, self._key))
+        parameters.update(overrides)
+        return DieParameters(**parameters)
+
     def calculate_available_space_for_dev(
         self,
         device_ports: List[str] = ["N", "W", "S", "E"],
@@ -88,34 +200,10 @@ class DieParameters:
             available for a device in a die_cell
         """
 
-        num_pads_y = 0
-        num_pads_x = 0
-        if "N" in device_ports:
-            num_pads_y += 1
-        if "S" in device_ports:
-            num_pads_y += 1
-        if "E" in device_ports:
-            num_pads_x += 1
-        if "W" in device_ports:
-            num_pads_x += 1
-
-        dev_max_x = (
-            self.unit_die_size[0]
-            - 2 * self.outline
-            - max(
-                2 * self.die_border_w,
-                num_pads_x * (2 * self.outline + self.pad_size[1] + 2 * self.contact_l),
-            )
-        )
-        dev_max_y = (
-            self.unit_die_size[1]
-            - 2 * self.outline
-            - max(
-                2 * self.die_border_w,
-                num_pads_y * (2 * self.outline + self.pad_size[1] + 2 * self.contact_l),
-            )
-        )
-        return dev_max_x, dev_max_y
+        num_pads_y = ("N" in device_ports) + ("S" in device_ports)
+        num_pads_x = ("E" in device_ports) + ("W" in device_ports)
+
+        return self._dev_max_x[num_pads_x], self._dev_max_y[num_pads_y]
 
     def find_num_diecells_for_dev(
         self,
@@ -194,37 +282,57 @@ class DieParameters:
         return max(max_circuit_port_width, self.contact_l)
 
 
-def die_cell(
-    die_parameters: DieParameters = DieParameters(),
-    n_m_units: Tuple[int, int] = (1, 1),
-    contact_w: Union[int, float] = 50,
-    device_max_size: Tuple[Union[int, float], Union[int, float]] = (
-        round(DieParameters().unit_die_w / 3),
-        round(DieParameters().unit_die_h / 3),
-    ),
-    ports: Dict[str, int] = {"N": 1, "E": 1, "W": 1, "S": 1},
-    ports_gnd: List[str] = ["E", "S"],
-    text: str = "",
-    text_size: Union[None, int, float] = None,
-) -> Device:
-    """Creates a die cell with dicing marks, text, and pads to connect to a
-    device.
+_die_frame_cache: Dict[tuple, dict] = {}
+# the number of die frames kept, the least recently used ones are dropped
+_DIE_FRAME_CACHE_SIZE = 32
 
-    Parameters:
-        die_parameters (DieParameters): the die's parameters.
-        n_m_units (tuple of int): number of unit dies that compose the cell in width and height.
-        device_max_size (tuple of int or float): Max dimensions of the device
-            inside the cell (width, height).
-        ports (dict): The ports of the device, format must be {'N':m, 'E':n, 'W':p, 'S':q}.
-        ports_gnd (list of string): The ports connected to ground.
-        text (string): The text to be displayed on the cell.
-        text_size (int or float): If specified, overwrites the Die's
-            text_size. Size of text, corresponds to phidl geometry std.
+
+def clear_die_frame_cache() -> None:
+    """Empties the cache of die frames shared between die_cell calls."""
+    _die_frame_cache.clear()
+
+
+def _die_frame(
+    die_parameters: DieParameters,
+    n_m_units: Tuple[int, int],
+    contact_w: Union[int, float],
+    device_max_size: Tuple[Union[int, float], Union[int, float]],
+    ports: Dict[str, int],
+    ports_gnd: List[str],
+) -> dict:
+    """Creates, or gets from the cache, the frame of a die cell without its
+    label.
+
+    Parameters are the same as die_cell's.
 
     Returns:
-        DIE (Device): The cell, with ports of width contact_w positioned around a device_max_size area.
+        dict: The frame, with the following keys:
+
+        - **ports** (*list of Port*): The ports of the die.
+        - **polygons** (*dict*): The frame's polygons, by layer spec.
+        - **bboxes** (*dict*): The bounding boxes (xmin, ymin, xmax, ymax) of
+          these polygons, by layer spec.
+        - **keep** (*dict of list of array*): The polygons of the pads and
+          routes, by layer spec. The label outline never clears them.
+        - **pads** (*Device*): The references to the shared pads, out of the
+          frame's polygons.
+        - **masters** (*dict of Device*): The shared frame masters, without the
+          polygons that are reached by a label.
     """
 
+    key = (
+        die_parameters,
+        _freeze(n_m_units),
+        contact_w,
+        _freeze(device_max_size),
+        _freeze(ports),
+        _freeze(set(ports_gnd)),
+    )
+    if key in _die_frame_cache:
+        # move the frame to the end, the most recently used
+        _die_frame_cache[key] = _die_frame_cache.pop(key)
+        return _die_frame_cache[key]
+
     def offset(overlap_port):
         port_name = overlap_port.name[0]
         if port_name == "N":
@@ -236,9 +344,8 @@ def die_cell(
         elif port_name == "E":
             overlap_port.midpoint[0] += -die_parameters.contact_l
 
-    die_name = text.replace("\n", "")
     die_size = [n_m_units[i] * die_parameters.unit_die_size[i] for i in [0, 1]]
-    DIE = Device(f"DIE {die_name} ")
+    DIE = Device()
 
     border = pg.rectangle(die_size)
     border.move(border.center, (0, 0))
@@ -247,6 +354,8 @@ def die_cell(
 
     ## Make the routes and pads
     padOut = Device()
+    CONNECTS = Device()
+    isolated = []
 
     pad_block_size = (
         die_size[0] - 2 * die_parameters.pad_size[1] - 4 * die_parameters.outline,
@@ -256,21 +365,38 @@ def die_cell(
     outer_block = pg.compass_multi(pad_block_size, ports)
     inner_ports = list(inner_block.ports.values())
 
+    # the pads are shared masters, placed by reference in the frame. The
+    # inverted dies only keep the inner pads, their die layer is computed.
+    PAD = _pad_master(
+        die_parameters.pad_size,
+        die_parameters.pad_tolerance,
+        None if die_parameters.invert else die_parameters.die_layer,
+        die_parameters.pad_layer,
+    )
+    pad_port = Port(
+        "1",
+        midpoint=(die_parameters.pad_size[0] / 2, 0),
+        width=die_parameters.pad_size[0],
+        orientation=90,
+    )
+    PADS = Device(f"PADS {n_m_units[0]}x{n_m_units[1]}")
+
     for i, port in enumerate(list(outer_block.ports.values())):
 
         CONNECT = Device()
         port.rotate(180)
 
-        # create the pad
-        pad = pad_with_offset(die_parameters)
-        pad.add_port(
-            "1",
-            midpoint=(die_parameters.pad_size[0] / 2, 0),
-            width=die_parameters.pad_size[0],
-            orientation=90,
+        # place the pad
+        PADS.add_ref(PAD).connect(pad_port, port)
+        pad_ref = CONNECTS.add_ref(
+            _pad_master(
+                die_parameters.pad_size,
+                die_parameters.pad_tolerance,
+                die_parameters.die_layer,
+                die_parameters.pad_layer,
+            )
         )
-        pad_ref = CONNECT << pad
-        pad_ref.connect(pad.ports["1"], port)
+        pad_ref.connect(pad_port, port)
 
         # create the route from pad to contact
         port.width = die_parameters.pad_size[0]
@@ -288,17 +414,21 @@ def die_cell(
         # isolate the pads that are not grounded
         port_grounded = any(port.name[0] == P for P in ports_gnd)
         if not port_grounded:
-            padOut << pg.outline(
-                CONNECT,
-                distance=die_parameters.outline,
-                join="round",
-                open_ports=2 * die_parameters.outline,
-            )
+            isolated.append([CONNECT, pad_ref])
 
         # add the port to the die
         DIE.add_port(port=inner_ports[i].rotate(180))
         DIE << CONNECT
-
+        CONNECTS << CONNECT
+
+    # isolate each pad with its route, opened only at its own port
+    for elements in isolated:
+        padOut << geometry.outline(
+            elements,
+            distance=die_parameters.outline,
+            join="round",
+            open_ports=2 * die_parameters.outline,
+        )
     borderOut << padOut
 
     ## Add the die markers
@@ -324,38 +454,19 @@ def die_cell(
             die_size[1] / 2 - die_parameters.die_border_w / 2,
         ),
     ]
-    for corner_coord in corners_coord:
-        corner = pg.rectangle(
-            (
-                die_parameters.die_border_w - die_parameters.outline,
-                die_parameters.die_border_w - die_parameters.outline,
-            )
+    corner = pg.rectangle(
+        (
+            die_parameters.die_border_w - die_parameters.outline,
+            die_parameters.die_border_w - die_parameters.outline,
         )
-        corner = pg.outline(corner, -1 * die_parameters.outline)
-        corner.move(corner.center, corner_coord)
-        cornersOut << corner
+    )
+    corner = geometry.outline(corner, -1 * die_parameters.outline)
+    for corner_coord in corners_coord:
+        cornersOut.add_ref(corner).move(corner.center, corner_coord)
 
     borderOut << cornersOut
 
-    # label the cell
-    if text_size is not None:
-        label_size = text_size
-    else:
-        label_size = die_parameters.text_size
-
-    label = pg.text(text, size=label_size, layer=die_parameters.die_layer)
-    label.move((label.xmin, label.ymin), (0, 0))
-    pos = [
-        x + 2 * die_parameters.outline + 10
-        for x in (-die_size[0] / 2, -die_size[1] / 2)
-    ]
-    label.move(pos)
-    DIE << label
-    labelOut = pg.outline(label, die_parameters.outline)
-
-    borderOut << labelOut
-
-    border = pg.boolean(border, borderOut, "A-B", layer=die_parameters.die_layer)
+    border = geometry.boolean(border, borderOut, "A-B", layer=die_parameters.die_layer)
     DIE << border
 
     if die_parameters.fill_pad_layer:
@@ -363,44 +474,253 @@ def die_cell(
         center = pg.rectangle(device_max_size)
         border_filled.move(border_filled.center, (0, 0))
         center.move(center.center, (0, 0))
-        border_filled = pg.boolean(border_filled, center, "A-B")
+        border_filled = geometry.boolean(border_filled, center, "A-B")
 
-        border_filled = pg.boolean(
+        border_filled = geometry.boolean(
             border_filled, borderOut, "A-B", layer=die_parameters.pad_layer
         )
         DIE << border_filled
 
     DIE.flatten()
     ports = DIE.get_ports()
-    DIE = pg.union(DIE, by_layer=True)
+
+    # unite each layer without the pads, and invert the die layer if needed,
+    # in parallel
+    layers_polygons = DIE.get_polygons(by_spec=True)
+    pads_polygons = geometry.layer_polygons(PADS)
+    operations = {
+        layer: (geometry.union_polygons, (polys,))
+        for layer, polys in layers_polygons.items()
+    }
+    for layer, polys in pads_polygons.items():
+        if layer in layers_polygons:
+            operations[layer] = (
+                geometry.boolean_polygons,
+                (layers_polygons[layer], polys, "A-B"),
+            )
     if die_parameters.invert:
-        PADS = pg.deepcopy(DIE)
-        PADS.remove_layers([die_parameters.die_layer])
-        PADS.name = "pads"
-        DIE = pg.invert(DIE, border=0, layer=die_parameters.die_layer)
-        DIE << PADS
-    for port in ports:
-        DIE.add_port(port)
+        all_polygons = [p for polys in layers_polygons.values() for p in polys]
+        all_polygons += geometry.layer_polygons(CONNECTS).get(
+            geometry._layer_tuple(die_parameters.die_layer), []
+        )
+        operations[geometry._layer_tuple(die_parameters.die_layer)] = (
+            geometry.invert_polygons,
+            (all_polygons, 0),
+        )
+    polygons = {
+        layer: polys
+        for layer, polys in geometry.map_layers(operations).items()
+        if len(polys)
+    }
+    frame = {
+        "ports": ports,
+        "polygons": polygons,
+        "bboxes": {
+            layer: np.array([np.concatenate((p.min(0), p.max(0))) for p in polys])
+            for layer, polys in polygons.items()
+        },
+        "keep": geometry.layer_polygons(CONNECTS),
+        "pads": PADS,
+        "masters": {},
+    }
+    _die_frame_cache[key] = frame
+    if len(_die_frame_cache) > _DIE_FRAME_CACHE_SIZE:
+        del _die_frame_cache[next(iter(_die_frame_cache))]
+    return frame
 
-    DIE.name = f"DIE {die_name}"
-    return DIE
 
+def die_cell(
+    die_parameters: DieParameters = DieParameters(),
+    n_m_units: Tuple[int, int] = (1, 1),
+    contact_w: Union[int, float] = 50,
+    device_max_size: Tuple[Union[int, float], Union[int, float]] = (
+        round(DieParameters().unit_die_w / 3),
+        round(DieParameters().unit_die_h / 3),
+    ),
+    ports: Dict[str, int] = {"N": 1, "E": 1, "W": 1, "S": 1},
+    ports_gnd: List[str] = ["E", "S"],
+    text: str = "",
+    text_size: Union[None, int, float] = None,
+) -> Device:
+    """Creates a die cell with dicing marks, text, and pads to connect to a
+    device.
 
-def pad_with_offset(die_parameters: DieParameters = DieParameters()):
-    DEVICE = Device()
-    outer_pad = pg.rectangle(
-        die_parameters.pad_size,
+    The frame of the die (dicing marks, pads and routes) is built once per set
+    of parameters and is cached for the dies that only differ by their text.
+    Only the polygons reached by the label are recomputed for each die. The
+    dies reference the shared frame, pads and glyphs, which are written once
+    in the GDS file: flatten a die before modifying it in place (e.g. with
+    remove_layers or remap_layers, which are recursive).
+
+    Parameters:
+        die_parameters (DieParameters): the die's parameters.
+        n_m_units (tuple of int): number of unit dies that compose the cell in width and height.
+        device_max_size (tuple of int or float): Max dimensions of the device
+            inside the cell (width, height).
+        ports (dict): The ports of the device, format must be {'N':m, 'E':n, 'W':p, 'S':q}.
+        ports_gnd (list of string): The ports connected to ground.
+        text (string): The text to be displayed on the cell.
+        text_size (int or float): If specified, overwrites the Die's
+            text_size. Size of text, corresponds to phidl geometry std.
+
+    Returns:
+        DIE (Device): The cell, with ports of width contact_w positioned around a device_max_size area.
+    """
+
+    die_name = text.replace("\n", "")
+    die_size = [n_m_units[i] * die_parameters.unit_die_size[i] for i in [0, 1]]
+    DIE = Device(f"DIE {die_name}")
+
+    frame = _die_frame(
+        die_parameters, n_m_units, contact_w, device_max_size, ports, ports_gnd
+    )
+
+    # label the cell
+    if text_size is not None:
+        label_size = text_size
+    else:
+        label_size = die_parameters.text_size
+
+    # the label and its outline are made of shared glyphs
+    label = geometry.text(text, size=label_size, layer=die_parameters.die_layer)
+    labelOut = geometry.text(
+        text,
+        size=label_size,
         layer=die_parameters.die_layer,
+        outline=die_parameters.outline,
     )
-    inner_pad = pg.rectangle(
-        [dim - die_parameters.pad_tolerance for dim in die_parameters.pad_size],
-        layer=die_parameters.pad_layer,
+    pos = [
+        x + 2 * die_parameters.outline + 10
+        for x in (-die_size[0] / 2, -die_size[1] / 2)
+    ]
+    displacement = np.array(pos) - (label.xmin, label.ymin)
+    label.move(displacement)
+    labelOut.move(displacement)
+
+    # split the frame between the polygons reached by the label and the others
+    (xmin, ymin), (xmax, ymax) = labelOut.bbox
+    reached = {}
+    for layer, bboxes in frame["bboxes"].items():
+        reached[layer] = tuple(
+            np.flatnonzero(
+                (bboxes[:, 0] <= xmax)
+                & (bboxes[:, 2] >= xmin)
+                & (bboxes[:, 1] <= ymax)
+                & (bboxes[:, 3] >= ymin)
+            )
+        )
+    footprint = tuple(sorted(reached.items()))
+
+    FRAME = frame["masters"].get(footprint)
+    if FRAME is None:
+        FRAME = Device(f"DIE FRAME {n_m_units[0]}x{n_m_units[1]}")
+        for layer, polys in frame["polygons"].items():
+            kept = [p for i, p in enumerate(polys) if i not in reached[layer]]
+            if kept:
+                FRAME.add_polygon(kept, layer=layer)
+        FRAME << frame["pads"]
+        frame["masters"][footprint] = FRAME
+    DIE << FRAME
+
+    # add the label and recompute the polygons it reaches
+    die_layer = geometry._layer_tuple(die_parameters.die_layer)
+    for layer, indices in reached.items():
+        if not indices and layer != die_layer:
+            continue
+        REACHED = Device()
+        if indices:
+            REACHED.add_polygon(
+                [frame["polygons"][layer][i] for i in indices], layer=layer
+            )
+        clear = labelOut
+        if layer in frame["keep"]:
+            clear = geometry.boolean(labelOut, frame["keep"][layer], "A-B")
+        if layer == die_layer and die_parameters.invert:
+            REACHED = geometry.boolean([REACHED, clear], label, "A-B", layer=layer)
+        elif layer == die_layer:
+            REACHED = geometry.boolean(REACHED, clear, "A-B", layer=layer)
+            REACHED << label
+        else:
+            # the glyphs' outlines can overlap their neighbours
+            clear = geometry.boolean(clear, label, "A-B")
+            REACHED = geometry.boolean(REACHED, clear, "A-B", layer=layer)
+        DIE << REACHED
+    if die_layer not in reached:
+        if die_parameters.invert:
+            # the glyphs' outlines can overlap their neighbours
+            DIE << geometry.boolean(labelOut, label, "A-B", layer=die_layer)
+        else:
+            DIE << label
+
+    for port in frame["ports"]:
+        DIE.add_port(port=port)
+
+    return DIE
+
+
+def pad_with_offset(die_parameters: DieParameters = DieParameters()) -> Device:
+    """Returns the pad of the dies: a pad_size rectangle on the die layer,
+    with a rectangle smaller by pad_tolerance on the pad layer in its center.
+
+    Parameters:
+        die_parameters (DieParameters): the die's parameters.
+
+    Returns:
+        Device: A pad, with its bottom left corner on (0, 0), that references
+        the pad shared by the dies: flatten it before modifying it in place.
+    """
+    PAD = Device("PAD")
+    PAD << _pad_master(
+        die_parameters.pad_size,
+        die_parameters.pad_tolerance,
+        die_parameters.die_layer,
+        die_parameters.pad_layer,
     )
-    inner_pad.center = outer_pad.center
+    return PAD
 
-    DEVICE << outer_pad
-    DEVICE << inner_pad
-    return DEVICE
+
+_pad_masters: Dict[tuple, Device] = {}
+
+
+def clear_pad_cache() -> None:
+    """Clears the pads shared by the dies."""
+    _pad_masters.clear()
+
+
+def _pad_master(
+    pad_size: Tuple[Union[int, float], Union[int, float]],
+    pad_tolerance: Union[int, float],
+    layer: Optional[int],
+    pad_layer: int,
+) -> Device:
+    """Returns the pad shared by all the pads of these dimensions and layers.
+
+    The pad is built once and meant to be placed as a reference: it has no
+    ports and must not be modified. Its bottom left corner is on (0, 0).
+
+    Parameters:
+        pad_size (tuple of int or float): The size of the pad.
+        pad_tolerance (int or float): The margin between the outer and inner
+            rectangles.
+        layer (int or array-like[2], optional): The layer of the outer
+            rectangle. If None, the pad only has its inner rectangle.
+        pad_layer (int or array-like[2]): The layer of the inner rectangle.
+
+    Returns:
+        Device: The shared pad.
+    """
+    size = tuple(round(dim, 6) for dim in pad_size)
+    key = _freeze((size, round(pad_tolerance, 6), layer, pad_layer))
+    if key not in _pad_masters:
+        PAD = Device(f"PAD {size[0]}x{size[1]}")
+        outer_pad = pg.rectangle(pad_size)
+        if layer is not None:
+            PAD.add_polygon(outer_pad.get_polygons(), layer=layer)
+        inner_pad = pg.rectangle([dim - pad_tolerance for dim in pad_size])
+        inner_pad.center = outer_pad.center
+        PAD.add_polygon(inner_pad.get_polygons(), layer=pad_layer)
+        _pad_masters[key] = PAD
+    return _pad_masters[key]
 
 
 def add_optimalstep_to_dev(
@@ -426,7 +746,7 @@ def add_optimalstep_to_dev(
 
     DEV_STP << DEVICE
     for port in DEVICE.flatten().get_ports():
-        STP = pg.optimal_step(
+        STP = geometry.optimal_step(
             port.width, port.width * ratio, symmetric=True, layer=layer
         )
         STP.name = f"optimal step x{ratio} "
@@ -500,9 +820,10 @@ def add_hyptap_to_cell(
     Returns:
         Tuple[Device, Device]: a tuple containing:
 
-        - **HT** (*Device*): The hyper tapers, positioned at the die's ports.
-          Ports of the same name as the die's ports are added to the output of
-          the tapers.
+        - **HT** (*Device*): The hyper tapers, positioned at the die's ports,
+          as references to tapers shared by all the ports and cells (see
+          hyper_taper_master). Ports of the same name as the die's ports are
+          added to the output of the tapers.
         - **device_ports** (*Device*): A device containing only the input ports
           of the tapers, named as the die's ports.
     """
@@ -512,19 +833,81 @@ def add_hyptap_to_cell(
 
     for port in die_ports:
         ht_w = port.width + 2 * contact_l
-        ht = HT << geometry.hyper_taper(contact_l, ht_w, contact_w)
-        ht.connect(ht.ports[2], port)
-        HT.add_port(port=ht.ports[1], name=port.name)
-        device_ports.add_port(port=ht.ports[2], name=port.name)
+        ht = HT << hyper_taper_master(contact_l, ht_w, contact_w, layer)
+        # connect the taper's wide end to the die's port, the taper's narrow
+        # end facing the device
+        orientation = (port.orientation + 180) % 360
+        direction = np.array(
+            [np.cos(np.radians(port.orientation)), np.sin(np.radians(port.orientation))]
+        )
+        ht.rotate(orientation)
+        ht.move(port.midpoint + contact_l * direction)
+        HT.add_port(
+            name=port.name,
+            midpoint=port.midpoint + contact_l * direction,
+            width=contact_w,
+            orientation=port.orientation,
+        )
+        device_ports.add_port(
+            name=port.name,
+            midpoint=port.midpoint,
+            width=ht_w,
+            orientation=orientation,
+        )
 
-    HT.flatten(single_layer=layer)
     return HT, device_ports
 
 
+_hyper_taper_masters: Dict[tuple, Device] = {}
+
+
+def clear_hyper_taper_cache() -> None:
+    """Clears the hyper tapers shared by add_hyptap_to_cell."""
+    _hyper_taper_masters.clear()
+
+
+def hyper_taper_master(
+    length: Union[int, float],
+    wide_section: Union[int, float],
+    narrow_section: Union[int, float],
+    layer: int = 1,
+) -> Device:
+    """Returns the hyper taper shared by all the tapers of these dimensions.
+
+    The taper is built once (see geometries.hyper_taper) and meant to be
+    placed as a reference: it has no ports, so that the ports of the Devices
+    referencing it are not duplicated by get_ports(), and must not be
+    modified. Its narrow end is centered on (0, 0), facing west, and its wide
+    end on (length, 0), facing east.
+
+    Parameters:
+        length (int or float): Length of taper.
+        wide_section (int or float): Wide width dimension.
+        narrow_section (int or float): Narrow width dimension.
+        layer (int or array-like[2]): The layer of the taper.
+
+    Returns:
+        Device: The shared hyper taper.
+    """
+    key = (round(length, 6), round(wide_section, 6), round(narrow_section, 6), layer)
+    key = _freeze(key)
+    if key not in _hyper_taper_masters:
+        HT = geometry.hyper_taper(length, wide_section, narrow_section, layer=layer)
+        HT.ports = {}
+        HT.name = f"HYPER TAPER {key[0]}x{key[1]}x{key[2]}"
+        _hyper_taper_masters[key] = HT
+    return _hyper_taper_masters[key]
+
+
 def route_to_dev(ext_ports: List[Port], dev_ports: Set[Port], layer: int = 1) -> Device:
     """Creates smooth routes from external ports to the device's ports. If
     route_smooth is not working, routes quad.
 
+    The routes are first tried with a bend radius of the external port's
+    width, then with the device port's width. Whether a smooth route fits
+    is checked beforehand for all the ports at once, so that only the routes
+    that fit are built.
+
     Parameters:
         ext_ports (list of Port): The external ports, e.g., of the die or hyper tapers (use .get_ports()).
         dev_ports (set of Port): The device's ports, should be named as the external ports (use .ports).
@@ -535,35 +918,616 @@ def route_to_dev(ext_ports: List[Port], dev_ports: Set[Port], layer: int = 1) ->
     """
 
     ROUTES = Device("ROUTES ")
-
-    for port in ext_ports:
-        dev_port = dev_ports[port.name]
-        try:
-            radius = port.width
-            length1 = 2 * radius
-            length2 = 2 * radius
-            ROUTES << pr.route_smooth(
-                port, dev_port, radius, path_type="Z", length1=length1, length2=length2
-            )
-        except ValueError:
+    if not ext_ports:
+        return ROUTES
+
+    pairs = [(port, dev_ports[port.name]) for port in ext_ports]
+    ext_w = np.array([port.width for port, _ in pairs], dtype=float)
+    dev_w = np.array([dev_port.width for _, dev_port in pairs], dtype=float)
+    # (radius, length1 = length2) of the smooth routes to try, in order
+    attempts = [(ext_w, 2 * ext_w), (dev_w, dev_w)]
+    fits = [_z_route_fits(pairs, radius, length) for radius, length in attempts]
+
+    quads = []
+    for i, (port, dev_port) in enumerate(pairs):
+        for (radius, length), fit in zip(attempts, fits):
+            if not fit[i]:
+                continue
             try:
-                radius = dev_port.width
-                length1 = radius
-                length2 = radius
-                ROUTES << pr.route_smooth(
+                route = pr.route_smooth(
                     port,
                     dev_port,
-                    radius,
+                    radius[i],
                     path_type="Z",
-                    length1=length1,
-                    length2=length2,
+                    length1=length[i],
+                    length2=length[i],
                 )
-            except ValueError:
-                ROUTES << pr.route_quad(port, dev_port)
-    ROUTES.flatten(single_layer=layer)
+            except ValueError:  # rounding errors, at the limit of fitting
+                continue
+            ROUTES.add_polygon(route.get_polygons(), layer=layer)
+            break
+        else:
+            quads.append(i)
+
+    if quads:
+        ROUTES.add_polygon(list(_quad_routes([pairs[i] for i in quads])), layer=layer)
     return ROUTES
 
 
+def _z_route_fits(
+    pairs: List[Tuple[Port, Port]], radius: np.ndarray, length: np.ndarray
+) -> np.ndarray:
+    """Checks, for each pair of ports, if a smooth Z route (see
+    phidl.routing.route_smooth with euler bends) fits between the ports.
+
+    The route's waypoints go out of each port by length. A bend of angle a
+    starts at radius * tan(a / 2) from its waypoint, and the bends must fit
+    on the segments between the waypoints.
+
+    Returns:
+        numpy.ndarray of bool: True for the pairs whose route fits.
+    """
+    p1 = np.array([port.midpoint for port, _ in pairs], dtype=float)
+    p4 = np.array([dev_port.midpoint for _, dev_port in pairs], dtype=float)
+    a1 = np.radians([port.orientation for port, _ in pairs])
+    a2 = np.radians([dev_port.orientation for _, dev_port in pairs])
+    p2 = p1 + length[:, None] * np.column_stack((np.cos(a1), np.sin(a1)))
+    p3 = p4 + length[:, None] * np.column_stack((np.cos(a2), np.sin(a2)))
+    segments = np.stack((p2 - p1, p3 - p2, p4 - p3), axis=1)
+
+    ds = np.hypot(segments[..., 0], segments[..., 1])
+    theta = np.degrees(np.arctan2(segments[..., 1], segments[..., 0]))
+    dtheta = np.diff(theta, axis=1)
+    dtheta = dtheta - 360 * np.floor((dtheta + 180) / 360)
+    straight = np.abs(dtheta) < 1e-6
+    backwards = np.any(~straight & (np.abs(np.abs(dtheta) - 180) < 1e-6), axis=1)
+
+    d = np.where(straight, 0, radius[:, None] * np.tan(np.radians(np.abs(dtheta)) / 2))
+    d1, d2 = d[:, 0], d[:, 1]
+    ds1, ds2, ds3 = ds[:, 0], ds[:, 1], ds[:, 2]
+    # the waypoints of straight bends are removed, merging their segments
+    fits = np.where(
+        straight[:, 0],
+        (d2 <= ds1 + ds2) & (d2 <= ds3),
+        np.where(
+            straight[:, 1],
+            (d1 <= ds1) & (d1 <= ds2 + ds3),
+            (d1 <= ds1) & (d1 + d2 <= ds2) & (d2 <= ds3),
+        ),
+    )
+    return fits & ~backwards
+
+
+def _quad_routes(pairs: List[Tuple[Port, Port]]) -> np.ndarray:
+    """Returns the quadrilaterals between pairs of ports (see
+    phidl.routing.route_quad), as an array of shape (len(pairs), 4, 2)."""
+    vertices = []
+    for side in (0, 1):
+        a = np.radians([pair[side].orientation for pair in pairs])
+        w = np.array([pair[side].width for pair in pairs], dtype=float) / 2
+        edge = np.column_stack((-np.sin(a), np.cos(a))) * w[:, None]
+        midpoint = np.array([pair[side].midpoint for pair in pairs], dtype=float)
+        vertices += [midpoint + edge, midpoint - edge]
+    vertices = np.stack(vertices, axis=1)
+    # sort the vertices by angle from the center, to make convex polygons
+    displacements = vertices - vertices.mean(axis=1, keepdims=True)
+    order = np.argsort(np.arctan2(displacements[..., 0], displacements[..., 1]), axis=1)
+    return np.take_along_axis(vertices, order[..., None], axis=1)
+
+
+def geometry_hash(
+    device: Device,
+    precision: float = 1e-4,
+    include_ports: bool = True,
+    memo: Optional[Dict[int, bytes]] = None,
+) -> str:
+    """Computes a fingerprint of a Device's geometry.
+
+    The polygons of each layer are snapped on a grid, their vertices are
+    put in a canonical order (counterclockwise, starting from the lowest
+    vertex) and the polygons are sorted, so that the fingerprint does not
+    depend on the order in which the geometry was created. References are
+    hashed recursively, each referenced Device being hashed only once.
+    The names of the Devices are not part of the fingerprint.
+
+    Parameters:
+        device (Device): The Device to fingerprint.
+        precision (float): The grid on which coordinates are snapped (in µm).
+        include_ports (bool): If True, the ports of the Device (and of its
+            references' Devices) are part of the fingerprint.
+        memo (dict, optional): The fingerprints of the Devices already hashed,
+            by id. Pass the same dict to several calls to reuse the
+            fingerprints of shared subcells, as long as they are not modified
+            between the calls.
+
+    Returns:
+        str: The hexadecimal fingerprint, identical for two Devices with the
+        same geometry.
+    """
+
+    if memo is None:
+        memo = {}
+
+    def snap(values):
+        # adding 0 turns -0 into 0
+        return np.round(np.asarray(values, dtype=float) / precision).astype(
+            np.int64
+        ) + np.int64(0)
+
+    def polygon_digest(points):
+        points = snap(points)
+        x, y = points[:, 0], points[:, 1]
+        if np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)) < 0:
+            points = points[::-1]
+        points = np.roll(points, -np.lexsort((points[:, 0], points[:, 1]))[0], axis=0)
+        return hashlib.blake2b(points.tobytes(), digest_size=16).digest()
+
+    def device_digest(D):
+        if id(D) in memo:
+            return memo[id(D)]
+        h = hashlib.blake2b(digest_size=16)
+        layers = {}
+        for polygonset in D.polygons:
+            for points, layer, datatype in zip(
+                polygonset.polygons, polygonset.layers, polygonset.datatypes
+            ):
+                layers.setdefault((int(layer), int(datatype)), []).append(
+                    polygon_digest(points)
+                )
+        for layer, digests in sorted(layers.items()):
+            h.update(repr(layer).encode())
+            h.update(b"".join(sorted(digests)))
+
+        references = []
+        for ref in D.references:
+            transform = (
+                snap(ref.origin).tolist(),
+                round(float(ref.rotation or 0) % 360, 6),
+                float(ref.magnification or 1),
+                bool(ref.x_reflection),
+                int(getattr(ref, "columns", 1)),
+                int(getattr(ref, "rows", 1)),
+                snap(getattr(ref, "spacing", (0, 0))).tolist(),
+            )
+            references.append(device_digest(ref.parent) + repr(transform).encode())
+        h.update(b"".join(sorted(references)))
+
+        if include_ports:
+            ports = sorted(
+                repr(
+                    (
+                        str(name),
+                        snap(port.midpoint).tolist(),
+                        snap(port.width).tolist(),
+                        round(float(port.orientation) % 360, 6),
+                    )
+                )
+                for name, port in D.ports.items()
+            )
+            h.update("".join(ports).encode())
+
+        memo[id(D)] = h.digest()
+        return memo[id(D)]
+
+    return device_digest(device).hex()
+
+
+def pack_device(device: Device) -> Dict[str, np.ndarray]:
+    """Packs a Device and the Devices it references into flat NumPy arrays.
+
+    The packed Device is a dict of arrays, cheap to pickle (e.g. to send it to
+    another process) or to save with numpy.savez. Each Device of the tree is
+    packed once, children before parents, the packed Device being the last.
+    The vertices of all the polygons are concatenated in a single buffer,
+    indexed by offset tables. The Devices' labels are packed, their info is
+    not (it can hold any object): the unpacked Devices have an empty info.
+
+    Parameters:
+        device (Device): The Device to pack.
+
+    Returns:
+        dict of numpy.ndarray: The packed Device, to be rebuilt with unpack_device.
+    """
+    cells = []
+    index = {}
+
+    def visit(D):
+        if id(D) in index:
+            return
+        for ref in D.references:
+            visit(ref.parent)
+        index[id(D)] = len(cells)
+        cells.append(D)
+
+    visit(device)
+
+    memo = {}
+    vertices, polygon_offsets, polygon_layers = [], [0], []
+    reference_cells, reference_transforms = [], []
+    port_names, port_name_types, port_data = [], [], []
+    label_texts, label_data = [], []
+    cell_polygons, cell_references, cell_ports, cell_labels = [0], [0], [0], [0]
+    for D in cells:
+        for polygonset in D.polygons:
+            for points, layer, datatype in zip(
+                polygonset.polygons, polygonset.layers, polygonset.datatypes
+            ):
+                vertices.append(points)
+                polygon_offsets.append(polygon_offsets[-1] + len(points))
+                polygon_layers.append((layer, datatype))
+        for ref in D.references:
+            reference_cells.append(index[id(ref.parent)])
+            reference_transforms.append(
+                (
+                    *ref.origin,
+                    ref.rotation or 0,
+                    ref.magnification or 1,
+                    bool(ref.x_reflection),
+                    getattr(ref, "columns", 0),
+                    getattr(ref, "rows", 0),
+                    *getattr(ref, "spacing", (0, 0)),
+                )
+            )
+        for name, port in D.ports.items():
+            port_names.append(str(name))
+            port_name_types.append(isinstance(name, int))
+            port_data.append((*port.midpoint, port.width, port.orientation))
+        for label in D.labels:
+            label_texts.append(label.text)
+            label_data.append(
+                (
+                    *label.position,
+                    np.nan if label.rotation is None else label.rotation,
+                    np.nan if label.magnification is None else label.magnification,
+                    bool(label.x_reflection),
+                    label.anchor,
+                    label.layer,
+                    label.texttype,
+                )
+            )
+        cell_polygons.append(len(polygon_layers))
+        cell_references.append(len(reference_cells))
+        cell_ports.append(len(port_names))
+        cell_labels.append(len(label_texts))
+
+    return {
+        "cell_names": np.array([D.name for D in cells], dtype=str),
+        "cell_hashes": np.array([geometry_hash(D, memo=memo) for D in cells]),
+        "cell_polygons": np.array(cell_polygons, dtype=np.int64),
+        "cell_references": np.array(cell_references, dtype=np.int64),
+        "cell_ports": np.array(cell_ports, dtype=np.int64),
+        "cell_labels": np.array(cell_labels, dtype=np.int64),
+        "vertices": (
+            np.concatenate(vertices).astype(np.float64)
+            if vertices
+            else np.zeros((0, 2))
+        ),
+        "polygon_offsets": np.array(polygon_offsets, dtype=np.int64),
+        "polygon_layers": np.array(polygon_layers, dtype=np.int32).reshape(-1, 2),
+        "reference_cells": np.array(reference_cells, dtype=np.int64),
+        "reference_transforms": np.array(
+            reference_transforms, dtype=np.float64
+        ).reshape(-1, 9),
+        "port_names": np.array(port_names, dtype=str),
+        "port_name_types": np.array(port_name_types, dtype=bool),
+        "port_data": np.array(port_data, dtype=np.float64).reshape(-1, 4),
+        "label_texts": np.array(label_texts, dtype=str),
+        "label_data": np.array(label_data, dtype=np.float64).reshape(-1, 8),
+    }
+
+
+def unpack_device(
+    packed: Dict[str, np.ndarray], masters: Optional[Dict[str, Device]] = None
+) -> Device:
+    """Rebuilds a Device packed with pack_device.
+
+    The polygons of the rebuilt Devices are copies of the packed vertices:
+    modifying them does not modify the packed Device. The Devices' info is
+    not packed, it is empty.
+
+    Parameters:
+        packed (dict of numpy.ndarray): The packed Device.
+        masters (dict, optional): Devices already rebuilt, by geometry_hash.
+            A packed Device with the same geometry as one of them is not rebuilt
+            but replaced by it, and the rebuilt Devices are added to the dict.
+            Pass the same dict when unpacking several Devices to share their
+            common subcells (e.g. the die frames).
+
+    Returns:
+        Device: The rebuilt Device.
+    """
+    if masters is None:
+        masters = {}
+
+    polygons = np.split(packed["vertices"], packed["polygon_offsets"][1:-1])
+    layers = packed["polygon_layers"].tolist()
+    transforms = packed["reference_transforms"].tolist()
+    port_data = packed["port_data"].tolist()
+    label_data = packed["label_data"].tolist()
+    cells = []
+    for i, (name, cell_hash) in enumerate(
+        zip(packed["cell_names"].tolist(), packed["cell_hashes"].tolist())
+    ):
+        if cell_hash in masters:
+            cells.append(masters[cell_hash])
+            continue
+        D = Device(name)
+
+        p0, p1 = packed["cell_polygons"][i : i + 2]
+        by_layer = {}
+        for points, layer in zip(polygons[p0:p1], layers[p0:p1]):
+            by_layer.setdefault(tuple(layer), []).append(points.copy())
+        for layer, points in by_layer.items():
+            D.add_polygon(points, layer=layer)
+
+        r0, r1 = packed["cell_references"][i : i + 2]
+        for child, transform in zip(
+            packed["reference_cells"][r0:r1].tolist(), transforms[r0:r1]
+        ):
+            x, y, rotation, magnification, x_reflection, columns, rows = transform[:7]
+            if columns:
+                ref = CellArray(
+                    cells[child],
+                    columns=int(columns),
+                    rows=int(rows),
+                    spacing=transform[7:],
+                    origin=(x, y),
+                    rotation=rotation,
+                    magnification=magnification,
+                    x_reflection=bool(x_reflection),
+                )
+            else:
+                ref = DeviceReference(
+                    cells[child],
+                    origin=(x, y),
+                    rotation=rotation,
+                    magnification=magnification,
+                    x_reflection=bool(x_reflection),
+                )
+            ref.owner = D
+            D.add(ref)
+
+        q0, q1 = packed["cell_ports"][i : i + 2]
+        for name, is_int, (x, y, width, orientation) in zip(
+            packed["port_names"][q0:q1].tolist(),
+            packed["port_name_types"][q0:q1].tolist(),
+            port_data[q0:q1],
+        ):
+            D.add_port(
+                name=int(name) if is_int else name,
+                midpoint=(x, y),
+                width=width,
+                orientation=orientation,
+            )
+
+        l0, l1 = packed["cell_labels"][i : i + 2]
+        for text, data in zip(packed["label_texts"][l0:l1].tolist(), label_data[l0:l1]):
+            x, y, rotation, magnification, x_reflection, anchor = data[:6]
+            label = D.add_label(
+                text,
+                position=(x, y),
+                magnification=None if np.isnan(magnification) else magnification,
+                rotation=None if np.isnan(rotation) else rotation,
+                layer=(int(data[6]), int(data[7])),
+            )
+            label.anchor = int(anchor)
+            label.x_reflection = bool(x_reflection)
+
+        masters[cell_hash] = D
+        cells.append(D)
+
+    return cells[-1]
+
+
+def save_device(filename: str, device: Device) -> None:
+    """Saves a Device, packed with pack_device, in a .npz file.
+
+    The file is written atomically: a Device being saved is never read
+    half-written by another process.
+
+    Parameters:
+        filename (str): The name of the file.
+        device (Device): The Device to save.
+    """
+    temp_filename = f"{filename}.{os.getpid()}.tmp"
+    with open(temp_filename, "wb") as file:
+        np.savez(file, **pack_device(device))
+    os.replace(temp_filename, filename)
+
+
+def load_device(filename: str, masters: Optional[Dict[str, Device]] = None) -> Device:
+    """Loads a Device saved with save_device.
+
+    Parameters:
+        filename (str): The name of the file.
+        masters (dict, optional): Devices already rebuilt, by geometry_hash
+            (see unpack_device).
+
+    Returns:
+        Device: The loaded Device.
+    """
+    with np.load(filename) as packed:
+        packed = dict(packed)
+    return unpack_device(packed, masters=masters)
+
+
+_cell_cache = {"directory": None, "max_size": 0, "hits": 0, "misses": 0}
+
+# part of the cell cache and manifest keys: bump it whenever the geometry
+# built by the cells, or the format of pack_device, changes, so that the cells
+# cached or recorded before are rebuilt
+_CELL_CACHE_VERSION = 4
+
+
+def enable_cell_cache(directory: Optional[str] = None, max_size: int = 1024**3) -> None:
+    """Enables the on-disk cell cache.
+
+    Once enabled, the cells built with cached_cell (or Design.build_cells) are
+    saved in the cache directory, and loaded from it instead of being rebuilt
+    when the same builder is called again with the same arguments, in this run
+    or in a later one. The cache is disabled by default.
+
+    Parameters:
+        directory (str, optional): The cache directory. If None, uses
+            ~/.cache/qnngds.
+        max_size (int): The maximum size of the cache (in bytes). The least
+            recently used cells are evicted when the cache grows bigger.
+    """
+    if directory is None:
+        directory = os.path.join(os.path.expanduser("~"), ".cache", "qnngds")
+    os.makedirs(directory, exist_ok=True)
+    _cell_cache.update(directory=directory, max_size=max_size, hits=0, misses=0)
+
+
+def disable_cell_cache() -> None:
+    """Disables the on-disk cell cache, without clearing it."""
+    _cell_cache["directory"] = None
+
+
+def cell_cache_stats() -> dict:
+    """Describes the on-disk cell cache.
+
+    Returns:
+        dict: The cache "directory" (None if the cache is disabled), its
+        "max_size", its number of "entries" and their total "size" (in bytes),
+        and the number of "hits" and "misses" since the cache was enabled.
+    """
+    entries = _cell_cache_entries()
+    return {
+        "directory": _cell_cache["directory"],
+        "max_size": _cell_cache["max_size"],
+        "entries": len(entries),
+        "size": sum(entry.st_size for _, entry in entries),
+        "hits": _cell_cache["hits"],
+        "misses": _cell_cache["misses"],
+    }
+
+
+def cell_cache_clear() -> None:
+    """Removes all the cells from the on-disk cell cache."""
+    for path, _ in _cell_cache_entries():
+        os.remove(path)
+
+
+def cached_cell(builder, *args, **kwargs) -> Device:
+    """Builds a cell, or loads it from the on-disk cell cache.
+
+    The cell is identified by the builder's name, the version of qnngds and of
+    the cache format, and the arguments, defaults included. The builder must
+    only depend on its arguments. If the cache is disabled, or if an argument
+    can't be part of the cache key, the cell is simply built. The Devices
+    loaded from the cache have no info (see pack_device).
+
+    Parameters:
+        builder (function): The cell builder (e.g. qnngds.cells.ntron).
+        *args, **kwargs: The arguments of the builder.
+
+    Returns:
+        Device: The cell.
+
+    Examples:
+        >>> qu.enable_cell_cache()
+        >>> NTRON = qu.cached_cell(qc.ntron, choke_w=0.05, channel_w=0.5)
+    """
+    if _cell_cache["directory"] is None:
+        return builder(*args, **kwargs)
+    bound = inspect.signature(builder).bind(*args, **kwargs)
+    bound.apply_defaults()
+    try:
+        key = _cell_cache_key(
+            f"{builder.__module__}.{builder.__qualname__}", bound.arguments
+        )
+    except TypeError:
+        return builder(*args, **kwargs)
+    device = _cell_cache_load(key)
+    if device is None:
+        device = builder(*args, **kwargs)
+        _cell_cache_save(key, device)
+    return device
+
+
+def _cell_cache_key(name: str, arguments) -> str:
+    """Returns the cache key of a cell, or raises a TypeError if an argument
+    can't be part of it."""
+
+    def normalize(value):
+        if value is None or isinstance(value, (bool, int, str)):
+            return value
+        if isinstance(value, float):
+            return float.hex(value)
+        if isinstance(value, np.generic):
+            return normalize(value.item())
+        if isinstance(value, DieParameters):
+            return ("DieParameters", normalize(value._key))
+        if isinstance(value, Device):
+            return ("Device", geometry_hash(value))
+        if isinstance(value, dict):
+            return ("dict", sorted((repr(k), normalize(v)) for k, v in value.items()))
+        if isinstance(value, (set, frozenset)):
+            return ("set", sorted(repr(normalize(v)) for v in value))
+        if isinstance(value, (list, tuple, np.ndarray)):
+            return tuple(normalize(v) for v in value)
+        raise TypeError(f"Can't cache a cell built from a {type(value).__name__}.")
+
+    key = repr((name, _qnngds_version(), _CELL_CACHE_VERSION, normalize(arguments)))
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def _qnngds_version() -> str:
+    try:
+        return importlib.metadata.version("qnngds")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _cell_cache_entries() -> List[Tuple[str, os.stat_result]]:
+    """Returns the paths and stats of the cached cells."""
+    directory = _cell_cache["directory"]
+    if directory is None:
+        return []
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(".npz"):
+            try:
+                entries.append((entry.path, entry.stat()))
+            except FileNotFoundError:  # evicted by another process
+                pass
+    return entries
+
+
+def _cell_cache_load(
+    key: str, masters: Optional[Dict[str, Device]] = None
+) -> Optional[Device]:
+    """Loads a cell from the cache, or returns None if it is not cached."""
+    path = os.path.join(_cell_cache["directory"], key + ".npz")
+    try:
+        device = load_device(path, masters=masters)
+        os.utime(path)  # the modification time is used as last access time
+    except (OSError, ValueError):
+        _cell_cache["misses"] += 1
+        return None
+    _cell_cache["hits"] += 1
+    return device
+
+
+def _cell_cache_save(key: str, device: Device) -> None:
+    """Saves a cell in the cache, and evicts the least recently used cells if
+    the cache is too big."""
+    path = os.path.join(_cell_cache["directory"], key + ".npz")
+    save_device(path, device)
+
+    entries = sorted(_cell_cache_entries(), key=lambda entry: entry[1].st_mtime)
+    size = sum(stat.st_size for _, stat in entries)
+    for old_path, stat in entries:
+        if size <= _cell_cache["max_size"] or old_path == path:
+            break
+        try:
+            os.remove(old_path)
+        except FileNotFoundError:
+            pass
+        size -= stat.st_size
+
+
 # from previous qnngds: to be tested...
 
 # def outline(elements, distance = 1, precision = 1e-4, num_divisions = [1, 1],
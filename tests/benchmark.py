@@ -0,0 +1,424 @@
+"""This module benchmarks the builders of qnngds: the devices, the circuits,
+the cells, the die cell and the Design's chip creation, placement and
+writing. Each builder is run with small, medium and large parameters. The
+time of the fastest run (out of a few) and the peak memory allocated are
+measured.
+
+Run this test from its parent directory (qnngds/tests).
+
+The results are stored in benchmarks/<label>.json, the label being the git
+revision of qnngds (or its version, out of a git repository) unless given
+with the --label option, so that the performances of two revisions can be
+compared with the --compare option, e.g. after a change:
+
+    git stash
+    python benchmark.py --label before
+    git stash pop
+    python benchmark.py --compare before
+
+The caches of qnngds are cleared before each run, so that the times
+measured are the ones of a first build.
+"""
+
+import argparse
+import functools
+import gc
+import importlib.metadata
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import qnngds.cells as cell
+import qnngds.circuits as circuit
+import qnngds.design as design
+import qnngds.devices as device
+import qnngds.geometries as geometry
+import qnngds.tests as test
+import qnngds.utilities as utility
+
+RESULTS_DIR = "benchmarks"
+
+SIZES = ["small", "medium", "large"]
+
+
+def design_chip(N_dies, write=False):
+    """Creates a chip, fills it with ntron cells and writes it."""
+    DESIGN = design.Design(N_dies=N_dies, chip_w=N_dies * 1000, chip_margin=50)
+    DESIGN.create_chip(create_devices_map_txt=False)
+    channels_w = [0.2 + 0.05 * i for i in range(N_dies * N_dies // 2)]
+    DESIGN.place_remaining_devices(
+        [DESIGN.ntron_cell(choke_w=0.05, channel_w=w) for w in channels_w]
+    )
+    if write:
+        with tempfile.TemporaryDirectory() as directory:
+            DESIGN.write_gds(os.path.join(directory, "benchmark"))
+    return DESIGN.CHIP
+
+
+def die_ports(ports_per_side):
+    """Returns the ports of a die with ports_per_side ports on each side."""
+    side = ports_per_side
+    DIE = utility.die_cell(
+        n_m_units=(2, 2) if side > 2 else (1, 1),
+        ports={"N": side, "E": side, "W": side, "S": side},
+        ports_gnd=[],
+    )
+    return DIE.get_ports()
+
+
+# the builders and their parameters, by size. The parameters given as
+# functools.partial are built when the benchmark runs, before the timing.
+BENCHMARKS = {
+    "devices.nanowire.spot": (
+        device.nanowire.spot,
+        {
+            "small": {"num_pts": 20},
+            "medium": {"num_pts": 100},
+            "large": {"num_pts": 1000},
+        },
+    ),
+    "devices.nanowire.variable_length": (
+        device.nanowire.variable_length,
+        {
+            "small": {"constr_length": 1, "num_pts": 20},
+            "medium": {"constr_length": 10, "num_pts": 100},
+            "large": {"constr_length": 100, "num_pts": 1000},
+        },
+    ),
+    "devices.ntron.smooth": (
+        device.ntron.smooth,
+        {
+            "small": {},
+            "medium": {"channel_w": 1, "source_w": 3, "drain_w": 3},
+            "large": {"choke_w": 1, "channel_w": 10, "source_w": 30, "drain_w": 30},
+        },
+    ),
+    "devices.ntron.sharp": (
+        device.ntron.sharp,
+        {
+            "small": {},
+            "medium": {"channel_l": 1},
+            "large": {"channel_l": 10},
+        },
+    ),
+    "devices.resistor.meander": (
+        device.resistor.meander,
+        {
+            "small": {"squares": 100},
+            "medium": {"squares": 1000},
+            "large": {"squares": 10000, "max_length": 200},
+        },
+    ),
+    "devices.resistor.meander_sc_contacts": (
+        device.resistor.meander_sc_contacts,
+        {
+            "small": {"squares": 60},
+            "medium": {"squares": 600},
+            "large": {"squares": 6000, "max_length": 100},
+        },
+    ),
+    "devices.snspd.basic": (
+        device.snspd.basic,
+        {
+            "small": {"size": (6, 10)},
+            "medium": {"size": (50, 50)},
+            "large": {"size": (200, 200)},
+        },
+    ),
+    "devices.snspd.vertical": (
+        device.snspd.vertical,
+        {
+            "small": {"size": (6, 10)},
+            "medium": {"size": (50, 50)},
+            "large": {"size": (200, 200)},
+        },
+    ),
+    "circuits.snspd_ntron": (
+        circuit.snspd_ntron,
+        {
+            "small": {"size_snspd": (3, 3)},
+            "medium": {"size_snspd": (20, 20)},
+            "large": {"size_snspd": (50, 50)},
+        },
+    ),
+    "utilities.die_cell": (
+        utility.die_cell,
+        {
+            "small": {"text": "A"},
+            "medium": {"n_m_units": (2, 1), "ports": {"N": 2, "S": 2}},
+            "large": {
+                "n_m_units": (3, 3),
+                "ports": {"N": 5, "E": 5, "W": 5, "S": 5},
+                "ports_gnd": [],
+                "text": "LARGE DIE",
+            },
+        },
+    ),
+    "utilities.die_cell(not inverted)": (
+        utility.die_cell,
+        {
+            "small": {"die_parameters": utility.DieParameters(invert=False)},
+            "medium": {
+                "die_parameters": utility.DieParameters(invert=False),
+                "n_m_units": (2, 1),
+                "ports": {"N": 2, "S": 2},
+            },
+            "large": {
+                "die_parameters": utility.DieParameters(
+                    invert=False, fill_pad_layer=True
+                ),
+                "n_m_units": (3, 3),
+                "ports": {"N": 5, "E": 5, "W": 5, "S": 5},
+                "ports_gnd": [],
+            },
+        },
+    ),
+    "utilities.add_hyptap_to_cell": (
+        utility.add_hyptap_to_cell,
+        {
+            "small": {"die_ports": functools.partial(die_ports, 1)},
+            "medium": {"die_ports": functools.partial(die_ports, 2), "contact_l": 50},
+            "large": {"die_ports": functools.partial(die_ports, 5), "contact_l": 200},
+        },
+    ),
+    "cells.alignment": (
+        cell.alignment,
+        {
+            "small": {"layers_to_align": [2]},
+            "medium": {"layers_to_align": [2, 3]},
+            "large": {"layers_to_align": [1, 2, 3, 4]},
+        },
+    ),
+    "cells.vdp": (
+        cell.vdp,
+        {
+            "small": {"layers_to_probe": [2]},
+            "medium": {"layers_to_probe": [2, 3]},
+            "large": {"layers_to_probe": [1, 2, 3], "layers_to_outline": [1, 2]},
+        },
+    ),
+    "cells.etch_test": (
+        cell.etch_test,
+        {
+            "small": {"layers_to_etch": [[3]]},
+            "medium": {"layers_to_etch": [[1, 2], [1], [2]]},
+            "large": {"layers_to_etch": [[1], [2], [3], [1, 2], [2, 3], [1, 2, 3]]},
+        },
+    ),
+    "cells.resolution_test": (
+        cell.resolution_test,
+        {
+            "small": {"resolutions_to_test": [0.5, 1]},
+            "medium": {},
+            "large": {"resolutions_to_test": [0.025 * i for i in range(1, 21)]},
+        },
+    ),
+    "cells.nanowires": (
+        cell.nanowires,
+        {
+            "small": {"channels_sources_w": [(0.1, 1)]},
+            "medium": {},
+            "large": {"channels_sources_w": [(0.1 * i, i) for i in range(1, 9)]},
+        },
+    ),
+    "cells.ntron": (
+        cell.ntron,
+        {
+            "small": {"channel_w": 0.5},
+            "medium": {"channel_w": 2},
+            "large": {"choke_w": 1, "channel_w": 10},
+        },
+    ),
+    "cells.snspds": (
+        cell.snspds,
+        {
+            "small": {"snspds_width_pitch": [(0.2, 0.6)], "snspd_size": (20, 20)},
+            "medium": {},
+            "large": {
+                "snspds_width_pitch": [(0.1, 0.3), (0.2, 0.6), (0.3, 0.9), (0.4, 1)],
+                "snspd_size": (200, 200),
+            },
+        },
+    ),
+    "cells.snspd_ntron": (
+        cell.snspd_ntron,
+        {
+            "small": {"w_choke": 0.1},
+            "medium": {"w_choke": 0.05},
+            "large": {"w_choke": 0.02},
+        },
+    ),
+    "design.create_chip+place_remaining_devices": (
+        design_chip,
+        {
+            "small": {"N_dies": 3},
+            "medium": {"N_dies": 6},
+            "large": {"N_dies": 10},
+        },
+    ),
+    "design.create_chip+place_remaining_devices+write_gds": (
+        design_chip,
+        {
+            "small": {"N_dies": 3, "write": True},
+            "medium": {"N_dies": 6, "write": True},
+            "large": {"N_dies": 10, "write": True},
+        },
+    ),
+}
+
+
+def clear_caches():
+    """Clears the caches of qnngds, for the runs to be independent."""
+    utility.clear_die_frame_cache()
+    utility.clear_hyper_taper_cache()
+    utility.clear_pad_cache()
+    geometry.clear_glyph_cache()
+    geometry.clear_optimal_curve_cache()
+    test.clear_alignment_mark_cache()
+    test.clear_resolution_test_cache()
+    gc.collect()
+
+
+def benchmark(builder, kwargs, repeat=3):
+    """Times a builder and measures the peak memory it allocates.
+
+    Returns:
+        dict: The "time" of the fastest run and the "mean_time" (in s), and
+        the "peak_memory" allocated (in bytes).
+    """
+    kwargs = {
+        name: value() if isinstance(value, functools.partial) else value
+        for name, value in kwargs.items()
+    }
+    times = []
+    for _ in range(repeat):
+        clear_caches()
+        start = time.perf_counter()
+        result = builder(**kwargs)
+        times.append(time.perf_counter() - start)
+        del result
+
+    # tracemalloc slows the builders down: memory is measured on another run
+    clear_caches()
+    tracemalloc.start()
+    result = builder(**kwargs)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+
+    return {
+        "time": min(times),
+        "mean_time": sum(times) / len(times),
+        "peak_memory": peak_memory,
+    }
+
+
+def run_benchmarks(names=None, sizes=SIZES, repeat=3):
+    results = {}
+    for name, (builder, parameters) in BENCHMARKS.items():
+        if names and not any(n in name for n in names):
+            continue
+        for size in sizes:
+            key = f"{name}[{size}]"
+            results[key] = benchmark(builder, parameters[size], repeat)
+            print(
+                f"{key:<65} {results[key]['time']*1e3:10.1f} ms"
+                f" {results[key]['peak_memory']/1e6:10.1f} MB"
+            )
+    return results
+
+
+def default_label():
+    """Returns the git revision of qnngds (marked "-dirty" if it has
+    uncommitted changes), or its version out of a git repository."""
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=os.path.dirname(os.path.abspath(design.__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return importlib.metadata.version("qnngds")
+
+
+def save_results(results, label):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    file_name = os.path.join(RESULTS_DIR, f"{label}.json")
+    with open(file_name, "w") as file:
+        json.dump(
+            {
+                "label": label,
+                "version": importlib.metadata.version("qnngds"),
+                "python": platform.python_version(),
+                "machine": platform.platform(),
+                "results": results,
+            },
+            file,
+            indent=1,
+        )
+    return file_name
+
+
+def compare_results(results, label, threshold=1.2):
+    """Prints the ratios of the results to the ones stored under another
+    label, and flags the regressions."""
+    with open(os.path.join(RESULTS_DIR, f"{label}.json")) as file:
+        reference = json.load(file)["results"]
+    print(f"\nCompared to {label} (time ratio, memory ratio):\n")
+    for key, result in results.items():
+        if key not in reference:
+            continue
+        time_ratio = result["time"] / reference[key]["time"]
+        memory_ratio = result["peak_memory"] / max(reference[key]["peak_memory"], 1)
+        flag = (
+            "  <- regression"
+            if time_ratio > threshold or memory_ratio > threshold
+            else ""
+        )
+        print(f"{key:<65} {time_ratio:8.2f} {memory_ratio:8.2f}{flag}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "names", nargs="*", help="Only run the benchmarks containing these names."
+    )
+    parser.add_argument("--sizes", nargs="+", choices=SIZES, default=SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--label",
+        help="The name the results are stored under (by default, the git revision).",
+    )
+    parser.add_argument("--compare", help="The label to compare the results to.")
+    parser.add_argument(
+        "--no-save", action="store_true", help="Do not store the results."
+    )
+    parser.add_argument(
+        "--no-tiling",
+        action="store_true",
+        help="Run the boolean operations in a single tile.",
+    )
+    parser.add_argument(
+        "--layer-workers",
+        type=int,
+        default=1,
+        help="The number of processes the layers of the boolean operations run on.",
+    )
+    args = parser.parse_args()
+
+    geometry.set_tiling(enabled=not args.no_tiling, layer_workers=args.layer_workers)
+
+    label = args.label or default_label()
+    if args.compare == label:
+        parser.error(f"the results can't be compared to themselves ({label}).")
+    results = run_benchmarks(args.names, args.sizes, args.repeat)
+    if not args.no_save:
+        print(f"\nResults stored in {save_results(results, label)}")
+    if args.compare:
+        compare_results(results, args.compare)
@@ -0,0 +1,14 @@
+import numpy as np
+
+
+def area(D, layer=None):
+    """Returns the area of the polygons of a Device, on all its layers or on
+    a layer."""
+    if layer is None:
+        polygons = D.get_polygons()
+    else:
+        polygons = D.get_polygons(by_spec=True).get((layer, 0), [])
+    return sum(
+        abs(np.sum(p[:, 0] * np.roll(p[:, 1], 1) - np.roll(p[:, 0], 1) * p[:, 1])) / 2
+        for p in polygons
+    )
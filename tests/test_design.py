@@ -0,0 +1,159 @@
+import gc
+import os
+
+import gdspy
+import phidl.geometry as pg
+
+import qnngds.design as design
+import qnngds.utilities as utility
+
+
+def small_design(N_dies=3):
+    """Returns a Design whose chip is created, without a devices map."""
+    DESIGN = design.Design(N_dies=N_dies, chip_w=N_dies * 1000, chip_margin=50)
+    DESIGN.create_chip(create_devices_map_txt=False)
+    return DESIGN
+
+
+def test_place_on_chip_shares_identical_cells():
+    DESIGN = small_design()
+    DESIGN.place_on_chip(pg.rectangle((900, 900), layer=2), (0, 0))
+    DESIGN.place_on_chip(pg.rectangle((900, 900), layer=2), (1, 0))
+    parents = [ref.parent for ref in DESIGN.CHIP.references[-2:]]
+    assert parents[0] is parents[1]
+
+
+def test_place_on_chip_keeps_names_of_identical_cells():
+    DESIGN = small_design()
+    for name, coordinates in (("CELL A", (0, 0)), ("CELL B", (1, 0))):
+        CELL = pg.rectangle((900, 900), layer=2)
+        CELL.name = name
+        DESIGN.place_on_chip(CELL, coordinates)
+    names = [ref.parent.name for ref in DESIGN.CHIP.references[-2:]]
+    assert names == ["CELL A", "CELL B"]
+
+
+def sweep_grid():
+    """Returns the grid of a sweep of 3 alignment cells, one a duplicate."""
+    return {"layers_to_align": [[2, 3]], "text": ["A", "B", "A"]}
+
+
+def test_sweep_builds_in_process_with_one_worker(monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("no process pool should be started")
+
+    monkeypatch.setattr(design, "ProcessPoolExecutor", no_pool)
+    DESIGN = small_design()
+    reports = list(DESIGN.sweep("alignment_cell", sweep_grid(), workers=1))
+    assert [report["duplicate"] for report in reports] == [False, False, True]
+    assert all(report["placed"] for report in reports)
+
+
+def test_sweep_places_cells_by_batch(monkeypatch):
+    DESIGN = small_design()
+    batches = []
+    place_remaining_devices = DESIGN.place_remaining_devices
+
+    def place(devices_to_place, *args, **kwargs):
+        batches.append(len(devices_to_place))
+        place_remaining_devices(devices_to_place, *args, **kwargs)
+
+    monkeypatch.setattr(DESIGN, "place_remaining_devices", place)
+    list(DESIGN.sweep("alignment_cell", sweep_grid(), workers=1, batch_size=2))
+    assert batches == [2, 1]
+
+
+def test_sweep_releases_the_cells_placed(tmp_path):
+    DESIGN = small_design()
+    DESIGN.load_manifest(str(tmp_path / "manifest"))
+    list(DESIGN.sweep("alignment_cell", sweep_grid(), workers=1, batch_size=1))
+    masters = {id(ref.parent) for ref in DESIGN.CHIP.references}
+    assert all(id(entry["_cell"]) in masters for entry in DESIGN.manifest)
+
+    DESIGN = small_design()
+    DESIGN.load_manifest(str(tmp_path / "manifest"))
+    DESIGN.stream_gds(str(tmp_path / "design"))
+    list(DESIGN.sweep("alignment_cell", sweep_grid(), workers=1, batch_size=1))
+    gc.collect()
+    assert all(entry["_cell"] is None for entry in DESIGN.manifest)
+    assert len(DESIGN._specs) == 0
+    DESIGN.write_gds()
+    assert len(os.listdir(tmp_path / "manifest.cells")) == 2
+
+
+def alignment_specs(texts):
+    """Returns the specs of alignment cells with the given texts."""
+    return [("alignment_cell", {"layers_to_align": [2, 3], "text": t}) for t in texts]
+
+
+def test_manifest_rebuilds_only_the_changed_cells(tmp_path, monkeypatch):
+    manifest = str(tmp_path / "manifest")
+    DESIGN = small_design()
+    DESIGN.load_manifest(manifest)
+    DESIGN.place_remaining_devices(DESIGN.build_cells(alignment_specs("AB"), 1))
+    DESIGN.write_gds(str(tmp_path / "design"))
+
+    built = []
+    alignment_cell = design.Design.alignment_cell
+
+    def count_builds(self, *args, **kwargs):
+        built.append(kwargs["text"])
+        return alignment_cell(self, *args, **kwargs)
+
+    monkeypatch.setattr(design.Design, "alignment_cell", count_builds)
+    DESIGN = small_design()
+    assert len(DESIGN.load_manifest(manifest)) == 2
+    DESIGN.place_remaining_devices(DESIGN.build_cells(alignment_specs("AC"), 1))
+    assert built == ["C"]
+
+    diff = DESIGN.diff_manifest()
+    assert [entry["name"] for entry in diff["unchanged"]] == ["CELL.ALIGN(A)"]
+    assert [entry["name"] for entry in diff["added"]] == ["CELL.ALIGN(C)"]
+    assert [entry["name"] for entry in diff["removed"]] == ["CELL.ALIGN(B)"]
+
+
+def test_stream_gds_writes_the_same_chip(tmp_path):
+    files = []
+    for stream in (False, True):
+        DESIGN = small_design()
+        name = str(tmp_path / f"design {stream}")
+        if stream:
+            DESIGN.stream_gds(name)
+        DESIGN.place_remaining_devices(DESIGN.build_cells(alignment_specs("AAB"), 1))
+        files.append(DESIGN.write_gds(name))
+
+    streamed_cells = {ref.parent for ref in DESIGN.CHIP.references}
+    annotation = {(DESIGN.layers["annotation"], 0)}
+    assert all(set(cell.get_polygons(True)) == annotation for cell in streamed_cells)
+    written, streamed = (pg.import_gds(f) for f in files)
+    assert utility.geometry_hash(streamed) == utility.geometry_hash(written)
+
+
+def test_dies_that_only_differ_by_their_label_share_their_frame():
+    DESIGN = small_design()
+    frames = []
+    for coordinates, text in (((0, 0), "A"), ((1, 0), "B")):
+        utility.clear_die_frame_cache()
+        DIE = utility.die_cell(die_parameters=DESIGN.die_parameters, text=text)
+        DESIGN.place_on_chip(DIE, coordinates)
+        (FRAME,) = [
+            ref.parent
+            for ref in DESIGN.CHIP.references[-1].parent.references
+            if ref.parent.name.startswith("DIE FRAME")
+        ]
+        frames.append(FRAME)
+    assert frames[0] is frames[1]
+
+
+def test_write_gds_does_not_modify_the_chip(tmp_path):
+    DESIGN = small_design()
+    for coordinates in ((0, 0), (1, 0), (2, 0)):
+        DESIGN.place_on_chip(pg.rectangle((900, 900), layer=2), coordinates)
+    references = list(DESIGN.CHIP.references)
+
+    files = [DESIGN.write_gds(str(tmp_path / name)) for name in ("first", "second")]
+
+    assert DESIGN.CHIP.references == references
+    for file in files:
+        (top,) = gdspy.GdsLibrary(infile=file).top_level()
+        assert [type(ref) for ref in top.references] == [gdspy.CellArray]
@@ -0,0 +1,112 @@
+import numpy as np
+import phidl.geometry as pg
+import pytest
+from phidl import Device
+
+import qnngds.cells as cell
+import qnngds.devices as device
+import qnngds.utilities as utility
+
+from conftest import area
+
+
+def union_nanowire(channel_w, source_w, constr_length=None):
+    """Returns a nanowire built from the union of its steps and constriction,
+    as spot and variable_length used to build it."""
+    NANOWIRE = Device()
+    wire = pg.optimal_step(channel_w, source_w, symmetric=True, num_pts=100)
+    source = NANOWIRE << wire
+    gnd = NANOWIRE << wire
+    if constr_length is None:
+        source.connect(source.ports[1], gnd.ports[1])
+    else:
+        line = pg.rectangle((constr_length, channel_w))
+        line.center = [0, 0]
+        line.add_port("top", midpoint=(-constr_length / 2, 0), orientation=180)
+        line.add_port("bottom", midpoint=(constr_length / 2, 0), orientation=0)
+        constriction = NANOWIRE << line
+        source.connect(source.ports[1], constriction.ports["top"])
+        constriction.connect(constriction.ports["bottom"], gnd.ports[1])
+    NANOWIRE = pg.union(NANOWIRE)
+    NANOWIRE.add_port(name=1, port=source.ports[2])
+    NANOWIRE.add_port(name=2, port=gnd.ports[2])
+    NANOWIRE.rotate(-90)
+    NANOWIRE.move(NANOWIRE.center, (0, 0))
+    return NANOWIRE
+
+
+def assert_same_nanowire(NANOWIRE, REFERENCE):
+    assert area(NANOWIRE) == pytest.approx(area(REFERENCE), rel=1e-3)
+    assert np.allclose(NANOWIRE.bbox, REFERENCE.bbox, atol=1e-4)
+    for name in (1, 2):
+        port, reference_port = NANOWIRE.ports[name], REFERENCE.ports[name]
+        assert np.allclose(port.midpoint, reference_port.midpoint, atol=1e-4)
+        assert port.orientation % 360 == reference_port.orientation % 360
+
+
+@pytest.mark.parametrize("channel_w, source_w", [(0.1, 0.3), (0.3, 0.1), (0.2, 0.2)])
+def test_spot_matches_the_union(channel_w, source_w):
+    NANOWIRE = device.nanowire.spot(channel_w, source_w)
+    assert_same_nanowire(NANOWIRE, union_nanowire(channel_w, source_w))
+    assert np.allclose(NANOWIRE.center, (0, 0))
+
+
+@pytest.mark.parametrize("channel_w, source_w", [(0.1, 0.3), (0.3, 0.1), (0.2, 0.2)])
+@pytest.mark.parametrize("constr_length", [0.2, 1, 2])
+def test_variable_length_matches_the_union(channel_w, source_w, constr_length):
+    NANOWIRE = device.nanowire.variable_length(channel_w, source_w, constr_length)
+    REFERENCE = union_nanowire(channel_w, source_w, constr_length)
+    assert_same_nanowire(NANOWIRE, REFERENCE)
+
+
+def test_batch_returns_a_device_per_parameter():
+    parameters = [(0.1, 0.3), (0.3, 0.1, 1), (0.1, 0.3)]
+    NANOWIRES = device.nanowire.batch(parameters, workers=1)
+
+    assert NANOWIRES[0] is not NANOWIRES[2]
+    assert_same_nanowire(NANOWIRES[0], device.nanowire.spot(0.1, 0.3))
+    assert_same_nanowire(NANOWIRES[1], device.nanowire.variable_length(0.3, 0.1, 1))
+    NANOWIRES[0].move((10, 0))
+    assert np.allclose(NANOWIRES[2].center, (0, 0))
+
+
+def test_batch_in_processes_matches_batch_in_this_process():
+    parameters = [(0.1, 0.3), (0.3, 0.1, 1), (0.2, 0.2), (0.1, 0.3)]
+    SERIAL = device.nanowire.batch(parameters, workers=1)
+    PARALLEL = device.nanowire.batch(parameters, workers=2)
+    for NANOWIRE, REFERENCE in zip(PARALLEL, SERIAL):
+        assert utility.geometry_hash(NANOWIRE) == utility.geometry_hash(REFERENCE)
+
+
+def test_nanowires_cell_in_processes_matches_the_cell_in_this_process():
+    channels_sources_w = [(0.1, 1), (0.5, 3), (1, 10)]
+    SERIAL = cell.nanowires(channels_sources_w=channels_sources_w, workers=1)
+    PARALLEL = cell.nanowires(channels_sources_w=channels_sources_w, workers=2)
+    assert utility.geometry_hash(PARALLEL) == utility.geometry_hash(SERIAL)
+
+
+@pytest.mark.parametrize(
+    "arguments",
+    [
+        {},
+        {"terminals_same_side": True},
+        {"wire_width": 0.1, "wire_pitch": 0.5, "size": (None, 8), "num_squares": 500},
+        {"size": None, "num_squares": 1000, "turn_ratio": 2},
+        {"size": (6, 30)},
+    ],
+)
+def test_snspd_matches_the_phidl_snspd(arguments):
+    arguments = {"size": (6, 10), "num_squares": None, **arguments}
+    SNSPD = device.snspd.basic(**arguments)
+    REFERENCE = pg.snspd(**arguments)
+
+    xor = pg.boolean(SNSPD, REFERENCE, "xor", precision=1e-6)
+    assert area(xor) < 1e-6 * area(REFERENCE)
+    assert area(SNSPD) == pytest.approx(area(REFERENCE), rel=1e-6)
+    assert max(len(p) for p in SNSPD.get_polygons()) <= 4000
+    for name in (1, 2):
+        port, reference_port = SNSPD.ports[name], REFERENCE.ports[name]
+        assert np.allclose(port.midpoint, reference_port.midpoint)
+        assert port.orientation % 360 == reference_port.orientation % 360
+        assert port.width == reference_port.width
+    assert SNSPD.info["num_squares"] == pytest.approx(REFERENCE.info["num_squares"])
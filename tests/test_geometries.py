@@ -0,0 +1,169 @@
+import numpy as np
+import phidl.geometry as pg
+import pytest
+from phidl import Device
+from phidl.device_layout import DeviceReference
+
+import qnngds.geometries as geometry
+
+from conftest import area
+
+
+@pytest.mark.parametrize("length, wide, narrow", [(10, 50, 5), (30, 10, 1)])
+def test_hyper_taper_area(length, wide, narrow):
+    HT = geometry.hyper_taper(length, wide, narrow)
+    a = np.arccosh(wide / narrow) / length
+    assert area(HT) == pytest.approx(narrow / a * np.sinh(a * length), rel=1e-3)
+
+
+def test_hyper_taper_of_equal_sections_is_a_rectangle():
+    HT = geometry.hyper_taper(10, 5, 5)
+    assert area(HT) == pytest.approx(50)
+    assert np.allclose(HT.bbox, [[0, -2.5], [10, 2.5]])
+
+
+def meander_polygons():
+    """Returns the rectangles of a meander, crossing several tiles."""
+    rectangles = [
+        [(0, 2 * i), (100, 2 * i), (100, 2 * i + 1), (0, 2 * i + 1)] for i in range(20)
+    ]
+    rectangles += [
+        [(99, 2 * i), (100, 2 * i), (100, 2 * i + 3), (99, 2 * i + 3)]
+        for i in range(0, 19, 2)
+    ]
+    rectangles += [
+        [(0, 2 * i), (1, 2 * i), (1, 2 * i + 3), (0, 2 * i + 3)]
+        for i in range(1, 19, 2)
+    ]
+    return [np.array(r, dtype=float) for r in rectangles]
+
+
+@pytest.mark.parametrize(
+    "operation",
+    [
+        lambda polygons, num_divisions: geometry.union_polygons(
+            polygons, num_divisions=num_divisions
+        ),
+        lambda polygons, num_divisions: geometry.outline_polygons(
+            polygons, [], distance=0.3, num_divisions=num_divisions
+        ),
+        lambda polygons, num_divisions: geometry.invert_polygons(
+            polygons, num_divisions=num_divisions
+        ),
+    ],
+)
+def test_tiled_operations_match_a_single_tile(operation):
+    single = operation(meander_polygons(), [1, 1])
+    tiled = operation(meander_polygons(), [3, 2])
+    assert len(tiled) == len(single)
+    assert geometry._area(tiled) == pytest.approx(geometry._area(single))
+
+
+def test_set_tiling_keeps_the_settings_not_given():
+    settings = dict(geometry._tiling)
+    try:
+        geometry.set_tiling(enabled=False, compare=True)
+        geometry.set_tiling(layer_workers=2)
+        assert geometry._tiling["enabled"] is False
+        assert geometry._tiling["compare"] is True
+        assert geometry._tiling["layer_workers"] == 2
+    finally:
+        geometry._tiling.update(settings)
+
+
+def test_map_layers_reuses_its_processes():
+    polygons = meander_polygons()
+    operations = {
+        (1, 0): (geometry.union_polygons, (polygons[:20],)),
+        (2, 0): (geometry.union_polygons, (polygons[20:],)),
+    }
+    serial = geometry.map_layers(operations)
+    geometry.set_tiling(layer_workers=2)
+    try:
+        first = geometry.map_layers(operations)
+        executor = geometry._layer_pool["executor"]
+        second = geometry.map_layers(operations)
+        assert geometry._layer_pool["executor"] is executor
+    finally:
+        geometry.set_tiling(layer_workers=1)
+    for result in (first, second):
+        assert {layer: len(p) for layer, p in result.items()} == {
+            layer: len(p) for layer, p in serial.items()
+        }
+
+
+@pytest.mark.parametrize("justify", ["left", "right", "center"])
+def test_text_matches_phidl_text(justify):
+    TEXT = geometry.text("Ab 1\nµ{}", size=7, justify=justify, layer=(2, 1))
+    PHIDL_TEXT = pg.text("Ab 1\nµ{}", size=7, justify=justify, layer=(2, 1))
+    assert np.allclose(TEXT.bbox, PHIDL_TEXT.bbox)
+    assert area(TEXT) == pytest.approx(area(PHIDL_TEXT))
+    assert set(TEXT.get_polygons(by_spec=True)) == {(2, 1)}
+
+
+@pytest.mark.parametrize(
+    "build, phidl_build",
+    [
+        (
+            lambda w: geometry.optimal_step(w, 3 * w, symmetric=True),
+            lambda w: pg.optimal_step(w, 3 * w, symmetric=True),
+        ),
+        (
+            lambda w: geometry.optimal_hairpin(w, 3 * w, 10 * w),
+            lambda w: pg.optimal_hairpin(w, 3 * w, 10 * w),
+        ),
+        (lambda w: geometry.optimal_90deg(w), lambda w: pg.optimal_90deg(w)),
+    ],
+)
+def test_optimal_curves_are_solved_once_per_ratio(build, phidl_build):
+    geometry.clear_optimal_curve_cache()
+    for width in (0.1, 1, 2.5):
+        D, PHIDL_D = build(width), phidl_build(width)
+        assert np.allclose(D.bbox, PHIDL_D.bbox)
+        assert area(D) == pytest.approx(area(PHIDL_D))
+        for name, port in PHIDL_D.ports.items():
+            assert np.allclose(D.ports[name].midpoint, port.midpoint)
+    assert len(geometry._optimal_curves) == 1
+
+
+def sorted_polygons(polygons):
+    """Returns the polygons, snapped and sorted, to compare them."""
+    return sorted(tuple(np.round(p, 6).ravel()) for p in polygons)
+
+
+def test_layer_polygons_matches_get_polygons():
+    SUB = pg.rectangle((4, 2), layer=1)
+    SUB.add_polygon([(0, 0), (3, 0), (0, 5)], layer=(2, 1))
+    SUB.add_ref(pg.circle(1, layer=3)).move((5, 5))
+    D = Device()
+    D.add_polygon([(0, 0), (1, 0), (1, 1)], layer=1)
+    D.add_ref(SUB).rotate(30).mirror().move((10, -3))
+    D.add(DeviceReference(SUB, origin=(-5, 0), magnification=2))
+    D.add_array(SUB, columns=2, rows=3, spacing=(10, 20)).rotate(90)
+    D.add_ref(pg.rectangle((2, 2), layer=4))
+    everything = D.get_polygons(by_spec=True)
+
+    for layers, invert_selection in [
+        (None, False),
+        ([1], False),
+        ([(2, 1), 3], False),
+        ([1, 4], True),
+    ]:
+        polygons = geometry.layer_polygons(D, layers, invert_selection)
+        selected = {
+            key
+            for key in everything
+            if layers is None
+            or (key in {geometry._layer_tuple(l) for l in layers}) != invert_selection
+        }
+        assert set(polygons) == selected
+        for key in selected:
+            assert sorted_polygons(polygons[key]) == sorted_polygons(everything[key])
+
+
+def test_layer_polygons_are_copies():
+    D = Device()
+    D.add_ref(pg.rectangle((4, 2), layer=1))
+    for points in geometry.layer_polygons(D)[(1, 0)]:
+        points += 1
+    assert np.array_equal(D.bbox, [[0, 0], [4, 2]])
@@ -0,0 +1,61 @@
+import qnngds.tests as test
+
+
+def layer_polygons_count(D):
+    """Returns the number of polygons of a Device on each layer."""
+    return {layer: len(p) for layer, p in D.get_polygons(by_spec=True).items()}
+
+
+def masters(D):
+    """Returns the ids of the Devices a Device references."""
+    return {id(dependency) for dependency in D.get_dependencies(recursive=True)}
+
+
+def test_alignment_marks_share_the_masters():
+    test.clear_alignment_mark_cache()
+    MARKS = [test.alignment_mark([1, 2, 3]) for _ in range(2)]
+    shared = {id(master) for master in test._alignment_masters.values()}
+    assert shared <= masters(MARKS[0]) & masters(MARKS[1])
+
+
+def test_flattened_alignment_mark_does_not_change_other_marks():
+    test.clear_alignment_mark_cache()
+    MARK = test.alignment_mark([1, 2, 3])
+    counts = layer_polygons_count(MARK)
+
+    test.alignment_mark([1, 2, 3]).flatten().remove_layers([2])
+
+    assert layer_polygons_count(MARK) == counts
+    assert layer_polygons_count(test.alignment_mark([1, 2, 3])) == counts
+
+
+def test_alignment_mark_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(test, "_MASTER_CACHE_SIZE", 5)
+    test.clear_alignment_mark_cache()
+    test.alignment_mark([1, 2, 3, 4])
+    assert len(test._alignment_masters) == 5
+
+
+def test_resolution_tests_share_the_patterns():
+    test.clear_resolution_test_cache()
+    RES_TESTS = [test.resolution_test([0.5, 1], inverted=True) for _ in range(2)]
+    shared = {id(master) for master in test._resolution_masters.values()}
+    assert shared & masters(RES_TESTS[0]) & masters(RES_TESTS[1])
+
+
+def test_flattened_resolution_test_does_not_change_other_tests():
+    test.clear_resolution_test_cache()
+    RES_TEST = test.resolution_test([0.5, 1], inverted=True)
+    counts = layer_polygons_count(RES_TEST)
+
+    test.resolution_test([0.5, 1], inverted=True).flatten().remove_layers([1])
+
+    assert layer_polygons_count(RES_TEST) == counts
+    assert layer_polygons_count(test.resolution_test([0.5, 1], inverted=True)) == counts
+
+
+def test_resolution_test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(test, "_MASTER_CACHE_SIZE", 5)
+    test.clear_resolution_test_cache()
+    test.resolution_test([0.5, 1, 1.5, 2])
+    assert len(test._resolution_masters) == 5
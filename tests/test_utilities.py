@@ -0,0 +1,376 @@
+import pickle
+
+import gdspy
+import numpy as np
+import phidl.geometry as pg
+import phidl.routing as pr
+import pytest
+from phidl import Device, Port
+
+import qnngds.cells as cell
+import qnngds.devices as device
+import qnngds.geometries as geometry
+import qnngds.utilities as utility
+
+from conftest import area
+
+
+def frame_of(DIE):
+    """Returns the frame a die references."""
+    (FRAME,) = [
+        ref.parent for ref in DIE.references if ref.parent.name.startswith("DIE FRAME")
+    ]
+    return FRAME
+
+
+def isolated_pads(die_parameters, contact_w, device_max_size, ports, ports_gnd):
+    """Returns the outlines isolating the pads and routes of a die, each
+    outlined on its own with pg.outline as die_cell used to, and the regions
+    they cover."""
+    pad_block_size = [
+        size - 2 * die_parameters.pad_size[1] - 4 * die_parameters.outline
+        for size in die_parameters.unit_die_size
+    ]
+    inner_ports = pg.compass_multi(device_max_size, ports).ports.values()
+    outer_ports = pg.compass_multi(pad_block_size, ports).ports.values()
+    OUTLINES, REGIONS = Device(), Device()
+    for port, inner_port in zip(outer_ports, inner_ports):
+        if port.name[0] in ports_gnd:
+            continue
+        CONNECT = Device()
+        port.rotate(180)
+        pad = pg.rectangle(die_parameters.pad_size, layer=die_parameters.die_layer)
+        pad.add_port(
+            "1",
+            midpoint=(die_parameters.pad_size[0] / 2, 0),
+            width=die_parameters.pad_size[0],
+            orientation=90,
+        )
+        (CONNECT << pad).connect(pad.ports["1"], port)
+        port.width = die_parameters.pad_size[0]
+        inner_port.width = contact_w
+        CONNECT << pr.route_quad(port, inner_port, layer=die_parameters.die_layer)
+        overlap_port = CONNECT.add_port(port=inner_port)
+        direction = np.diff(overlap_port.normal, axis=0)[0]
+        overlap_port.midpoint = (
+            overlap_port.midpoint - die_parameters.contact_l * direction
+        )
+        overlap_port.rotate(180)
+        CONNECT << pr.route_quad(
+            inner_port, overlap_port, layer=die_parameters.die_layer
+        )
+        OUTLINES << pg.outline(
+            CONNECT,
+            distance=die_parameters.outline,
+            join="round",
+            open_ports=2 * die_parameters.outline,
+        )
+        REGIONS << pg.offset(CONNECT, die_parameters.outline)
+    return OUTLINES, REGIONS
+
+
+def assert_pads_isolated(DIE, die_parameters, *args):
+    OUTLINES, REGIONS = isolated_pads(die_parameters, *args)
+    isolation = pg.extract(DIE, [die_parameters.die_layer])
+    if not die_parameters.invert:
+        border = pg.rectangle(die_parameters.unit_die_size)
+        border.center = (0, 0)
+        isolation = pg.boolean(border, isolation, "A-B")
+    isolation = pg.boolean(isolation, REGIONS, "and")
+    assert area(pg.boolean(isolation, OUTLINES, "xor"), 0) < 1e-3
+
+
+def test_dies_share_their_frame_in_the_gds(tmp_path):
+    CHIP = Device("CHIP")
+    for i, text in enumerate("ABCD"):
+        NTRON = cell.ntron(choke_w=0.05, channel_w=0.5, text=text)
+        CHIP.add_ref(NTRON).movex(2000 * i)
+    CHIP.write_gds(str(tmp_path / "chip.gds"))
+    names = gdspy.GdsLibrary(infile=str(tmp_path / "chip.gds")).cells
+    assert len([name for name in names if name.startswith("DIE FRAME")]) == 1
+    assert len([name for name in names if name.startswith("PADS ")]) == 1
+
+
+def test_die_cell_flattened_die_does_not_change_other_dies():
+    utility.clear_die_frame_cache()
+    DIE_B = utility.die_cell(text="B")
+    die_area = area(DIE_B, 2)
+
+    DIE_A = utility.die_cell(text="A")
+    assert frame_of(DIE_A) is frame_of(DIE_B)
+    DIE_A.flatten().remove_layers([2])
+
+    assert area(DIE_A, 2) == 0
+    assert area(DIE_B, 2) == die_area
+    assert area(utility.die_cell(text="B"), 2) == die_area
+
+
+def test_die_parameters_are_equal_by_value():
+    A = utility.DieParameters(unit_die_size=[980, 980], die_layer=[2, 0])
+    B = utility.DieParameters(unit_die_size=(980, 980), die_layer=(2, 0))
+    assert A == B and hash(A) == hash(B)
+    assert A != B.replace(outline=20)
+    assert len({A, B, utility.DieParameters()}) == 2
+    assert pickle.loads(pickle.dumps(A)) == A
+    assert frame_of(utility.die_cell(A)) is frame_of(utility.die_cell(B))
+
+
+def test_die_parameters_are_immutable():
+    die_parameters = utility.DieParameters()
+    with pytest.raises(AttributeError):
+        die_parameters.outline = 20
+    with pytest.raises(AttributeError):
+        del die_parameters.outline
+
+
+def test_die_parameters_replace():
+    die_parameters = utility.DieParameters(pad_size=(100, 200))
+    assert die_parameters.replace() is die_parameters
+
+    REPLACED = die_parameters.replace(outline=20, unit_die_size=(500, 600))
+    assert REPLACED == utility.DieParameters(
+        pad_size=(100, 200), outline=20, unit_die_size=(500, 600)
+    )
+    assert (REPLACED.unit_die_w, REPLACED.unit_die_h) == (500, 600)
+    assert REPLACED.die_border_w == 60
+    assert die_parameters.outline == 10
+    with pytest.raises(TypeError):
+        die_parameters.replace(unit_die_w=500)
+
+
+@pytest.mark.parametrize("invert", [True, False])
+def test_die_cell_isolates_each_pad_like_pg_outline(invert):
+    die_parameters = utility.DieParameters(invert=invert)
+    args = (10.3, (60, 60), {"N": 1, "W": 1, "S": 1}, ["S"])
+    utility.clear_die_frame_cache()
+    DIE = utility.die_cell(die_parameters, (1, 1), *args)
+    assert_pads_isolated(DIE, die_parameters, *args)
+
+
+def test_ntron_isolates_each_pad_like_pg_outline():
+    die_parameters = utility.DieParameters()
+    NTRON = device.ntron.smooth(0.05, 1.5, 0.5, 1.5, 1.5, -1.5, 1)
+    contact_w = NTRON.ports["d"].width + die_parameters.contact_l
+    device_max_w = max(
+        4 * contact_w + max(NTRON.size), contact_w + 3 * die_parameters.outline
+    )
+    utility.clear_die_frame_cache()
+    NTRON_CELL = cell.ntron(choke_w=0.05, channel_w=0.5)
+    assert_pads_isolated(
+        NTRON_CELL,
+        die_parameters,
+        contact_w,
+        (device_max_w, device_max_w),
+        {"N": 1, "W": 1, "S": 1},
+        ["S"],
+    )
+
+
+def test_die_frame_cache_is_bounded():
+    utility.clear_die_frame_cache()
+    for contact_w in range(10, 10 + utility._DIE_FRAME_CACHE_SIZE + 5):
+        utility.die_cell(contact_w=contact_w, die_parameters=utility.DieParameters())
+    assert len(utility._die_frame_cache) == utility._DIE_FRAME_CACHE_SIZE
+
+
+def test_pack_unpack_device_round_trip():
+    DIE = utility.die_cell(text="PACK")
+    DIE.add_label("label", position=(10, 20), anchor="ne", layer=(4, 1))
+    UNPACKED = utility.unpack_device(utility.pack_device(DIE))
+
+    assert utility.geometry_hash(UNPACKED) == utility.geometry_hash(DIE)
+    assert UNPACKED.name == DIE.name
+    assert sorted(UNPACKED.ports) == sorted(DIE.ports)
+    (label,) = UNPACKED.labels
+    assert (label.text, label.layer, label.texttype) == ("label", 4, 1)
+    assert tuple(label.position) == (10, 20)
+    assert label.anchor == DIE.labels[0].anchor
+
+
+def test_unpack_device_polygons_are_not_shared():
+    packed = utility.pack_device(utility.die_cell(text="PACK"))
+    vertices = packed["vertices"].copy()
+    D = utility.unpack_device(packed)
+    for cell in [D, *D.get_dependencies(recursive=True)]:
+        for polygonset in cell.polygons:
+            for points in polygonset.polygons:
+                points += 1
+    assert np.array_equal(packed["vertices"], vertices)
+
+
+def test_cached_cell_loads_from_the_disk_cache(tmp_path):
+    utility.enable_cell_cache(str(tmp_path))
+    try:
+        BUILT = utility.cached_cell(cell.ntron, choke_w=0.05, channel_w=0.5)
+        LOADED = utility.cached_cell(cell.ntron, choke_w=0.05, channel_w=0.5)
+        stats = utility.cell_cache_stats()
+    finally:
+        utility.disable_cell_cache()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert utility.geometry_hash(LOADED) == utility.geometry_hash(BUILT)
+
+
+def test_cell_cache_key_depends_on_the_cache_version(monkeypatch):
+    arguments = {"choke_w": 0.05}
+    key = utility._cell_cache_key("cells.ntron", arguments)
+    monkeypatch.setattr(utility, "_CELL_CACHE_VERSION", utility._CELL_CACHE_VERSION + 1)
+    assert utility._cell_cache_key("cells.ntron", arguments) != key
+
+
+def test_pad_with_offset_returns_a_new_pad():
+    die_parameters = utility.DieParameters(invert=False)
+    DIE = utility.die_cell(die_parameters=die_parameters)
+    bbox = DIE.bbox.copy()
+    PAD = utility.pad_with_offset(die_parameters)
+    PAD.move((100, 0))
+    assert utility.pad_with_offset(die_parameters) is not PAD
+    assert np.array_equal(
+        utility.pad_with_offset(die_parameters).bbox, [[0, 0], [150, 250]]
+    )
+    assert np.array_equal(utility.die_cell(die_parameters=die_parameters).bbox, bbox)
+
+
+def test_geometry_hash_ignores_creation_order_and_names():
+    triangle = [(0, 0), (4, 0), (0, 3)]
+    A = pg.rectangle((10, 5), layer=1)
+    A.add_polygon(triangle, layer=2)
+    B = Device("another name")
+    B.add_polygon(triangle[1:] + triangle[:1], layer=2)
+    B.add_polygon([(0, 0), (0, 5), (10, 5), (10, 0)], layer=1)
+    assert utility.geometry_hash(A) == utility.geometry_hash(B)
+
+    B.move((1, 0))
+    assert utility.geometry_hash(A) != utility.geometry_hash(B)
+
+
+def test_geometry_hash_of_ports():
+    A = pg.rectangle((10, 5))
+    B = pg.rectangle((10, 5))
+    B.add_port(name=1, midpoint=(0, 2.5), width=5, orientation=180)
+    assert utility.geometry_hash(A) != utility.geometry_hash(B)
+    assert utility.geometry_hash(A, include_ports=False) == utility.geometry_hash(
+        B, include_ports=False
+    )
+
+
+def test_pads_share_one_master():
+    die_parameters = utility.DieParameters(invert=False)
+    (PAD,) = [ref.parent for ref in utility.pad_with_offset(die_parameters).references]
+    DIE = utility.die_cell(die_parameters=die_parameters)
+    pads = {
+        id(D) for D in DIE.get_dependencies(recursive=True) if D.name.startswith("PAD ")
+    }
+    assert pads == {id(PAD)}
+
+
+def test_die_labels_share_the_glyphs_in_the_gds(tmp_path):
+    die_parameters = utility.DieParameters(invert=False)
+    CHIP = Device("CHIP")
+    for i, text in enumerate(["AB", "BA", "AA"]):
+        DIE = utility.die_cell(die_parameters=die_parameters, text=text)
+        CHIP.add_ref(DIE).movex(2000 * i)
+    CHIP.write_gds(str(tmp_path / "chip.gds"))
+    names = gdspy.GdsLibrary(infile=str(tmp_path / "chip.gds")).cells
+    glyphs = [name.split()[1] for name in names if name.startswith("GLYPH")]
+    assert sorted(glyphs) == [str(ord("A")), str(ord("B"))]
+
+
+def test_hyper_taper_master_is_shared():
+    HT = utility.hyper_taper_master(10, 30, 5, layer=1)
+    assert utility.hyper_taper_master(10.0000001, 30, 5, layer=1) is HT
+    assert utility.hyper_taper_master(10, 30, 5, layer=2) is not HT
+    assert utility.hyper_taper_master(10, 30, 6, layer=1) is not HT
+    assert HT.ports == {}
+
+
+def test_hyptap_to_cell_references_the_masters_like_the_tapers():
+    die_ports = utility.die_cell(contact_w=10).get_ports()
+    HT, device_ports = utility.add_hyptap_to_cell(die_ports, 10, 5, layer=1)
+    OTHER_HT, _ = utility.add_hyptap_to_cell(die_ports, 10, 5, layer=1)
+    master = utility.hyper_taper_master(10, die_ports[0].width + 20, 5, layer=1)
+    assert {ref.parent for ref in HT.references + OTHER_HT.references} == {master}
+
+    # the tapers placed as geometry.hyper_taper used to be
+    REFERENCE = Device()
+    for port in die_ports:
+        taper = geometry.hyper_taper(10, port.width + 20, 5)
+        ht = REFERENCE << taper
+        ht.connect(taper.ports[2], port)
+        assert np.allclose(HT.ports[port.name].midpoint, ht.ports[1].midpoint)
+        assert HT.ports[port.name].orientation % 360 == ht.ports[1].orientation % 360
+        assert np.allclose(device_ports.ports[port.name].midpoint, port.midpoint)
+    assert area(pg.boolean(HT, REFERENCE, "xor", precision=1e-6), 0) < 1e-3
+
+
+def random_port_pairs(seed, count=100):
+    """Returns pairs of ports of random positions, widths and orientations,
+    named as route_to_dev expects them."""
+    rng = np.random.default_rng(seed)
+    pairs = []
+    for i in range(count):
+        port, dev_port = (
+            Port(
+                f"N{i}",
+                midpoint=tuple(rng.uniform(-50, 50, 2)),
+                width=rng.uniform(*widths),
+                orientation=rng.choice([0, 90, 180, 270]),
+            )
+            for widths in [(1, 10), (0.1, 5)]
+        )
+        pairs.append((port, dev_port))
+    return pairs
+
+
+def route_by_trying(port, dev_port):
+    """Returns the route between the ports, built as route_to_dev used to
+    build it: the smooth routes are tried in order until one does not raise
+    an error, else the route is a quad."""
+    for radius, length in [(port.width, 2 * port.width), (dev_port.width,) * 2]:
+        try:
+            return pr.route_smooth(
+                port, dev_port, radius, path_type="Z", length1=length, length2=length
+            )
+        except ValueError:
+            pass
+    return pr.route_quad(port, dev_port)
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("side, length_ratio", [(0, 2), (1, 1)])
+def test_z_route_fits_when_route_smooth_does(seed, side, length_ratio):
+    pairs = random_port_pairs(seed)
+    radius = np.array([pair[side].width for pair in pairs])
+    fits = utility._z_route_fits(pairs, radius, length_ratio * radius)
+    for (port, dev_port), r, fit in zip(pairs, radius, fits):
+        length = length_ratio * r
+        try:
+            pr.route_smooth(
+                port, dev_port, r, path_type="Z", length1=length, length2=length
+            )
+        except ValueError:
+            assert not fit
+        else:
+            assert fit
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_route_to_dev_matches_the_routes_by_trying(seed):
+    pairs = random_port_pairs(seed, count=30)
+    ROUTES = utility.route_to_dev(
+        [port for port, _ in pairs], {p.name: p for _, p in pairs}, layer=1
+    )
+    REFERENCE = Device()
+    for port, dev_port in pairs:
+        REFERENCE << route_by_trying(port, dev_port)
+    REFERENCE.flatten(single_layer=1)
+    assert area(ROUTES) == pytest.approx(area(REFERENCE))
+    assert area(pg.boolean(ROUTES, REFERENCE, "xor", precision=1e-6), 0) < 1e-3
+
+
+def test_quad_routes_match_route_quad():
+    pairs = random_port_pairs(0)
+    for quad, (port, dev_port) in zip(utility._quad_routes(pairs), pairs):
+        (reference,) = pr.route_quad(port, dev_port).get_polygons()
+        assert sorted(map(tuple, np.round(quad, 9))) == sorted(
+            map(tuple, np.round(reference, 9))
+        )